@@ -265,18 +265,85 @@ The normal state of the U3s is something like::
 import logging
 import u3
 import re
+import os
 import os.path
+import threading
+import time
+from collections import namedtuple
 
 import Math
 from .... import MCobject, MCgroup, ObservatoryError
-from ..WBDC_core import LatchGroup
-from Electronics.Instruments.PINatten import PINattenuator, get_splines
+from ..latchgroup import LatchGroup, SPILatchGroup, pack_feedback, \
+                         wait_commands
+from .hwowner import HardwareOwner, CONTROL
+from .state_journal import StateJournal
+from Electronics.Instruments.PINatten import PINattenuator
 from Electronics.Interfaces.LabJack import connect_to_U3s, LJTickDAC
 
 module_logger = logging.getLogger(__name__)
 package_dir = "/usr/local/lib/python2.7/DSN-Sci-packages/"
 module_subdir = "MonitorControl/Receivers/WBDC/WBDC2/"
 
+# The state of all the receiver switches, decoded from one reading of each of
+# the status latch groups.  'crossover' is the transfer switch state and the
+# other fields are dicts keyed by pol section, down-converter, band and latch
+# group ID respectively.
+ReceiverState = namedtuple("ReceiverState",
+                           ["time", "crossover", "polarizers", "IF_hybrids",
+                            "PLL", "latches"])
+
+class ReceiverConfig(object):
+  """
+  Desired state of the WBDC2 switches and attenuators
+
+  'crossover' is the transfer switch state. 'polarizers' and 'IF_hybrids' are
+  dicts of switch states keyed by pol section and down-converter, and 'attens'
+  is a dict of attenuations in dB keyed by attenuator ID.  Items which are None
+  or missing are left as they are.  See WBDC2hwif.apply().
+  """
+  def __init__(self, crossover=None, polarizers={}, IF_hybrids={}, attens={}):
+    """
+    @param crossover : True for crossed, False for through
+    @type  crossover : bool
+
+    @param polarizers : True for E/H to L/R conversion, keyed by pol section
+    @type  polarizers : dict of str:bool
+
+    @param IF_hybrids : True for bypassed hybrids, keyed by down-converter
+    @type  IF_hybrids : dict of str:bool
+
+    @param attens : attenuation in dB keyed by attenuator ID
+    @type  attens : dict of str:float
+    """
+    self.crossover = crossover
+    self.polarizers = dict(polarizers)
+    self.IF_hybrids = dict(IF_hybrids)
+    self.attens = dict(attens)
+
+  def __repr__(self):
+    return "ReceiverConfig(crossover=%s, polarizers=%s, IF_hybrids=%s, " \
+           "attens=%s)" % (self.crossover, self.polarizers, self.IF_hybrids,
+                           self.attens)
+
+  def to_dict(self):
+    """
+    Returns the configuration as a dict, e.g. for sending to a server
+    """
+    return {"crossover":  self.crossover,
+            "polarizers": dict(self.polarizers),
+            "IF_hybrids": dict(self.IF_hybrids),
+            "attens":     dict(self.attens)}
+
+  @classmethod
+  def from_dict(cls, config):
+    """
+    Creates a configuration from a dict made by to_dict()
+    """
+    return cls(crossover=config.get("crossover"),
+               polarizers=config.get("polarizers", {}),
+               IF_hybrids=config.get("IF_hybrids", {}),
+               attens=config.get("attens", {}))
+
 class WBDC2hwif(MCobject):
   """
   Provides hardware interface to WBDC2
@@ -288,44 +355,104 @@ class WBDC2hwif(MCobject):
   IF_names   = ["I1", "I2"]
   bands      = ["18", "20", "22", "24", "26"]
   LJIDs = {320053997: 1, 320052373: 2, 320059056: 3}
+  # LabJacks with the attenuator TickDACs of each receiver
+  tdac_LJ = {"R1": 2, "R2": 3}
+  latch_transports = {"bitbang": LatchGroup, "spi": SPILatchGroup}
+  # latch groups which hold all the switch states; see snapshot()
+  status_groups = ["PLL", "R1P", "R2P", "R1I1", "R1I2", "R2I1", "R2I2"]
+  # latch groups whose commanded bytes are kept in the state journal; PLL is
+  # only read, and the analog monitor groups A1 and A2 change with every
+  # monitor point
+  journal_groups = ["X", "R1P", "R2P", "R1I1", "R1I2", "R2I1", "R2I2"]
+  # analog monitor points: (address, label of the AIN0/2 reading, label of the
+  # AIN1/3 reading, polling period in seconds, priority; 1 is the highest)
   mon_points = {
-    1: {1: (int('0000000', 2), " +6 V digitalMB", " +6 V dig"),
-        2: (int('1000001', 2), " +6 V analog MB", " +6 V ana"),
-        3: (int('0001010', 2), "+16 V MB"       , "+16 V"),
-        4: (int('0000011', 2), ""               , "+12 V"),
-        5: (int('0100100', 2), "-16 V MB"       , "-16 V"),
-        6: (int('1100010', 2), "+16 V R1 FE"    , "+16 V"),
-        7: (int('0010010', 2), "+16 V R2 FE"    , "+16 V"),
-        8: (int('1010010', 2), "+16 V R1 BE"    , "+16 V"),
-        9: (int('0110010', 2), "+16 V R2 BE"    , "+16 V"),
-       10: (int('1110010', 2), "+16 V LDROs"    , "+16 V"),
-       11: (int('1001001', 2), " +6 V R1 FE"    , " +6 V ana"),
-       12: (int('0101001', 2), " +6 V R2 FE"    , " +6 V ana"),
-       13: (int('1101100', 2), "-16 V R1 FE"    , "-16 V"),
-       14: (int('0011100', 2), "-16 V R2 FE"    , "-16 V"),
-       15: (int('1011100', 2), "-16 V R1 BE"    , "-16 V"),
-       16: (int('0111100', 2), "-16 V R2 BE"    , "-16 V")},
-   2: { 1: (int('0000000', 2), "R1 E-plane"     , "R1 RF plate"),
-        2: (int('1000001', 2), "R2 E-plane"     , "R2 RF plate"),
-        3: (int('0100010', 2), "R1 H-plane"     , "BE plate"),
-        4: (int('1100000', 2), "R2 H-plane"     , "") } }
-
-  splines_lab = get_splines(package_dir+module_subdir+"splines-lab.pkl")
-  splines_file = package_dir+module_subdir+"splines.pkl"
-  if os.path.exists(splines_file):
-    splines = get_splines(splines_file)
-  else:
-    splines = splines_lab
-
-  def __init__(self, name, active=True):
+    1: {1: (int('0000000', 2), " +6 V digitalMB", " +6 V dig",    1.0, 2),
+        2: (int('1000001', 2), " +6 V analog MB", " +6 V ana",    1.0, 2),
+        3: (int('0001010', 2), "+16 V MB"       , "+16 V",        1.0, 2),
+        4: (int('0000011', 2), ""               , "+12 V",       10.0, 3),
+        5: (int('0100100', 2), "-16 V MB"       , "-16 V",        1.0, 2),
+        6: (int('1100010', 2), "+16 V R1 FE"    , "+16 V",        1.0, 2),
+        7: (int('0010010', 2), "+16 V R2 FE"    , "+16 V",        1.0, 2),
+        8: (int('1010010', 2), "+16 V R1 BE"    , "+16 V",        1.0, 2),
+        9: (int('0110010', 2), "+16 V R2 BE"    , "+16 V",        1.0, 2),
+       10: (int('1110010', 2), "+16 V LDROs"    , "+16 V",        1.0, 2),
+       11: (int('1001001', 2), " +6 V R1 FE"    , " +6 V ana",    1.0, 2),
+       12: (int('0101001', 2), " +6 V R2 FE"    , " +6 V ana",    1.0, 2),
+       13: (int('1101100', 2), "-16 V R1 FE"    , "-16 V",        1.0, 2),
+       14: (int('0011100', 2), "-16 V R2 FE"    , "-16 V",        1.0, 2),
+       15: (int('1011100', 2), "-16 V R1 BE"    , "-16 V",        1.0, 2),
+       16: (int('0111100', 2), "-16 V R2 BE"    , "-16 V",        1.0, 2)},
+   2: { 1: (int('0000000', 2), "R1 E-plane"     , "R1 RF plate",  0.2, 1),
+        2: (int('1000001', 2), "R2 E-plane"     , "R2 RF plate",  0.2, 1),
+        3: (int('0100010', 2), "R1 H-plane"     , "BE plate",     0.2, 1),
+        4: (int('1100000', 2), "R2 H-plane"     , "",             0.2, 1) } }
+  # conversion of the monitor readings to engineering units (see
+  # calibration.MonitorConversion): (scale, offset, unit) for the supply
+  # voltages and (pattern, scale, offset, unit) for the other readings
+  mon_conversions = {
+    "+6 V dig": (  4.0211, 0.0, "V"),
+    "+6 V ana": (  4.0278, 0.0, "V"),
+    "+16 V"   : ( 10.5446, 0.0, "V"),
+    "+12 V"   : ( 10.5827, 0.0, "V"),
+    "-16 V"   : (-10.5446, 0.0, "V")}
+  mon_conversion_rules = [
+    (" V ",    1.0,       -0.026,     "A"),  # currents
+    ("plane",  2.0064,    -0.004,     "V"),  # RF detectors
+    ("plate", 23.549481,   0.2389275, "C")]  # temperatures
+
+  # The attenuator calibration comes from the calibration store, or else from
+  # the splines pickles, preferring the field calibration to the lab one.  It
+  # is loaded when first needed; see get_calibration()
+  calibration_file = package_dir+module_subdir+"calibration.npy"
+  splines_files = [package_dir+module_subdir+"splines.pkl",
+                   package_dir+module_subdir+"splines-lab.pkl"]
+  calibration = None
+  calibration_lock = threading.Lock()
+  # control voltage changes smaller than this are not worth a DAC write
+  volts_tolerance = 0.0005
+  # The state journal must be writable, so it is not kept in the package
+  # directory.  WBDC2_STATE_DIR overrides the default ~/.local/state/WBDC2.
+  state_dir = os.environ.get("WBDC2_STATE_DIR",
+                os.path.join(os.environ.get("XDG_STATE_HOME",
+                                    os.path.expanduser("~/.local/state")),
+                             "WBDC2"))
+  journal_file = os.path.join(state_dir, "state.json")
+
+  def __init__(self, name, active=True, transport="bitbang",
+               readback="always", journal=journal_file):
     """
     Initialize a WBDC2 object.
 
+    The motherboard latches can be accessed by toggling the serial signals
+    with LabJack feedback commands ("bitbang") or with the LabJack SPI engine
+    ("spi"), which falls back to bit-banging if a transfer fails.
+
+    Switches are set from the shadow copies of the latch groups without
+    reading them first.  'readback' is the LatchGroup policy which decides
+    when written latches are read back for verification.  By default every
+    write is verified; "on demand" saves a USB transaction per write.
+
+    The last commanded state is kept in a journal file.  If there is one, the
+    switch and attenuator states are taken from it at startup and checked
+    against the hardware by a background thread (see check_journal()).  The
+    latch group shadows are only filled in by that check, so that a latch is
+    never changed on the strength of a journal the hardware disagrees with.
+
     @param name : unique identifier
     @type  name : str
 
     @param active : True is the FrontEnd instance is functional
     @type  active : bool
+
+    @param transport : key of 'latch_transports'
+    @type  transport : str
+
+    @param readback : latch readback policy
+    @type  readback : str or int
+
+    @param journal : state journal file, or None for no journal
+    @type  journal : str
     """
     self.name = name
     self.logger = logging.getLogger(module_logger.name+".WBDC2hwif")
@@ -336,21 +463,52 @@ class WBDC2hwif(MCobject):
       self.configure_MB_labjack()
     else:
       raise WBDCerror("could not configure motherboard Labjack")
-
-    # Define the latch groups
-    self.lg = {'A1':    LatchGroup(parent=self, DM=0, LG=1),
-               'A2':    LatchGroup(parent=self, DM=0, LG=2)}
-    self.lg['X'] =    LatchGroup(parent=self, LG=1)        # crossover (X) switch
-    self.lg['R1P'] =  LatchGroup(parent=self, LG=2)        # R1 pol hybrid control
-    self.lg['R2P'] =  LatchGroup(parent=self, LG=3)
-    self.lg['PLL'] =  LatchGroup(parent=self, LG=4)
-    self.lg['R1I1'] = LatchGroup(parent=self, DM=2, LG=1)
-    self.lg['R1I2'] = LatchGroup(parent=self, DM=2, LG=2)
-    self.lg['R2I1'] = LatchGroup(parent=self, DM=2, LG=3)
-    self.lg['R2I2'] = LatchGroup(parent=self, DM=2, LG=4)
+    # one thread for the operations on each LabJack; see hwowner
+    self.owner = {}
+    for ID in list(self.LJ.keys()):
+      self.owner[ID] = HardwareOwner(self.name+"-LJ"+str(ID))
+      self.owner[ID].start()
+
+    # Take the switch states from the journal, if there is one
+    loaded = False
+    journaled = {}
+    self.journal = None
+    if journal:
+      self.journal = StateJournal(journal)
+      if self.journal.usable:
+        loaded = self.journal.load()
+        if loaded:
+          journaled = self.journal.latches()
+      else:
+        self.journal = None
+
+    # Define the latch groups; with a journal nothing is read at startup, so
+    # no latch address needs to be selected yet
+    if transport not in WBDC2hwif.latch_transports:
+      raise ObservatoryError(transport, "is not a latch transport")
+    LG_class = WBDC2hwif.latch_transports[transport]
+    self.logger.debug(" latch groups use %s", LG_class.__name__)
+    options = {"readback": readback, "select": not loaded}
+    self.lg = {'A1':    LG_class(parent=self, DM=0, LG=1, **options),
+               'A2':    LG_class(parent=self, DM=0, LG=2, **options)}
+    # crossover (X) switch
+    self.lg['X'] =    LG_class(parent=self, LG=1, **options)
+    # R1 pol hybrid control
+    self.lg['R1P'] =  LG_class(parent=self, LG=2, **options)
+    self.lg['R2P'] =  LG_class(parent=self, LG=3, **options)
+    self.lg['PLL'] =  LG_class(parent=self, LG=4, **options)
+    self.lg['R1I1'] = LG_class(parent=self, DM=2, LG=1, **options)
+    self.lg['R1I2'] = LG_class(parent=self, DM=2, LG=2, **options)
+    self.lg['R2I1'] = LG_class(parent=self, DM=2, LG=3, **options)
+    self.lg['R2I2'] = LG_class(parent=self, DM=2, LG=4, **options)
+    if self.journal:
+      for LGID in WBDC2hwif.journal_groups:
+        self.lg[LGID].write_listeners.append(self._journal_latch)
+      self.journal.start()
 
     # The first element in a WBDC is the two-polarization feed transfer switch
-    self.crossSwitch = self.TransferSwitch(self, "WBDC transfer switch")
+    self.crossSwitch = self.TransferSwitch(self, "WBDC transfer switch",
+                                           status=journaled.get('X'))
 
     self.pol_sec = {}
     for band in WBDC2hwif.bands:
@@ -360,7 +518,8 @@ class WBDC2hwif(MCobject):
         self.pol_sec[psec_name] = self.PolSection(self, psec_name)
         self.pol_sec[psec_name].data['band'] = band
         self.pol_sec[psec_name].data['receiver'] = rx
-        self.pol_sec[psec_name].get_state()
+        LGID, latchbit = self.pol_sec[psec_name]._get_latch_info()
+        self.pol_sec[psec_name].get_state(self._initial_byte(LGID, journaled))
     pol_sec_names = list(self.pol_sec.keys())
     pol_sec_names.sort()
     self.logger.debug(" __init__: pol sections: %s", pol_sec_names)
@@ -375,11 +534,158 @@ class WBDC2hwif(MCobject):
         self.DC[name+pol].data['receiver'] = rx
         self.DC[name+pol].data['band'] = band
         self.DC[name+pol].data['pol'] = pol
-        self.DC[name+pol].get_state()
+        LGID, latchbit = self.DC[name+pol]._get_latch_info()
+        self.DC[name+pol].get_state(self._initial_byte(LGID, journaled))
         self.logger.debug(" DC %s created", self.DC[name+pol])
 
     self.analog_monitor = self.AnalogMonitor(self, WBDC2hwif.mon_points)
+
+    if loaded:
+      attens = self.journal.attens()
+      for ID in list(attens.keys()):
+        if ID[:5] in self.pol_sec and ID in self.pol_sec[ID[:5]].atten:
+          atten = self.pol_sec[ID[:5]].atten[ID]
+          atten.atten = attens[ID]["dB"]
+          atten.VS.volts = attens[ID]["volts"]
+      self.journal_check = threading.Thread(target=self.check_journal,
+                                            name=self.name+"-journal_check")
+      self.journal_check.daemon = True
+      self.journal_check.start()
     self.logger.debug(" initialized for %s", self.name)
+
+  def _initial_byte(self, LGID, journaled):
+    """
+    Returns the latch group byte from which switches take their initial state
+
+    This is the journaled byte if there is one.  Otherwise the latch group is
+    read, once for all its switches.
+
+    @param LGID : latch group ID
+    @type  LGID : str
+
+    @param journaled : journaled bytes keyed by latch group ID
+    @type  journaled : dict of str:int
+    """
+    if LGID in journaled:
+      return journaled[LGID]
+    if self.lg[LGID].shadow == None:
+      self.lg[LGID].read()
+    return self.lg[LGID].shadow
+
+  @staticmethod
+  def get_calibration():
+    """
+    Returns the attenuator calibration, loading it when first needed
+
+    The calibration is loaded once per process and shared by all instances.
+
+    @return: calibration.AttenuatorCalibration instance
+    """
+    with WBDC2hwif.calibration_lock:
+      if WBDC2hwif.calibration == None:
+        from .calibration import load_calibration
+        WBDC2hwif.calibration = load_calibration(WBDC2hwif.calibration_file,
+                                      WBDC2hwif.splines_files,
+                                      WBDC2hwif._calibration_channels())
+      return WBDC2hwif.calibration
+
+  @staticmethod
+  def _calibration_channels():
+    """
+    Returns the IDs of all the attenuators
+    """
+    return [rx+'-'+band+'-'+pol for rx in WBDC2hwif.RF_names
+                                for band in WBDC2hwif.bands
+                                for pol in WBDC2hwif.pol_names]
+
+  def reload_calibration(self, path=None):
+    """
+    Replaces the attenuator calibration while the receiver is in use
+
+    The new calibration and its lookup tables are made without holding any
+    lock and then replace the old ones in one step.  The attenuators which
+    have been set are then set again where the new calibration gives a
+    different control voltage.  Each attenuator gets the control voltage
+    function and the gain range of the new calibration.
+
+    @param path : calibration store (.npy) or splines pickle; default: the
+                  files the calibration is normally loaded from
+    @type  path : str
+
+    @return: dict with the calibration source and the new voltages
+    """
+    from .calibration import load_calibration
+    if path == None:
+      store_file, splines_files = WBDC2hwif.calibration_file, \
+                                  WBDC2hwif.splines_files
+    elif os.path.splitext(path)[1] == ".npy":
+      store_file, splines_files = path, []
+    else:
+      # channels missing from a new pickle still come from the lab calibration
+      store_file, splines_files = None, [path] + WBDC2hwif.splines_files[1:]
+    new = load_calibration(store_file, splines_files,
+                           WBDC2hwif._calibration_channels())
+    with WBDC2hwif.calibration_lock:
+      WBDC2hwif.calibration = new
+    self.logger.info("reload_calibration: calibration from %s", new.source)
+    attens = {}
+    for ps in list(self.pol_sec.values()):
+      for ID in list(ps.atten.keys()):
+        atten = ps.atten[ID]
+        atten.ctlV_spline = new.ctlV_function(ID)
+        atten.min_gain, atten.max_gain = new.gain_range(ID)
+        if atten.get_atten() != None:
+          attens[ID] = atten.get_atten()
+    volts = self.control_voltages(attens)
+    changed = {}
+    for ID in list(volts.keys()):
+      old = self.pol_sec[ID[:5]].atten[ID].VS.volts
+      if old == None or abs(volts[ID] - old) > WBDC2hwif.volts_tolerance:
+        changed[ID] = volts[ID]
+    self._drive_attens(dict([(ID, attens[ID]) for ID in changed]), changed)
+    return {"source": new.source, "volts": changed}
+
+  def _journal_latch(self, latchgroup, data):
+    """
+    Records a byte written to a latch group in the state journal
+    """
+    for LGID in WBDC2hwif.journal_groups:
+      if self.lg[LGID] is latchgroup:
+        self.journal.record_latch(LGID, data)
+
+  def check_journal(self):
+    """
+    Checks the journaled latch states against the hardware
+
+    All the switch states are read with one snapshot, which puts the bytes read
+    in the latch group shadows and the switch objects.  Where the hardware
+    differs from the journal, e.g. after a power cycle, the journal is
+    corrected.
+
+    @return: dict of (journaled, actual) bytes of groups which differ, or
+             None if the latches could not be read
+    """
+    expected = self.journal.latches()
+    try:
+      latches = self.snapshot().latches
+    except ObservatoryError as details:
+      self.logger.error("check_journal: %s", details)
+      return None
+    latches['X'] = self.lg['X'].read()
+    differences = {}
+    for LGID in WBDC2hwif.journal_groups:
+      if LGID in expected and latches.get(LGID) != None and \
+         expected[LGID] != latches[LGID]:
+        differences[LGID] = (expected[LGID], latches[LGID])
+        with self.lg[LGID].bus.lock:
+          # the latch may have been written since it was read
+          self.journal.record_latch(LGID, self.lg[LGID].shadow)
+    if differences:
+      self.logger.warning("check_journal: journal differs from hardware: %s",
+                          differences)
+    else:
+      self.logger.debug("check_journal: journal agrees with hardware")
+    return differences
     
   def get_Xswitch_state(self):
     """
@@ -391,22 +697,366 @@ class WBDC2hwif(MCobject):
     
   def get_pol_sec_states(self):
     """
+    Returns the states of all the polarization sections
+    """
+    return self.snapshot().polarizers
+
+  def snapshot(self):
     """
-    states = {}
+    Returns the state of all the switches from one pass over the latch groups
+
+    Each latch group in 'status_groups' is read once and the states of the
+    cross-over switch, the polarization hybrids, the IF hybrids and the LO
+    phase-locked loops are decoded from those bytes.  Since the bytes were
+    just read, the states of the switch objects are updated as well.
+
+    An ObservatoryError is raised if a latch group cannot be read.
+
+    @return: ReceiverState namedtuple
+    """
+    latches = {}
+    for LGID in WBDC2hwif.status_groups:
+      data = self.lg[LGID].read()
+      if data == None or data < 0:
+        self.logger.error("snapshot: could not read latch group %s", LGID)
+        raise ObservatoryError("latch group "+LGID, "could not be read")
+      latches[LGID] = data
+    state = self.decode_state(latches)
+    self.crossSwitch.get_state(latches['PLL'])
     for key in list(self.pol_sec.keys()):
-      states[key] = self.pol_sec[key].get_state()
-    return states
+      self.pol_sec[key].state = state.polarizers[key]
+    for key in list(self.DC.keys()):
+      self.DC[key].state = state.IF_hybrids[key]
+    return state
+
+  def shadow_state(self):
+    """
+    Returns the state of all the switches from the shadow latch group bytes
+
+    The hardware is not accessed and the switch objects are not changed.  The
+    crossover is the one commanded through latch group X; the sensed one in
+    the PLL shadow is only as new as the last read of that group.  Until X has
+    been written, the sensed crossover is given.
+
+    @return: ReceiverState namedtuple, or None if a byte is not known
+    """
+    latches = {}
+    for LGID in WBDC2hwif.status_groups:
+      if self.lg[LGID].shadow == None:
+        return None
+      latches[LGID] = self.lg[LGID].shadow
+    if self.lg['X'].shadow == None:
+      return self.decode_state(latches)
+    latches['X'] = self.lg['X'].shadow
+    return self.decode_state(latches, crossover_group='X')
+
+  def decode_state(self, latches, crossover_group='PLL'):
+    """
+    Decodes the switch states from the status latch group bytes
+
+    Only the bytes are used; the switch objects are neither read nor changed.
+
+    @param latches : bytes keyed by the IDs in 'status_groups'
+    @type  latches : dict of str:int
+
+    @param crossover_group : 'PLL' for the sensed crossover or 'X' for the
+                             commanded one; both are in bits 0 and 1
+    @type  crossover_group : str
+
+    @return: ReceiverState namedtuple
+    """
+    # as in TransferSwitch.get_state(), the first sub-switch gives the state;
+    # the two differ for a moment while TransferSwitch.set_state() writes them
+    crossover = bool(Math.Bin.getbit(latches[crossover_group], 0))
+    polarizers = {}
+    for key in list(self.pol_sec.keys()):
+      LGID, latchbit = self.pol_sec[key]._get_latch_info()
+      polarizers[key] = Math.Bin.getbit(latches[LGID], latchbit)
+    IF_hybrids = {}
+    for key in list(self.DC.keys()):
+      LGID, latchbit = self.DC[key]._get_latch_info()
+      IF_hybrids[key] = Math.Bin.getbit(latches[LGID], latchbit)
+    PLL = {}
+    for band in WBDC2hwif.bands:
+      # lock indicators for bands 18-26 are bits 2-6
+      PLL[band] = bool(Math.Bin.getbit(latches['PLL'],
+                                       WBDC2hwif.bands.index(band)+2))
+    return ReceiverState(time.time(), crossover, polarizers, IF_hybrids, PLL,
+                         latches)
+
+  def set_attens(self, attens):
+    """
+    Sets several attenuators, driving the two TickDAC LabJacks concurrently
+
+    The control voltages of all the attenuators are found with one table
+    lookup, which also checks the calibrated range.  Then the DACs of each
+    LabJack (2 for R1, 3 for R2) are set by the owner thread of the LabJack,
+    the two LabJacks at the same time.  Every DAC channel still takes an I2C
+    transaction of its own: the U3 I2C function is not a feedback command and
+    addresses one LJTickDAC at a time, so the writes for one LabJack cannot be
+    combined.  Setting all twenty attenuators therefore takes as long as ten
+    DAC writes, not one.
+
+    This is also how a single IFattenuator is set.
+
+    @param attens : attenuation in dB keyed by attenuator ID
+    @type  attens : dict of str:float
+
+    @return: dict of attenuations set (None if failed) keyed by attenuator ID
+    """
+    return self._drive_attens(attens, self.control_voltages(attens))
+
+  def _drive_attens(self, attens, volts):
+    """
+    Sets attenuator control voltages, in parallel on the TickDAC LabJacks
+
+    The attenuators of each receiver are set by the owner thread of its
+    LabJack, one DAC write after the other.
+
+    @param attens : attenuation in dB keyed by attenuator ID
+    @type  attens : dict of str:float
+
+    @param volts : control voltages keyed by attenuator ID
+    @type  volts : dict of str:float
+
+    @return: dict of attenuations set (None if failed) keyed by attenuator ID
+    """
+    groups = {}
+    for ID in list(volts.keys()):
+      rx = ID[:2]
+      if rx not in groups:
+        groups[rx] = []
+      groups[rx].append(ID)
+    results = dict.fromkeys(attens)
+    jobs = []
+    for rx in list(groups.keys()):
+      jobs.append(self.owner[WBDC2hwif.tdac_LJ[rx]].submit(CONTROL,
+                              self._set_atten_group, groups[rx], attens, volts,
+                              results))
+    for job in jobs:
+      job.wait()
+    self.logger.debug("_drive_attens: %s", results)
+    return results
+
+  def control_voltages(self, attens):
+    """
+    Returns the control voltages for a set of attenuations
+
+    @param attens : attenuation in dB keyed by attenuator ID
+    @type  attens : dict of str:float
+
+    @return: dict of control voltages keyed by attenuator ID; attenuations
+             outside the calibrated range are left out
+    """
+    table = self.get_calibration().ctlV_table
+    IDs = []
+    for ID in list(attens.keys()):
+      channel = table.index[ID]
+      gain = -attens[ID]
+      if table.start[channel] <= gain <= table.stop[channel]:
+        IDs.append(ID)
+      else:
+        self.logger.error("control_voltages: %s: %s dB is outside the range "
+                          "%s to %s dB", ID, attens[ID], -table.stop[channel],
+                          -table.start[channel])
+    if not IDs:
+      return {}
+    volts = table.lookup_many(IDs, [-attens[ID] for ID in IDs])
+    return dict(zip(IDs, [float(V) for V in volts]))
+
+  def _set_atten_group(self, IDs, attens, volts, results):
+    """
+    Sets attenuators which are driven by the same LabJack
+    """
+    for ID in IDs:
+      atten = self.pol_sec[ID[:5]].atten[ID]
+      try:
+        atten._apply_voltage(attens[ID], volts[ID])
+        results[ID] = atten.get_atten()
+      except Exception as details:
+        self.logger.error("_set_atten_group: %s failed: %s", ID, details)
 
   def set_atten_volts(self, ID, attenID, volts):
     """
+    Sets the control voltage of an attenuator directly
+
+    The attenuation is found from the calibration, and is None if the voltage
+    is outside the calibrated range.  As with set_attens(), the attenuator
+    state and the journal are kept up to date.
+
+    @param ID : pol section, e.g. 'R1-18'
+    @type  ID : str
+
+    @param attenID : attenuator, e.g. 'R1-18-E'
+    @type  attenID : str
+
+    @param volts : control voltage
+    @type  volts : float
+
+    @return: attenuation in dB, or None
     """
-    self.pol_sec[ID].atten[attenID].set_voltage()
+    table = self.get_calibration().gain_table
+    channel = table.index[attenID]
+    atten = None
+    if table.start[channel] <= volts <= table.stop[channel]:
+      atten = -table.lookup(attenID, volts)
+    self.pol_sec[ID].atten[attenID]._apply_voltage(atten, volts)
+    return atten
     
   def get_DC_states(self):
-    states = {}
-    for key in list(self.DC.keys()):
-      states[key] = self.DC[key].get_state()
-    return states
+    """
+    Returns the states of all the IF hybrids
+    """
+    return self.snapshot().IF_hybrids
+
+  def set_pol_sec_states(self, states):
+    """
+    Sets polarization sections with one write per latch group
+
+    @param states : states keyed by pol section name, or one state for all
+    @type  states : dict of str:bool or bool
+
+    @return: dict of states keyed by pol section name
+    """
+    if type(states) != dict:
+      states = dict.fromkeys(self.pol_sec, states)
+    return self._set_switches(self.pol_sec, states)
+
+  def set_DC_states(self, states):
+    """
+    Sets IF hybrids with one write per latch group
+
+    @param states : states keyed by down-converter name, or one state for all
+    @type  states : dict of str:bool or bool
+
+    @return: dict of states keyed by down-converter name
+    """
+    if type(states) != dict:
+      states = dict.fromkeys(self.DC, states)
+    return self._set_switches(self.DC, states)
+
+  def apply(self, config):
+    """
+    Puts the receiver in the state given by a configuration
+
+    The configuration is compared with the shadow bytes of the latch groups
+    and the cached attenuator settings.  Only the latch groups with bits which
+    differ are written, each one once, and only the attenuators whose setting
+    differs are set.  A latch group which has not been read or written yet,
+    e.g. while a journal is being checked, is read first; a switch is set
+    regardless only if that read fails.
+
+    @param config : the desired state
+    @type  config : ReceiverConfig instance or dict
+
+    @return: dict with what changed and the time taken in seconds
+    """
+    start = time.time()
+    if type(config) == dict:
+      config = ReceiverConfig.from_dict(config)
+    changed = {"crossover": None, "polarizers": {}, "IF_hybrids": {},
+               "attens": {}, "latches": []}
+    bits = {}
+    if config.crossover != None:
+      # both transfer switches are set by bits 0 and 1 of latch group X
+      bits['X'] = {0: config.crossover, 1: config.crossover}
+    for switches, states in [(self.pol_sec, config.polarizers),
+                             (self.DC,      config.IF_hybrids)]:
+      for key in list(states.keys()):
+        if states[key] == None:
+          continue
+        LGID, latchbit = switches[key]._get_latch_info()
+        if LGID not in bits:
+          bits[LGID] = {}
+        bits[LGID][latchbit] = states[key]
+    # leave out the bits which the latch groups are known to have already
+    for LGID in list(bits.keys()):
+      if self.lg[LGID].shadow == None:
+        self.lg[LGID].read()
+      shadow = self.lg[LGID].shadow
+      if shadow != None:
+        for bit in list(bits[LGID].keys()):
+          if bool(bits[LGID][bit]) == bool(Math.Bin.getbit(shadow, bit)):
+            del bits[LGID][bit]
+      if not bits[LGID]:
+        del bits[LGID]
+    LGdata = self._write_latch_bits(bits)
+    changed["latches"] = list(LGdata.keys())
+    if 'X' in LGdata:
+      if LGdata['X'] != None and \
+         self.lg['X'].readback in ["on demand", "never"]:
+        for ID in list(self.crossSwitch.data.keys()):
+          self.crossSwitch.data[ID].state = bool(config.crossover)
+        changed["crossover"] = self.crossSwitch.get_state()
+      else:
+        changed["crossover"] = self.crossSwitch.get_state(
+                                                       self.lg['PLL'].read())
+    for name, switches, states in [("polarizers", self.pol_sec,
+                                                  config.polarizers),
+                                   ("IF_hybrids", self.DC, config.IF_hybrids)]:
+      for key in list(states.keys()):
+        LGID, latchbit = switches[key]._get_latch_info()
+        if LGID in LGdata and latchbit in bits[LGID]:
+          changed[name][key] = switches[key].get_state(LGdata[LGID])
+    attens = {}
+    for ID in list(config.attens.keys()):
+      atten = self.pol_sec[ID[:5]].atten[ID]
+      if config.attens[ID] != None and config.attens[ID] != atten.get_atten():
+        attens[ID] = config.attens[ID]
+    if attens:
+      changed["attens"] = self.set_attens(attens)
+    changed["time"] = time.time() - start
+    self.logger.debug("apply: %s", changed)
+    return changed
+
+  def _write_latch_bits(self, bits):
+    """
+    Writes new bits to latch groups, with one write for each group
+
+    The groups are written in address order.  Every group has its own address,
+    so each write selects it; the order does not save any USB transactions.
+
+    @param bits : new bit values keyed by bit number, keyed by latch group
+    @type  bits : dict of str:dict
+
+    @return: dict of bytes written (None if the write failed) keyed by group
+    """
+    LGIDs = list(bits.keys())
+    LGIDs.sort(key=lambda LGID: self.lg[LGID].address)
+    LGdata = {}
+    for LGID in LGIDs:
+      LGdata[LGID] = self.lg[LGID].update(bits[LGID])
+      if LGdata[LGID] == None:
+        self.logger.error("_write_latch_bits: write to LG %s failed", LGID)
+    return LGdata
+
+  def _set_switches(self, switches, states):
+    """
+    Sets switches which share latch groups
+
+    The new bits are collected per latch group, each affected group is written
+    once, and the switch states are updated from the bytes written.
+
+    @param switches : PolSection or DownConv instances keyed by name
+    @type  switches : dict
+
+    @param states : new states keyed by switch name
+    @type  states : dict of str:bool
+
+    @return: dict of states keyed by switch name
+    """
+    bits = {}
+    for key in list(states.keys()):
+      LGID, latchbit = switches[key]._get_latch_info()
+      if LGID not in bits:
+        bits[LGID] = {}
+      bits[LGID][latchbit] = states[key]
+    LGdata = self._write_latch_bits(bits)
+    results = {}
+    for key in list(states.keys()):
+      LGID, latchbit = switches[key]._get_latch_info()
+      results[key] = switches[key].get_state(LGdata[LGID])
+    return results
       
   class TransferSwitch(MCobject):
     """
@@ -417,7 +1067,12 @@ class WBDC2hwif(MCobject):
 
     At some point this might become a general transfer switch class
     """
-    def __init__(self, parent, name):
+    def __init__(self, parent, name, status=None):
+      """
+      @param status : byte from which to take the initial state, e.g. from
+                      the state journal; default: the status latch group
+      @type  status : int
+      """
       mylogger = logging.getLogger(parent.logger.name+".TransferSwitch")
       self.name = name
       self.parent = parent
@@ -426,16 +1081,22 @@ class WBDC2hwif(MCobject):
       self.states = {}
       self.data = {}
       for key in [1,2]:
-        self.data[key] = self.Xswitch(self, str(key))       
+        self.data[key] = self.Xswitch(self, str(key), status=status)
+      self.get_state()
 
-    def get_state(self):
+    def get_state(self, status=None):
       """
       Get the state of the beam cross-over switches
+
+      @param status : switch status byte, if it has already been read
+      @type  status : int
       """
       keys = list(self.data.keys())
       self.logger.debug("get_state: checking switches %s", keys)
       keys.sort()
       for ID in keys:
+        if status != None:
+          self.data[ID].get_state(status)
         self.states[ID] = self.data[ID].state
       if self.states[keys[0]] != self.states[keys[1]]:
         self.logger.error("%s sub-switch states do not match",str(self))
@@ -460,13 +1121,16 @@ class WBDC2hwif(MCobject):
     class Xswitch(MCgroup):
       """
       """
-      def __init__(self, parent, name, active=True):
+      def __init__(self, parent, name, active=True, status=None):
         self.name = name
         self.parent = parent
         self.logger = logging.getLogger(parent.logger.name+".Xswitch")
-        self.state = self.get_state()
+        if status == None:
+          # the status byte may already have been read for the other switch
+          status = parent.parent.lg['PLL'].shadow
+        self.state = self.get_state(status)
 
-      def get_state(self):
+      def get_state(self, status=None):
         """
         Get the state from the hardware switch.
 
@@ -478,11 +1142,14 @@ class WBDC2hwif(MCobject):
 
         WBDC2 is different from WBDC1 in the use of the latchgroup bits.
 
+        @param status : status byte, if it has already been read
+        @type  status : int
         """
         self.logger.debug("get_state:  for %s", self)
         rx = self.parent.parent # WBDC_core instance which owns the latch group
         try:
-          status = rx.lg['PLL'].read()
+          if status == None:
+            status = rx.lg['PLL'].read()
           self.logger.debug("get_state: Latch Group %s data = %s", rx.lg['PLL'],
                             Math.decimal_to_binary(status,8))
           test_bit_value = int(self.name)
@@ -498,34 +1165,28 @@ class WBDC2hwif(MCobject):
 
         The switch is controlled by bits 0 and 1 of latch group 1 (address 80)
         of Labjack 1. Low (value = 0) is for crossed and high is for through.
+
+        The control bit is changed in the shadow copy of the latch group, which
+        is written without being read first.  The switch position is sensed
+        afterwards unless the latch readback policy defers verification.
         """
         self.logger.debug("set_state:  for %s", self)
         rx = self.parent.parent # WBDC_core instance which owns the latch group
-        # get the current bit states
-        try:
-          status = rx.lg['X'].read()
-          self.logger.debug("set_state: Latch Group %s data = %s", rx.lg['X'],
-                            Math.decimal_to_binary(status,8))
-        except AttributeError as details:
-          self.logger.error("set_state: status read failed: %s", details)
-          return False
         ctrl_bit = int(self.name)-1
-        if crossover:
-          value = Math.Bin.setbit(status, ctrl_bit)
-        else:
-          value = Math.Bin.clrbit(status, ctrl_bit)
         try:
-          self.logger.debug("set_state: writing %s",
-                            Math.decimal_to_binary(value,8))
-          status = rx.lg['X'].write(value)
-          if status:
-            self.logger.debug("set_state: write succeeded")
-          else:
-            self.logger.error("set_state: write failed")
+          value = rx.lg['X'].update({ctrl_bit: crossover})
         except AttributeError as details:
           self.logger.error("set_state: write failed: %s", details)
           return False
-        self.state = self.get_state()
+        if value == None:
+          self.logger.error("set_state: write failed")
+        else:
+          self.logger.debug("set_state: wrote %s",
+                            Math.decimal_to_binary(value,8))
+        if value != None and rx.lg['X'].readback in ["on demand", "never"]:
+          self.state = bool(crossover)
+        else:
+          self.state = self.get_state()
         self.logger.debug("set_state: Xswitch state = %d", self.state)
         return self.state
 
@@ -556,18 +1217,23 @@ class WBDC2hwif(MCobject):
       self.name = name
       self.logger.debug(" initializing %s", self)
       chan = int(name[3:]) - 18 # I don't like taking this from the name
-      # I don't like testing on the name but I can't think of a better way
-      if re.search('R1', name):
-          self.tdac = LJTickDAC(self.parent.LJ[2], self.name, IO_chan=chan)
-      else:
-          self.tdac = LJTickDAC(self.parent.LJ[3], self.name, IO_chan=chan)
+      self.tdac = LJTickDAC(self.parent.LJ[WBDC2hwif.tdac_LJ[name[:2]]],
+                            self.name, IO_chan=chan)
       self.atten = {}
       for key in WBDC2hwif.pol_names:
         att_name = self.name+'-'+key
         self.atten[att_name] = self.IFattenuator(self, att_name)
         self.logger.debug("created attenuator %s", self.atten[att_name])
 
-    def get_state(self):
+    def _get_latch_info(self):
+      """
+      Returns the latch group and bit which control this pol section
+      """
+      LGID = self.data['receiver']+'P'
+      latchbit = (int(self.data['band'])-18)//2
+      return LGID, latchbit
+
+    def get_state(self, LGdata=None):
       """
       Returns the state of the polarization conversion section.
 
@@ -575,13 +1241,16 @@ class WBDC2hwif(MCobject):
 
       The pol section needs to know what band it belongs to to know what
       latches to use.  If that isn't available, return the default.
+
+      @param LGdata : latch group byte, if it has already been read
+      @type  LGdata : int
       """
       # Do this only if the subclass has been defined
-      LGID = self.data['receiver']+'P'
-      LGdata = self.parent.lg[LGID].read()
+      LGID, latchbit = self._get_latch_info()
+      if LGdata == None:
+        LGdata = self.parent.lg[LGID].get()
       self.logger.debug("get_state: LG %s returned %s", LGID,
                         Math.decimal_to_binary(LGdata,8))
-      latchbit = (int(self.data['band'])-18)/2
       self.logger.debug("get_state: test bit is %d", latchbit)
       self.state = Math.Bin.getbit(LGdata,latchbit)
       self.logger.debug("get_state: state is %d", self.state)
@@ -596,23 +1265,15 @@ class WBDC2hwif(MCobject):
       The pol section needs to know what band it belongs to to know what
       latches to use.
       """
-      # First get the current state of the latches
-      LGID = self.data['receiver']+'P'
-      latchbit = (int(self.data['band'])-18)/2
-      LGdata = self.parent.lg[LGID].read()
-      self.logger.debug("set_state: LG %s returned %s", LGID,
-                        Math.decimal_to_binary(LGdata,8))
-      # Now change the appropriate bit
-      if state:
-        newdata = Math.Bin.setbit(LGdata,latchbit)
-      else:
-        newdata = Math.Bin.clrbit(LGdata,latchbit)
+      LGID, latchbit = self._get_latch_info()
+      # Change the appropriate bit of the latch group's shadow and write it
+      newdata = self.parent.lg[LGID].update({latchbit: state})
+      if newdata == None:
+        self.logger.error("set_state: write to LG %s failed", LGID)
+        return self.get_state()
       self.logger.debug("set_state: new data is %s",
                         Math.decimal_to_binary(newdata,8))
-      # Write the new control word
-      self.parent.lg[LGID].write(newdata)
-      # Check it
-      self.get_state()
+      self.state = Math.Bin.getbit(newdata,latchbit)
       return self.state
 
     class IFattenuator(PINattenuator):
@@ -630,16 +1291,39 @@ class WBDC2hwif(MCobject):
         else:
           vs = self.parent.tdac['B']
           
-        if self.name in WBDC2hwif.splines[1][0]:
-          ctlV_spline =                WBDC2hwif.splines[1][0][self.name]
-          min_gain, max_gain, ignore = WBDC2hwif.splines[1][1][self.name]
-        else:
-          ctlV_spline =                WBDC2hwif.splines_lab[1][0][self.name]
-          min_gain, max_gain, ignore = WBDC2hwif.splines_lab[1][1][self.name]
+        calibration = WBDC2hwif.get_calibration()
+        ctlV_spline = calibration.ctlV_function(self.name)
+        min_gain, max_gain = calibration.gain_range(self.name)
         PINattenuator.__init__(self, parent, name, vs, ctlV_spline,
                                min_gain, max_gain)
+        self.ctlV_spline = ctlV_spline
         self.logger = mylogger
 
+      def set_atten(self, atten):
+        """
+        Sets the attenuation and records it in the receiver's state journal
+
+        The range check and the control voltage are those of
+        WBDC2hwif.set_attens(), for all attenuators alike.
+        """
+        self.parent.parent.set_attens({self.name: atten})
+
+      def _apply_voltage(self, atten, volts):
+        """
+        Sets a control voltage already computed for an attenuation
+
+        @param atten : attenuation in dB, or None if not known
+        @type  atten : float
+
+        @param volts : control voltage, e.g. from control_voltages()
+        @type  volts : float
+        """
+        self.VS.setVoltage(volts)
+        self.atten = atten
+        journal = self.parent.parent.journal
+        if journal:
+          journal.record_atten(self.name, atten, volts)
+
   class DownConv(MCgroup):
     """
     Converts RF to IF
@@ -675,13 +1359,18 @@ class WBDC2hwif(MCobject):
                         latchbit, LGID)
       return LGID, latchbit
 
-    def get_state(self):
+    def get_state(self, latchdata=None):
       """
+      Returns the state of the IF hybrid
+
+      @param latchdata : latch group byte, if it has already been read
+      @type  latchdata : int
       """
       if 'receiver' in self.data:
         LGID, latchbit = self._get_latch_info()
         try:
-          latchdata = self.parent.lg[LGID].read()
+          if latchdata == None:
+            latchdata = self.parent.lg[LGID].get()
         except Exception as details:
           self.logger.error("_get_state: read failed: %s", str(details))
         self.state = Math.Bin.getbit(latchdata, latchbit)
@@ -694,97 +1383,291 @@ class WBDC2hwif(MCobject):
       """
       if 'receiver' in self.data:
         LGID, latchbit = self._get_latch_info()
-        latchdata = self.parent.lg[LGID].read()
-        self.logger.debug("_set_state: latchdata was %s",
-                          Math.decimal_to_binary(latchdata,8))
-        if state:
-          latchdata = Math.Bin.setbit(latchdata, latchbit)
-        else:
-          latchdata = Math.Bin.clrbit(latchdata, latchbit)
-        self.logger.debug("_set_state: latchdata is %s",
-                          Math.decimal_to_binary(latchdata,8))
         try:
-          self.parent.lg[LGID].write(latchdata)
+          latchdata = self.parent.lg[LGID].update({latchbit: state})
         except Exception as details:
           self.logger.error("_set_state: write failed: %s", str(details))
+          latchdata = None
+        if latchdata != None:
+          self.logger.debug("_set_state: latchdata is %s",
+                            Math.decimal_to_binary(latchdata,8))
+          self.state = Math.Bin.getbit(latchdata, latchbit)
+          return self.state
       self.get_state()
       return self.state
 
   class AnalogMonitor(MCobject):
     """
+    Reads the analog monitor points of the motherboard
+
+    A monitor point is selected by writing its address to latch group A1 or
+    A2 and is read at two analog inputs.  The latch writes and the analog
+    input reads for all the points of a latch group are compiled into an
+    acquisition plan, a list of feedback packets which are sent one after the
+    other.
     """
+    # time for the analog multiplexers to settle before a point is sampled
+    settle = 0.001
+
     def __init__(self, parent, mon_points):
       """
       """
       self.parent=parent
       self.logger = logging.getLogger(self.parent.logger.name+".AnalogMonitor")
+      self.mon_points = mon_points
+      self.plans = {}
+      self.compile_conversions()
+
+    def compile_conversions(self, table=None, rules=None):
+      """
+      Compiles the conversion of the readings to engineering units
+
+      @param table : (scale, offset, unit) keyed by reading label;
+                     default: WBDC2hwif.mon_conversions
+      @type  table : dict of tuples
+
+      @param rules : (pattern, scale, offset, unit) for readings not in the
+                     table; default: WBDC2hwif.mon_conversion_rules
+      @type  rules : list of tuples
+      """
+      from .calibration import MonitorConversion
+      if table == None:
+        table = WBDC2hwif.mon_conversions
+      if rules == None:
+        rules = WBDC2hwif.mon_conversion_rules
+      labels = []
+      for latchgroup, point in self.all_points():
+        for label in self.mon_points[latchgroup][point][1:3]:
+          if label.strip() and label.strip() not in labels:
+            labels.append(label.strip())
+      self.conversion = MonitorConversion(labels, table, rules)
+
+    def all_points(self, latchgroup=None):
+      """
+      Returns the keys (latch group, point) of the monitor points
+
+      @param latchgroup : only the points of this group; default: all
+      @type  latchgroup : int
+      """
+      if latchgroup == None:
+        latchgroups = sorted(self.mon_points.keys())
+      else:
+        latchgroups = [latchgroup]
+      return [(LGnum, point) for LGnum in latchgroups
+                             for point in sorted(self.mon_points[LGnum].keys())]
+
+    def point_keys(self, labels):
+      """
+      Returns the keys of the monitor points which give the labelled readings
+
+      Some readings, like "+16 V", are made at several points; the last one is
+      used, as in a full scan.
+
+      @param labels : reading labels, as returned by get_monitor_data()
+      @type  labels : list of str
+
+      @return: list of (latch group, point) in scan order
+      """
+      keys = []
+      for label in labels:
+        found = None
+        for key in self.all_points():
+          if label in [name.strip() for name in
+                       self.mon_points[key[0]][key[1]][1:3]]:
+            found = key
+        if found == None:
+          raise ObservatoryError(label, "is not a monitor point")
+        if found not in keys:
+          keys.append(found)
+      keys.sort()
+      return keys
+
+    def acquisition_plan(self, points):
+      """
+      Returns the feedback packets which read a list of monitor points
+
+      For each point the latch write, a wait for the multiplexers to settle
+      and the two analog input reads follow each other.  The points are
+      packed whole into as few packets as the U3 packet size allows; a point
+      which is too long for one packet is split over two.  Each packet ends
+      with one port read, which returns the latch address on EIO.  A plan is
+      compiled when first needed and kept.
+
+      A point takes 49 to 61 of the 57 command bytes of a packet, depending
+      on how often SDI changes, so a packet holds one point and a point of
+      57 bytes or more spills into a second packet.  The 16 points of A1 take
+      24 packets and the 4 points of A2 take 4.
+
+      @param points : (latch group, point) keys in the order to be read
+      @type  points : list of tuples of int
+
+      @return: list of (commands, readings, address, interruptible) with a
+               reading (label, AIN channel, result index) for each analog
+               input read; 'address' is the latch address the port read
+               should return and 'interruptible' is True if the packet ends
+               with a whole point
+      """
+      points = tuple(points)
+      if points in self.plans:
+        return self.plans[points]
+      groups = []
+      readings = []
+      starts = []
+      ends = set()
+      first = 0
+      for latchgroup, point in points:
+        LG = self.parent.lg['A'+str(latchgroup)]
+        mon_data = self.mon_points[latchgroup]
+        commands = LG._write_commands(mon_data[point][0], verify=False)
+        commands += wait_commands(self.settle)
+        for dataset in [0,1]:
+          label = mon_data[point][dataset+1].strip()
+          AINnum = (latchgroup-1)*2+dataset
+          readings.append((label, AINnum, first+len(commands)))
+          commands.append(u3.AIN(AINnum, 31, LongSettling=False,
+                                 QuickSample=False))
+        groups.append(commands)
+        starts.append((first, LG.address))
+        first += len(commands)
+        ends.add(first)
+      plan = []
+      first = 0
+      for packet in pack_feedback(groups, tail=[u3.PortStateRead()]):
+        last = first + len(packet) - 1
+        address = [address for start, address in starts if start < last][-1]
+        plan.append((packet, [(label, AINnum, index-first)
+                              for label, AINnum, index in readings
+                              if first <= index < last],
+                     address, last in ends))
+        first = last
+      self.logger.debug("acquisition_plan: %d points in %d packets",
+                        len(points), len(plan))
+      self.plans[points] = plan
+      return plan
+
+    def scan(self, points):
+      """
+      Reads monitor points with an acquisition plan
+
+      Each reading is time-stamped with the middle of the USB transaction in
+      which it was made.  When run by the owner thread of the LabJack, the
+      scan lets waiting control commands go first after each packet which
+      ends with a whole point.
+
+      If a packet does not end with the expected latch address, the readings
+      of the points it wrote are left out, as if those points had not been
+      scanned, and the shadows of the monitor latch groups are forgotten.
+
+      @param points : (latch group, point) keys in the order to be read
+      @type  points : list of tuples of int
+
+      @return: dict of (time, volts) keyed by reading label
+      """
+      LJ = self.parent.lg['A1'].LJ
+      bus = self.parent.lg['A1'].bus
+      owner = self.parent.owner[1]
+      analog_data = {}
+      valid = True
+      failed = False
+      with bus.lock:
+        for commands, readings, address, interruptible in \
+                                             self.acquisition_plan(points):
+          start = time.time()
+          results = bus.feedback(commands)
+          timestamp = (start + time.time())/2
+          if results[-1]['EIO'] != address:
+            self.logger.error("scan: requested latch %d but got %d",
+                              address, results[-1]['EIO'])
+            valid = False
+            failed = True
+          if valid:
+            for label, AINnum, index in readings:
+              # the high voltage U3 has +/-10 V inputs at AIN0-AIN3
+              lowV = not (getattr(LJ, 'isHV', False) and AINnum < 4)
+              volts = LJ.binaryToCalibratedAnalogVoltage(results[index],
+                                                       isLowVoltage=lowV,
+                                                       isSingleEnded=True,
+                                                       isSpecialSetting=False,
+                                                       channelNumber=AINnum)
+              analog_data[label] = (timestamp, volts)
+          if interruptible:
+            # no monitor point is half done, so other latches may be written
+            valid = True
+            owner.preempt()
+        for latchgroup, point in points:
+          if failed:
+            self.parent.lg['A'+str(latchgroup)].shadow = None
+          else:
+            self.parent.lg['A'+str(latchgroup)].shadow = \
+                                          self.mon_points[latchgroup][point][0]
+      return analog_data
 
     def read_analogs(self, latchgroup=1):
       """
+      Returns the voltages at the monitor points of a latch group
+
+      @return: dict of volts keyed by reading label
       """
       self.logger.debug("read_analogs: latch group=%d", latchgroup)
-      latchAddress = latchgroup - 1
-      self.logger.debug("read_analogs: latch address=%d", latchAddress)
-      LGname = 'A'+str(latchgroup)
-      self.logger.debug("read_analogs: latch name=%s", LGname)
-      mon_data = WBDC2hwif.mon_points[latchgroup]
-      mon_pts = list(mon_data.keys())
-      mon_pts.sort()
-      self.logger.debug("read_analogs: monitor points: %s", mon_pts)
       analog_data = {}
-      for point in mon_pts:
-        mon_pt_addr = mon_data[point][0]
-        self.logger.debug("read_analogs: sending %d", mon_pt_addr)
-        self.parent.lg[LGname].write(mon_pt_addr)
-        for dataset in [0,1]:
-          self.logger.debug('read_analogs: dataset=%d',dataset)
-          label =  mon_data[point][dataset+1].strip()
-          self.logger.debug('read_analogs: reading %s', label)
-          AINnum = latchAddress*2+dataset
-          # in the next line, LGname can be A1 or A2
-          self.logger.debug("read_analogs: reading AIN%d", AINnum)
-          analog_data[label] = self.parent.lg[LGname].LJ.getAIN(AINnum)
-          self.logger.debug("read_analogs: read %f", analog_data[label])
+      scan = self.scan(self.all_points(latchgroup))
+      for label in list(scan.keys()):
+        analog_data[label] = scan[label][1]
       return analog_data
 
-    def get_monitor_data(self, latchgroup=1):
+    def get_monitor_data(self, latchgroup=1, timestamps=False):
       """
+      Returns the converted values of the monitor points of a latch group
+
+      @param timestamps : return (time, value) instead of value
+      @type  timestamps : bool
+      """
+      return self.read_points(self.all_points(latchgroup), timestamps)
+
+    def read_points(self, points, timestamps=False):
+      """
+      Returns the converted values of a list of monitor points
+
+      @param points : (latch group, point) keys in the order to be read
+      @type  points : list of tuples of int
+
+      @param timestamps : return (time, value) instead of value
+      @type  timestamps : bool
+
+      @return: dict keyed by reading label
       """
       monitor_data = {}
-      analog_data = self.read_analogs(latchgroup)
-      for ID in list(analog_data.keys()):
-        if ID:
-          monitor_data[ID] = self.convert_analog(ID, analog_data[ID])
+      analog_data = self.scan(points)
+      labels = [ID for ID in list(analog_data.keys()) if ID]
+      volts = [analog_data[ID][1] for ID in labels]
+      conversion = self.conversion
+      values = conversion.convert(volts,
+                                  conversion.channels(labels)).tolist()
+      for ID, value in zip(labels, values):
+        if timestamps:
+          monitor_data[ID] = (analog_data[ID][0], value)
+        else:
+          monitor_data[ID] = value
       return monitor_data
 
     def convert_analog(self, ID, value):
       """
-      This works in conjunction with the monitor point keys
+      Converts a monitor reading to engineering units
+
+      @param ID : reading label
+      @type  ID : str
+
+      @param value : reading in volts
+      @type  value : float
       """
       self.logger.debug("convert_analog: called for %s for %f", ID, value)
-      if ID == '+6 V dig':
-        return value*4.0211
-      elif ID == '+6 V ana':
-        return value*4.0278
-      elif ID == '+16 V':
-        return value*10.5446
-      elif ID == '+12 V':
-        return value*10.5827
-      elif ID == '-16 V':
-        return value*-10.5446
-      elif re.search(' V ', ID):
-        # This must be a current
-        return value-0.026
-      elif re.search('plane', ID):
-        # This must be RF power
-        return (value-0.004)*2.0064
-      elif re.search('plate', ID):
-        # This must be a temperature
-        return (value+0.2389275)*23.549481
-      else:
+      if ID not in self.conversion.index:
         self.logger.error("convert_analogs: unknown ID: %s", ID)
+        return None
+      channel = self.conversion.index[ID]
+      return float(self.conversion.scale[channel]*
+                   (value + self.conversion.offset[channel]))
 
-       
   # ------------------------------- WBDC2hwif methods -------------------------
 
   def has_labjack(self, localID):
@@ -126,6 +126,97 @@ def show_signal(parent, ports):
   for key in sigkeys:
     logger.debug("show_signal:  %s = %s", key, test.signal[key])
 
+class HardwareBatch(object):
+  """
+  Records hardware server calls and sends them in one round trip
+
+  Used through WBDC2.batch()::
+    with wbdc.batch() as batch:
+      batch.set_atten('R1-18-E', 5.0)
+      batch.set_polarizers(True)
+      states = batch.get_polarizers()
+    print(states.value)
+
+  Each recorded call returns a BatchResult whose 'value', 'error' and 'time'
+  are filled in when the batch is sent, at the end of the 'with' block.  The
+  server runs only its hardware getters and setters in a batch (see
+  WBDC2hwServer.batch_methods); other calls come back with an error.
+  """
+  def __init__(self, hardware, stop_on_error=False):
+    """
+    @param hardware : hardware server proxy, or None
+    @type  hardware : Pyro proxy
+
+    @param stop_on_error : skip the rest of the batch after a failure
+    @type  stop_on_error : bool
+    """
+    self.hardware = hardware
+    self.stop_on_error = stop_on_error
+    self.operations = []
+    self.results = []
+
+  def __getattr__(self, method):
+    if method.startswith("_"):
+      raise AttributeError(method)
+    def record(*args, **kwargs):
+      self.operations.append((method, list(args), kwargs))
+      self.results.append(BatchResult(method))
+      return self.results[-1]
+    return record
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type == None:
+      self.flush()
+    return False
+
+  def flush(self):
+    """
+    Sends the recorded calls and fills in their results
+
+    @return: list of BatchResult
+    """
+    results, operations = self.results, self.operations
+    self.results, self.operations = [], []
+    if not operations:
+      return results
+    if self.hardware:
+      replies = self.hardware.execute_batch(operations, self.stop_on_error)
+    else:
+      replies = [{"result": None, "error": "no hardware server", "time": 0.0}
+                 for operation in operations]
+    for result, reply in zip(results, replies):
+      result.value = reply["result"]
+      result.error = reply["error"]
+      result.time = reply["time"]
+      if result.error:
+        logger.error("HardwareBatch.flush: %s: %s", result.method,
+                     result.error)
+    return results
+
+class BatchResult(object):
+  """
+  Result of a call recorded by a HardwareBatch
+
+  Public attributes::
+    method - name of the server method
+    value  - what it returned, once the batch was sent
+    error  - None, or the exception it raised as a string
+    time   - seconds it took on the server
+  """
+  def __init__(self, method):
+    self.method = method
+    self.value = None
+    self.error = None
+    self.time = None
+
+  def __repr__(self):
+    if self.error:
+      return "BatchResult(%s: %s)" % (self.method, self.error)
+    return "BatchResult(%s: %r)" % (self.method, self.value)
+
 class WBDC2(WBDC_base, Receiver):
   """
   Wideband Downconverter Mod 2 client
@@ -283,6 +374,13 @@ class WBDC2(WBDC_base, Receiver):
   def stop_recording(self):
     pass
 
+  def batch(self, stop_on_error=False):
+    """
+    Returns a HardwareBatch which sends the calls made in a 'with' block to
+    the hardware server in one round trip
+    """
+    return HardwareBatch(self.hardware, stop_on_error)
+
   # cross-over switch
   @auto_test()
   def set_crossover(self, crossover):
@@ -0,0 +1,715 @@
+"""
+Module WBDC.WBDC2.calibration provides fast calibration lookups
+
+These are for the PIN attenuators and for the analog monitor points.
+
+The PIN diode calibration (see doc/PIN_diode-cals/interp_att.py) consists of a
+pair of cubic spline interpolators for each attenuator::
+  (att_spline, V_sample_range), (ctlV_spline, att_sample_range)
+'att_spline' gives the gain (negative dB) for a control voltage and
+'ctlV_spline' the control voltage for a gain.  The sample ranges are
+(start, stop, step) and delimit the valid domain of each spline.
+
+Calling an interp1d instance costs tens of microseconds, mostly overhead.  A
+LookupTable samples the splines of all channels on uniform grids and stores
+them as one float32 array.  A lookup is then a linear interpolation between
+two table entries, for one value or for arrays of channels and values.
+
+The grid spacing h is chosen so that linear interpolation of a cubic spline f
+stays within the requested error::
+  |error| <= h**2/8 * max|f''|
+f'' of a cubic spline is linear between knots, so its maximum is found at the
+knots.  The float32 rounding of the table entries is included in the bound.
+
+Calibration Store
+=================
+A calibration store is a .npy file holding a structured array with one record
+per channel and calibration generation.  A record has the measured control
+voltages and gains ('knots') from which the splines are made, the sample
+ranges, the lookup tables compiled from the splines with their errors, the PIN
+attenuator serial number, a version label and the date.  Each new calibration
+is added as a new generation.  The file is memory-mapped when it is opened, and
+the tables of a channel are taken from the latest generation which has the
+channel, so loading a calibration needs neither scipy nor a spline fit.  See
+doc/PIN_diode-cals/make_store.py for making a store from splines pickles.
+
+Analog Monitor Conversion
+=========================
+A monitor reading is converted from volts to engineering units with::
+  value = scale*(volts + offset)
+A MonitorConversion gives every reading label a channel index and keeps the
+scales, offsets and units of the channels in arrays, so that the readings of
+one scan, or of a whole archive of raw scans, are converted in one operation.
+The constants come from a table which is easily edited (see
+WBDC2hwif.mon_conversions).
+"""
+import datetime
+import functools
+import logging
+import numpy
+import os
+import os.path
+import tempfile
+
+module_logger = logging.getLogger(__name__)
+
+class LookupTable(object):
+  """
+  Uniformly sampled tables of functions of one variable, one for each channel
+
+  Public attributes::
+    names     - channel names, in table order
+    start     - first sample point of each channel
+    stop      - last sample point of each channel
+    step      - spacing of the sample points of each channel
+    sizes     - number of sample points of each channel
+    size      - largest number of sample points of any channel
+    values    - float32 array of shape (channels, size)
+    max_error - guaranteed maximum interpolation error of each channel
+  """
+  def __init__(self, functions, ranges, max_error, max_size=1 << 16):
+    """
+    @param functions : interpolators keyed by channel name
+    @type  functions : dict of interp1d instances
+
+    @param ranges : (start, stop, step) of the valid domain keyed by channel
+    @type  ranges : dict of tuples of float
+
+    @param max_error : largest allowed interpolation error
+    @type  max_error : float
+
+    @param max_size : largest allowed number of samples per channel
+    @type  max_size : int
+    """
+    self.logger = logging.getLogger(module_logger.name+".LookupTable")
+    names = sorted(functions.keys())
+    lows = numpy.array([min(ranges[name][:2]) for name in names])
+    highs = numpy.array([max(ranges[name][:2]) for name in names])
+    curvature = numpy.array([max_curvature(functions[name]) for name in names])
+    # the same number of samples for all channels, enough for the worst one
+    size = 2
+    while size < max_size:
+      step = (highs - lows)/(size - 1)
+      if (step**2/8*curvature).max() <= max_error/2:
+        break
+      size *= 2
+    step = (highs - lows)/(size - 1)
+    values = numpy.empty((len(names), size), dtype=numpy.float32)
+    for i, name in enumerate(names):
+      values[i] = functions[name](numpy.linspace(lows[i], highs[i], size))
+    rounding = numpy.abs(values).max(axis=1)*numpy.finfo(numpy.float32).eps
+    self._set_tables(names, lows, highs, values, [size]*len(names),
+                     step**2/8*curvature + rounding)
+    if self.max_error.max() > max_error:
+      self.logger.warning("__init__: largest error %g exceeds %g with %d samples",
+                          self.max_error.max(), max_error, size)
+    self.logger.debug("__init__: %d channels of %d samples", len(self.names),
+                      size)
+
+  @classmethod
+  def from_arrays(cls, names, start, stop, values, sizes, max_error):
+    """
+    Returns a table made from samples computed before, e.g. from a store
+
+    No interpolators are needed, so this does not import scipy.
+
+    @param names : channel names, in table order
+    @type  names : list of str
+
+    @param start : first sample point of each channel
+    @type  start : list of float
+
+    @param stop : last sample point of each channel
+    @type  stop : list of float
+
+    @param values : samples, padded to the longest channel
+    @type  values : float32 array of shape (channels, samples)
+
+    @param sizes : number of samples of each channel
+    @type  sizes : list of int
+
+    @param max_error : interpolation error of each channel
+    @type  max_error : list of float
+    """
+    table = cls.__new__(cls)
+    table.logger = logging.getLogger(module_logger.name+".LookupTable")
+    table._set_tables(names, start, stop, values, sizes, max_error)
+    return table
+
+  def _set_tables(self, names, start, stop, values, sizes, max_error):
+    """
+    Sets the attributes from the sampled tables
+    """
+    self.names = list(names)
+    self.index = dict([(name, i) for i, name in enumerate(self.names)])
+    self.start = numpy.array(start, dtype=float)
+    self.stop = numpy.array(stop, dtype=float)
+    self.sizes = numpy.array(sizes, dtype=int)
+    self.size = int(self.sizes.max())
+    self.step = (self.stop - self.start)/(self.sizes - 1)
+    self.values = numpy.asarray(values, dtype=numpy.float32)
+    self.max_error = numpy.array(max_error, dtype=float)
+    self._ranges = [(float(self.start[i]), float(self.stop[i]),
+                     float(self.step[i]), int(self.sizes[i]) - 2)
+                    for i in range(len(self.names))]
+
+  def __repr__(self):
+    return "LookupTable(%d channels, %d samples)" % (len(self.names), self.size)
+
+  def lookup(self, name, x):
+    """
+    Returns the interpolated value(s) for one channel
+
+    @param name : channel name
+    @type  name : str
+
+    @param x : point(s) at which to evaluate
+    @type  x : float or numpy array
+
+    @return: float or numpy array of float
+    """
+    channel = self.index[name]
+    if numpy.ndim(x):
+      return self.lookup_many(numpy.full(numpy.shape(x), channel), x)
+    # plain floats are much faster than numpy scalars for a single value
+    start, stop, step, last = self._ranges[channel]
+    if x < start or x > stop:
+      raise ValueError("%s outside the calibrated range %s to %s" %
+                       (x, start, stop))
+    position = (x - start)/step
+    i = min(int(position), last)
+    below = float(self.values[channel, i])
+    return below + (position - i)*(float(self.values[channel, i+1]) - below)
+
+  def lookup_many(self, channels, x):
+    """
+    Returns interpolated values for arrays of channels and points
+
+    @param channels : channel names or table indices
+    @type  channels : list or numpy array
+
+    @param x : points, one for each channel
+    @type  x : list or numpy array of float
+
+    @return: numpy array of float
+    """
+    channels = numpy.asarray(channels)
+    if channels.dtype.kind in "US":
+      channels = numpy.array([self.index[name] for name in channels.flat],
+                             dtype=int).reshape(channels.shape)
+    x = numpy.asarray(x, dtype=float)
+    start = self.start[channels]
+    outside = (x < start) | (x > self.stop[channels])
+    if outside.any():
+      raise ValueError("%s outside the calibrated range" % x[outside])
+    position = (x - start)/self.step[channels]
+    i = numpy.minimum(position.astype(int), self.sizes[channels] - 2)
+    fraction = position - i
+    below = self.values[channels, i]
+    above = self.values[channels, i+1]
+    return below + fraction*(above - below)
+
+def max_curvature(function):
+  """
+  Returns the largest second derivative of a spline interpolator
+
+  The second derivative of a cubic spline is linear between the knots.  If
+  the interpolator does not expose its spline, the second derivative is
+  estimated by finite differences on a fine grid.
+
+  @param function : cubic spline interpolator
+  @type  function : interp1d instance
+  """
+  try:
+    knots = function._spline.t
+    return numpy.abs(function._spline.derivative(2)(knots)).max()
+  except AttributeError:
+    x = numpy.linspace(function.x.min(), function.x.max(), 10001)
+    y = function(x)
+    h = x[1] - x[0]
+    return numpy.abs(numpy.diff(y, 2)).max()/h**2
+
+def compile_splines(splines, max_dB_error=0.01, max_V_error=0.001):
+  """
+  Compiles a PIN attenuator calibration into lookup tables
+
+  @param splines : ((att_spline, V_sample_range), (ctlV_spline, att_sample_range))
+  @type  splines : tuple
+
+  @param max_dB_error : largest allowed error of the gain table
+  @type  max_dB_error : float
+
+  @param max_V_error : largest allowed error of the control voltage table
+  @type  max_V_error : float
+
+  @return: (gain table, control voltage table)
+  """
+  (att_spline, V_sample_range), (ctlV_spline, att_sample_range) = splines
+  return (LookupTable(att_spline, V_sample_range, max_dB_error),
+          LookupTable(ctlV_spline, att_sample_range, max_V_error))
+
+def merge_splines(*calibrations):
+  """
+  Combines calibrations, taking each channel from the first one which has it
+
+  @param calibrations : calibrations in order of preference
+  @type  calibrations : tuples as loaded from a splines pickle
+
+  @return: calibration with all the channels
+  """
+  att_spline, V_sample_range, ctlV_spline, att_sample_range = {}, {}, {}, {}
+  for (att, V_range), (ctlV, att_range) in reversed(calibrations):
+    att_spline.update(att)
+    V_sample_range.update(V_range)
+    ctlV_spline.update(ctlV)
+    att_sample_range.update(att_range)
+  return (att_spline, V_sample_range), (ctlV_spline, att_sample_range)
+
+def get_atten_IDs(filename):
+  """
+  Read the attenuator serial numbers from a comma-separated data file
+
+  Row 4 - serial number
+  Row 5 - Receiver chain
+  Row 6 - Frequency and polarization of channel
+
+  Each serial number is for a pair of attenuators, A and B.
+
+  @return: dict of serial numbers keyed by channel ID, e.g. 'R1-18-E'
+  """
+  serialnos = numpy.loadtxt(filename, delimiter=',', skiprows=3, dtype=str)[0,1:]
+  rxs =       numpy.loadtxt(filename, delimiter=',', skiprows=4, dtype=str)[0,1:]
+  headers =   numpy.loadtxt(filename, delimiter=',', skiprows=5, dtype=str)[0,1:]
+  ID = {}
+  for index in range(0, len(headers), 2):
+    chanIDa = rxs[index]+'-'+headers[index].replace(' ','-')
+    chanIDb = rxs[index]+'-'+headers[index+1].replace(' ','-')
+    ID[chanIDa] = serialnos[index]+'A'
+    ID[chanIDb] = serialnos[index]+'B'
+  return ID
+
+def store_dtype(max_knots, max_samples):
+  """
+  Returns the record type of a calibration store
+
+  @param max_knots : largest number of measured points of any channel
+  @type  max_knots : int
+
+  @param max_samples : largest number of lookup table samples of any channel
+  @type  max_samples : int
+  """
+  return numpy.dtype([("generation", "i4"),
+                      ("channel",    "U16"),
+                      ("serial",     "U16"),
+                      ("version",    "U32"),
+                      ("date",       "U10"),
+                      ("knots",      "i4"),
+                      ("volts",      "f8", (max_knots,)),
+                      ("gain",       "f8", (max_knots,)),
+                      ("V_range",    "f8", (3,)),
+                      ("gain_range", "f8", (3,)),
+                      ("gain_size",  "i4"),
+                      ("gain_table", "f4", (max_samples,)),
+                      ("gain_error", "f8"),
+                      ("ctlV_size",  "i4"),
+                      ("ctlV_table", "f4", (max_samples,)),
+                      ("ctlV_error", "f8")])
+
+def store_records(splines, serials={}, version="", date=None, generation=0):
+  """
+  Returns calibration store records for a calibration
+
+  The lookup tables are compiled here, so that loading the store does not
+  need to.
+
+  @param splines : calibration as loaded from a splines pickle
+  @type  splines : tuple
+
+  @param serials : PIN attenuator serial numbers keyed by channel
+  @type  serials : dict of str:str
+
+  @param version : label of the calibration
+  @type  version : str
+
+  @param date : date of the calibration, YYYY-MM-DD; default: today
+  @type  date : str
+
+  @param generation : calibration generation number
+  @type  generation : int
+
+  @return: numpy structured array
+  """
+  if date == None:
+    date = datetime.date.today().isoformat()
+  (att_spline, V_sample_range), (ctlV_spline, att_sample_range) = splines
+  channels = sorted(att_spline.keys())
+  max_knots = max([len(att_spline[channel].x) for channel in channels])
+  tables = dict(zip(("gain", "ctlV"), compile_splines(splines)))
+  max_samples = max([table.size for table in list(tables.values())])
+  records = numpy.zeros(len(channels),
+                        dtype=store_dtype(max_knots, max_samples))
+  for i, channel in enumerate(channels):
+    knots = len(att_spline[channel].x)
+    records[i]["generation"] = generation
+    records[i]["channel"] = channel
+    records[i]["serial"] = serials.get(channel, "")
+    records[i]["version"] = version
+    records[i]["date"] = date
+    records[i]["knots"] = knots
+    records[i]["volts"][:knots] = att_spline[channel].x
+    records[i]["gain"][:knots] = att_spline[channel].y
+    records[i]["V_range"] = V_sample_range[channel]
+    records[i]["gain_range"] = att_sample_range[channel]
+    for kind in list(tables.keys()):
+      table = tables[kind]
+      size = table.sizes[table.index[channel]]
+      records[i][kind+"_size"] = size
+      records[i][kind+"_table"][:size] = table.values[table.index[channel], :size]
+      records[i][kind+"_error"] = table.max_error[table.index[channel]]
+  return records
+
+def add_generation(filename, records):
+  """
+  Adds a calibration generation to a store, creating it if necessary
+
+  The new records get the next generation number.  The store is rewritten
+  through a temporary file so that it is never left incomplete.
+
+  @param filename : calibration store file
+  @type  filename : str
+
+  @param records : records from store_records()
+  @type  records : numpy structured array
+
+  @return: generation number of the new records
+  """
+  if os.path.exists(filename):
+    old = numpy.load(filename)
+    generation = old["generation"].max() + 1
+  else:
+    old = numpy.zeros(0, dtype=records.dtype)
+    generation = 0
+  dtype = store_dtype(
+           max(old.dtype["volts"].shape[0], records.dtype["volts"].shape[0]),
+           max(old.dtype["ctlV_table"].shape[0],
+               records.dtype["ctlV_table"].shape[0]))
+  store = numpy.zeros(len(old) + len(records), dtype=dtype)
+  for i, record in enumerate(list(old) + list(records)):
+    for field in store.dtype.names:
+      if store.dtype[field].shape:
+        # arrays are padded to the longest in the store
+        store[i][field][:len(record[field])] = record[field]
+      else:
+        store[i][field] = record[field]
+  store["generation"][len(old):] = generation
+  fd, tempname = tempfile.mkstemp(
+                       dir=os.path.dirname(os.path.abspath(filename)),
+                       suffix=".npy")
+  with os.fdopen(fd, "wb") as f:
+    numpy.save(f, store)
+  os.replace(tempname, filename)
+  return generation
+
+class CalibrationStore(object):
+  """
+  Memory-mapped calibration store
+  """
+  def __init__(self, filename):
+    """
+    @param filename : calibration store file
+    @type  filename : str
+    """
+    self.filename = filename
+    self.logger = logging.getLogger(module_logger.name+".CalibrationStore")
+    self.records = numpy.load(filename, mmap_mode="r")
+
+  def __repr__(self):
+    return "CalibrationStore("+repr(self.filename)+")"
+
+  def generations(self):
+    """
+    Returns the generation numbers in the store
+    """
+    return sorted(set(self.records["generation"].tolist()))
+
+  def select(self, generation=None):
+    """
+    Returns the record of each channel in a generation
+
+    A channel which is not in the generation is taken from the latest earlier
+    generation which has it.
+
+    @param generation : generation number; default: the latest
+    @type  generation : int
+
+    @return: dict of records keyed by channel
+    """
+    if generation == None:
+      generation = self.generations()[-1]
+    selected = {}
+    for record in self.records:
+      if record["generation"] > generation:
+        continue
+      channel = str(record["channel"])
+      if channel not in selected or \
+         record["generation"] > selected[channel]["generation"]:
+        selected[channel] = record
+    return selected
+
+  def serials(self, generation=None):
+    """
+    Returns the PIN attenuator serial numbers keyed by channel
+    """
+    selected = self.select(generation)
+    return dict([(channel, str(selected[channel]["serial"]))
+                 for channel in selected])
+
+  def calibration(self, generation=None):
+    """
+    Returns the calibration made from the stored lookup tables
+
+    @param generation : generation number; default: the latest
+    @type  generation : int
+
+    @return: AttenuatorCalibration instance
+    """
+    selected = self.select(generation)
+    channels = sorted(selected.keys())
+    records = [selected[channel] for channel in channels]
+    tables = []
+    for kind, domain in (("gain", "V_range"), ("ctlV", "gain_range")):
+      sizes = [int(record[kind+"_size"]) for record in records]
+      values = numpy.zeros((len(records), max(sizes)), dtype=numpy.float32)
+      for i, record in enumerate(records):
+        values[i, :sizes[i]] = record[kind+"_table"][:sizes[i]]
+      tables.append(LookupTable.from_arrays(channels,
+                       [min(record[domain][:2]) for record in records],
+                       [max(record[domain][:2]) for record in records],
+                       values, sizes,
+                       [record[kind+"_error"] for record in records]))
+    return AttenuatorCalibration(tables[0], tables[1], source=[self.filename])
+
+  def splines(self, generation=None):
+    """
+    Returns a calibration in the layout of a splines pickle
+
+    The splines are fitted again to the stored knots, for plotting and
+    checking; the receiver uses the stored tables (see calibration()).
+
+    @param generation : generation number; default: the latest
+    @type  generation : int
+    """
+    from scipy.interpolate import interp1d
+    att_spline, V_sample_range, ctlV_spline, att_sample_range = {}, {}, {}, {}
+    selected = self.select(generation)
+    for channel in list(selected.keys()):
+      record = selected[channel]
+      knots = record["knots"]
+      volts = numpy.array(record["volts"][:knots])
+      gain = numpy.array(record["gain"][:knots])
+      att_spline[channel] = interp1d(volts, gain, kind='cubic')
+      order = numpy.argsort(gain)
+      ctlV_spline[channel] = interp1d(gain[order], volts[order], kind='cubic')
+      V_sample_range[channel] = tuple(record["V_range"].tolist())
+      att_sample_range[channel] = tuple(record["gain_range"].tolist())
+    return (att_spline, V_sample_range), (ctlV_spline, att_sample_range)
+
+class AttenuatorCalibration(object):
+  """
+  An attenuator calibration as lookup tables
+
+  Public attributes::
+    gain_table - LookupTable of gain (negative dB) given control voltage
+    ctlV_table - LookupTable of control voltage given gain
+    source     - files from which the calibration was loaded
+  """
+  def __init__(self, gain_table, ctlV_table, source=[]):
+    """
+    @param gain_table : gain (negative dB) given control voltage
+    @type  gain_table : LookupTable instance
+
+    @param ctlV_table : control voltage given gain
+    @type  ctlV_table : LookupTable instance
+
+    @param source : files from which the calibration was loaded
+    @type  source : list of str
+    """
+    self.gain_table = gain_table
+    self.ctlV_table = ctlV_table
+    self.source = list(source)
+
+  def __repr__(self):
+    return "AttenuatorCalibration(%s)" % self.source
+
+  @classmethod
+  def from_splines(cls, splines, source=[]):
+    """
+    Returns the calibration compiled from splines
+
+    @param splines : calibration in the layout of a splines pickle
+    @type  splines : tuple
+    """
+    gain_table, ctlV_table = compile_splines(splines)
+    return cls(gain_table, ctlV_table, source)
+
+  def ctlV_function(self, channel):
+    """
+    Returns the function giving the control voltage of a channel for a gain
+
+    It takes the place of the channel's ctlV_spline.
+    """
+    return functools.partial(self.ctlV_table.lookup, channel)
+
+  def gain_range(self, channel):
+    """
+    Returns the lowest and highest calibrated gain of a channel
+    """
+    i = self.ctlV_table.index[channel]
+    return float(self.ctlV_table.start[i]), float(self.ctlV_table.stop[i])
+
+class MonitorConversion(object):
+  """
+  Converts analog monitor voltages to engineering units
+
+  Public attributes::
+    labels - reading labels, in channel order
+    index  - channel index keyed by label
+    scale  - array of scale factors
+    offset - array of offsets, in volts
+    units  - array of unit names
+  """
+  def __init__(self, labels, table, rules=[]):
+    """
+    A label takes its constants from 'table' or, if it is not there, from the
+    first rule whose pattern is part of the label.
+
+    @param labels : reading labels
+    @type  labels : list of str
+
+    @param table : (scale, offset, unit) keyed by label
+    @type  table : dict of tuples
+
+    @param rules : (pattern, scale, offset, unit)
+    @type  rules : list of tuples
+    """
+    self.logger = logging.getLogger(module_logger.name+".MonitorConversion")
+    self.labels = list(labels)
+    self.index = {}
+    constants = []
+    for label in self.labels:
+      self.index[label] = len(constants)
+      if label in table:
+        constants.append(table[label])
+        continue
+      for rule in rules:
+        if rule[0] in label:
+          constants.append(rule[1:])
+          break
+      else:
+        self.logger.error("__init__: no conversion for %s", label)
+        constants.append((numpy.nan, 0.0, ""))
+    self.scale = numpy.array([c[0] for c in constants], dtype=float)
+    self.offset = numpy.array([c[1] for c in constants], dtype=float)
+    self.units = numpy.array([c[2] for c in constants])
+
+  def __repr__(self):
+    return "MonitorConversion(%d channels)" % len(self.labels)
+
+  def channels(self, labels):
+    """
+    Returns the channel indices of reading labels
+
+    @return: numpy array of int
+    """
+    return numpy.array([self.index[label] for label in labels], dtype=int)
+
+  def convert(self, volts, channels=None):
+    """
+    Converts monitor voltages
+
+    @param volts : voltages; the last axis is the channel unless 'channels'
+                   is given
+    @type  volts : numpy array of float
+
+    @param channels : channel index of each voltage; default: all, in order
+    @type  channels : numpy array of int
+
+    @return: numpy array of float
+    """
+    if channels is None:
+      return self.scale*(volts + self.offset)
+    return self.scale[channels]*(volts + self.offset[channels])
+
+def load_calibration(store_file=None, splines_files=[], channels=None):
+  """
+  Loads an attenuator calibration
+
+  The calibration store is used if there is one.  Otherwise the splines
+  pickles are taken in order of preference, and a pickle is only loaded if
+  some of the channels are not in the ones loaded before it.
+
+  @param store_file : calibration store file
+  @type  store_file : str
+
+  @param splines_files : splines pickles, preferred one first
+  @type  splines_files : list of str
+
+  @param channels : channels which must be calibrated; default: all in the
+                    first pickle
+  @type  channels : list of str
+
+  @return: AttenuatorCalibration instance
+  """
+  if store_file and os.path.exists(store_file):
+    return CalibrationStore(store_file).calibration()
+  from Electronics.Instruments.PINatten import get_splines
+  calibrations = []
+  source = []
+  for filename in splines_files:
+    if not os.path.exists(filename):
+      continue
+    if calibrations and channels != None:
+      missing = set(channels) - set(merge_splines(*calibrations)[1][0].keys())
+      if not missing:
+        break
+    module_logger.debug("load_calibration: loading %s", filename)
+    calibrations.append(get_splines(filename))
+    source.append(filename)
+    if channels == None:
+      break
+  if not calibrations:
+    raise IOError("no attenuator calibration in %s" % ([store_file] +
+                                                       list(splines_files)))
+  return AttenuatorCalibration.from_splines(merge_splines(*calibrations),
+                                            source=source)
+
+if __name__ == "__main__":
+  # Compare table lookups with the interp1d splines
+  import sys
+  import timeit
+  from Electronics.Instruments.PINatten import get_splines
+
+  splines = get_splines(sys.argv[1])
+  start = timeit.default_timer()
+  gain_table, ctlV_table = compile_splines(splines)
+  print("compiled %s in %.1f ms" % (ctlV_table,
+                                    1000*(timeit.default_timer() - start)))
+  ctlV_spline, att_sample_range = splines[1]
+  names = ctlV_table.names
+  gains = [sum(att_sample_range[name][:2])/2 for name in names]
+  n = 1000
+  t = timeit.timeit(lambda: [ctlV_spline[name](gain)
+                             for name, gain in zip(names, gains)], number=n)
+  print("interp1d, %d channels one at a time: %8.1f us" % (len(names), 1e6*t/n))
+  t = timeit.timeit(lambda: [ctlV_table.lookup(name, gain)
+                             for name, gain in zip(names, gains)], number=n)
+  print("table,    %d channels one at a time: %8.1f us" % (len(names), 1e6*t/n))
+  t = timeit.timeit(lambda: ctlV_table.lookup_many(names, gains), number=n)
+  print("table,    %d channels in one call:   %8.1f us" % (len(names), 1e6*t/n))
+  worst = 0
+  for i, name in enumerate(names):
+    x = numpy.linspace(ctlV_table.start[i], ctlV_table.stop[i], 100001)
+    worst = max(worst,
+                numpy.abs(ctlV_table.lookup(name, x) - ctlV_spline[name](x)).max())
+  print("largest difference %.2g V; guaranteed %.2g V" %
+        (worst, ctlV_table.max_error.max()))
@@ -0,0 +1,37 @@
+"""
+Adds splines pickles to a PIN diode attenuator calibration store
+
+The serial numbers of the attenuators are taken from the header rows of the
+data file from which the splines were made (see interp_att.py).  Each pickle
+becomes one generation of the store, in the order given.  Example::
+  python make_store.py -d data.csv -s calibration.npy splines-lab.pkl splines.pkl
+"""
+import argparse
+import logging
+import os.path
+import time
+
+from Electronics.Instruments.PINatten import get_splines
+from MonitorControl.Receivers.WBDC.WBDC2.calibration import add_generation, \
+                                                  get_atten_IDs, store_records
+
+module_logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Make a calibration store")
+  parser.add_argument('pickles', nargs='+', help="splines pickle files")
+  parser.add_argument('--data', '-d', default='data.csv',
+                      help="data file with the serial numbers")
+  parser.add_argument('--store', '-s', default='calibration.npy',
+                      help="calibration store file")
+  args = parser.parse_args()
+
+  serials = get_atten_IDs(args.data)
+  for filename in args.pickles:
+    date = time.strftime("%Y-%m-%d", time.gmtime(os.path.getmtime(filename)))
+    version = os.path.splitext(os.path.basename(filename))[0]
+    records = store_records(get_splines(filename), serials=serials,
+                            version=version, date=date)
+    generation = add_generation(args.store, records)
+    print("%s added to %s as generation %d" % (filename, args.store,
+                                               generation))
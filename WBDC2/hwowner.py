@@ -0,0 +1,189 @@
+"""
+Module WBDC.WBDC2.hwowner gives each LabJack a thread which does all its work
+
+A server which serves many clients at once must not let two of them drive the
+same LabJack at the same time, and a control command should not wait for a
+monitor scan to finish.  A HardwareOwner runs the operations on its LabJack one
+at a time in its own thread, taking them from a queue in order of priority::
+  CONTROL - switch and attenuator settings, and reading them
+  MONITOR - analog monitor scans
+Operations of the same priority run in the order in which they were submitted.
+
+A long operation, like a monitor scan, can call preempt() at points where it
+may be interrupted, so that control commands which came in meanwhile run
+first.  An operation which calls its own owner runs at once in the owner's
+thread.
+"""
+import heapq
+import itertools
+import logging
+import threading
+
+module_logger = logging.getLogger(__name__)
+
+CONTROL = 0
+MONITOR = 1
+
+class Job(object):
+  """
+  An operation submitted to a HardwareOwner
+
+  Public attributes::
+    priority - CONTROL or MONITOR
+    done     - threading.Event set when the operation has run
+    result   - what the operation returned
+    error    - the exception it raised, or None
+  """
+  def __init__(self, priority, function, args, kwargs):
+    self.priority = priority
+    self.function = function
+    self.args = args
+    self.kwargs = kwargs
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+
+  def __repr__(self):
+    return "Job(%d, %s)" % (self.priority,
+                            getattr(self.function, "__name__", self.function))
+
+  def run(self):
+    """
+    Runs the operation and keeps its result or exception
+    """
+    try:
+      self.result = self.function(*self.args, **self.kwargs)
+    except Exception as details:
+      self.error = details
+    self.done.set()
+
+  def wait(self, timeout=None):
+    """
+    Returns the result of the operation, or raises its exception
+
+    @param timeout : longest time to wait in seconds; default: no limit
+    @type  timeout : float
+    """
+    if not self.done.wait(timeout):
+      raise RuntimeError("%s did not finish in %s s" % (self, timeout))
+    if self.error != None:
+      raise self.error
+    return self.result
+
+class HardwareOwner(object):
+  """
+  Thread which runs the operations on one LabJack in order of priority
+  """
+  def __init__(self, name):
+    """
+    @param name : name of the thread, e.g. 'WBDC2-LJ1'
+    @type  name : str
+    """
+    self.name = name
+    self.logger = logging.getLogger(module_logger.name+".HardwareOwner")
+    self.condition = threading.Condition()
+    self.queue = []
+    self.sequence = itertools.count()
+    self.running = None
+    self.run = False
+    self.thread = None
+
+  def __repr__(self):
+    return "HardwareOwner("+repr(self.name)+")"
+
+  def start(self):
+    """
+    Starts the owner thread
+    """
+    if self.thread and self.thread.is_alive():
+      return
+    self.run = True
+    self.thread = threading.Thread(target=self._serve, name=self.name)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    """
+    Stops the owner thread after the operations already submitted
+    """
+    with self.condition:
+      self.run = False
+      self.condition.notify()
+    if self.thread:
+      self.thread.join()
+
+  def in_owner(self):
+    """
+    True if called from the owner thread
+    """
+    return threading.current_thread() is self.thread
+
+  def submit(self, priority, function, *args, **kwargs):
+    """
+    Queues an operation
+
+    If the owner thread is not running, or this is the owner thread, the
+    operation runs at once in the calling thread.
+
+    @param priority : CONTROL or MONITOR
+    @type  priority : int
+
+    @param function : operation, called with the other arguments
+    @type  function : callable
+
+    @return: Job instance
+    """
+    job = Job(priority, function, args, kwargs)
+    if self.in_owner() or not (self.thread and self.thread.is_alive()):
+      job.run()
+      return job
+    with self.condition:
+      heapq.heappush(self.queue, (priority, next(self.sequence), job))
+      self.condition.notify()
+    return job
+
+  def call(self, priority, function, *args, **kwargs):
+    """
+    Runs an operation in the owner thread and returns its result
+    """
+    return self.submit(priority, function, *args, **kwargs).wait()
+
+  def preempt(self):
+    """
+    Runs the queued operations of higher priority than the running one
+
+    This is called by a running operation where it may be interrupted.  It
+    does nothing outside the owner thread.
+    """
+    if not self.in_owner() or self.running == None:
+      return
+    interrupted = self.running
+    while True:
+      with self.condition:
+        if not self.queue or self.queue[0][0] >= interrupted.priority:
+          break
+        priority, sequence, job = heapq.heappop(self.queue)
+      self.logger.debug("preempt: %s before %s", job, interrupted)
+      self._execute(job)
+    self.running = interrupted
+
+  def _execute(self, job):
+    """
+    Runs a job as the running one
+    """
+    self.running = job
+    job.run()
+    self.running = None
+
+  def _serve(self):
+    """
+    Runs the queued operations until stopped
+    """
+    while True:
+      with self.condition:
+        while self.run and not self.queue:
+          self.condition.wait()
+        if not self.queue:
+          return
+        priority, sequence, job = heapq.heappop(self.queue)
+      self._execute(job)
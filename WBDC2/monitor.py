@@ -0,0 +1,223 @@
+"""
+Module WBDC.WBDC2.monitor polls the WBDC2 analog monitor points
+
+A MonitorPoller scans the analog monitor points in a background thread, each
+point at its own rate, and publishes each completed scan as a MonitorSnapshot.
+A snapshot is never changed after it is published, so any number of clients
+can be given the latest one without touching the hardware.  A client which
+needs fresher data says how old the data may be, and which readings it needs,
+and the poller then scans just those points at once if they are too old.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from .hwowner import MONITOR
+
+module_logger = logging.getLogger(__name__)
+
+# 'start' and 'time' are when the scan was started and completed.  'data' has
+# the latest converted values and 'times' their acquisition times, keyed by
+# reading label.
+MonitorSnapshot = namedtuple("MonitorSnapshot",
+                             ["start", "time", "data", "times"])
+
+class MonitorPoller(object):
+  """
+  Scans the analog monitor points on a schedule in a background thread
+
+  Each monitor point has its own polling period and priority (see
+  WBDC2hwif.mon_points).  A scan reads only the points which are due, highest
+  priority (lowest number) first, and the snapshot it publishes keeps the
+  latest readings of the other points.
+  """
+  def __init__(self, analog_monitor, period=None, owner=None):
+    """
+    @param analog_monitor : monitor whose points are scanned
+    @type  analog_monitor : WBDC2hwif.AnalogMonitor instance
+
+    @param period : polling period for all points, in place of their own
+    @type  period : float
+
+    @param owner : if given, the scans are run by this LabJack owner thread
+                   at monitor priority
+    @type  owner : hwowner.HardwareOwner instance
+    """
+    self.analog_monitor = analog_monitor
+    self.owner = owner
+    self.logger = logging.getLogger(module_logger.name+".MonitorPoller")
+    self.schedule = {}
+    for key in analog_monitor.all_points():
+      entry = analog_monitor.mon_points[key[0]][key[1]]
+      if period:
+        self.schedule[key] = (period, entry[4])
+      else:
+        self.schedule[key] = (entry[3], entry[4])
+    self.labels = self._labels(list(self.schedule.keys()))
+    self.next_due = dict.fromkeys(self.schedule, 0)
+    self.requested = set()
+    # called as listener(poller, snapshot, readings) after each scan
+    self.listeners = []
+    self.snapshot = None
+    self.condition = threading.Condition()
+    self.wanted = threading.Event()
+    self.run = False
+    self.thread = None
+
+  def start(self):
+    """
+    Starts the polling thread
+    """
+    if self.thread and self.thread.is_alive():
+      return
+    self.run = True
+    self.thread = threading.Thread(target=self._poll, name="MonitorPoller")
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    """
+    Stops the polling thread after the scan in progress
+    """
+    self.run = False
+    self.wanted.set()
+    if self.thread:
+      self.thread.join()
+
+  def longest_period(self):
+    """
+    Returns the longest polling period of any point
+    """
+    return max([period for period, priority in list(self.schedule.values())])
+
+  def get(self, max_age=None, timeout=None, points=None):
+    """
+    Returns the latest snapshot
+
+    If readings are missing or older than 'max_age' seconds, the points are
+    scanned at once and the resulting snapshot is returned.
+
+    @param max_age : largest acceptable age of the readings in seconds
+    @type  max_age : float
+
+    @param timeout : longest time to wait for a snapshot in seconds
+    @type  timeout : float
+
+    @param points : labels of the readings needed; default: all
+    @type  points : list of str
+
+    @return: MonitorSnapshot instance, or None if none came in time
+    """
+    if points == None:
+      keys, labels = list(self.schedule.keys()), self.labels
+    else:
+      keys = self.analog_monitor.point_keys(points)
+      labels = self._labels(keys)
+    with self.condition:
+      if max_age == None:
+        since = 0
+      else:
+        since = time.time() - max_age
+      if self._fresh(labels, since):
+        return self.snapshot
+      if max_age != None:
+        # only readings made after this request are fresh enough
+        since = time.time()
+      self.requested.update(keys)
+      self.wanted.set()
+      if timeout == None:
+        deadline = None
+      else:
+        deadline = time.time() + timeout
+      while not self._fresh(labels, since):
+        if deadline == None:
+          self.condition.wait()
+        else:
+          remaining = deadline - time.time()
+          if remaining <= 0:
+            return self.snapshot
+          self.condition.wait(remaining)
+      return self.snapshot
+
+  def _labels(self, keys):
+    """
+    Returns the labels of the readings made at monitor points
+    """
+    labels = []
+    for latchgroup, point in keys:
+      for label in self.analog_monitor.mon_points[latchgroup][point][1:3]:
+        if label.strip():
+          labels.append(label.strip())
+    return labels
+
+  def _fresh(self, labels, since):
+    """
+    True if the snapshot has readings with the labels made after 'since'
+    """
+    if self.snapshot == None:
+      return False
+    for label in labels:
+      if self.snapshot.times.get(label, -1) < since:
+        return False
+    return True
+
+  def scan(self, points=None):
+    """
+    Reads monitor points and publishes the result
+
+    The listeners are given the new snapshot and the readings of this scan,
+    a dict of (time, value) keyed by reading label.
+
+    @param points : (latch group, point) keys; default: all
+    @type  points : list of tuples of int
+
+    @return: MonitorSnapshot instance
+    """
+    if points == None:
+      points = list(self.schedule.keys())
+    points = sorted(points, key=lambda key: (self.schedule[key][1], key))
+    start = time.time()
+    if self.owner:
+      readings = self.owner.call(MONITOR, self.analog_monitor.read_points,
+                                 points, timestamps=True)
+    else:
+      readings = self.analog_monitor.read_points(points, timestamps=True)
+    with self.condition:
+      if self.snapshot == None:
+        data, times = {}, {}
+      else:
+        data, times = dict(self.snapshot.data), dict(self.snapshot.times)
+      for label in list(readings.keys()):
+        times[label], data[label] = readings[label]
+      self.snapshot = MonitorSnapshot(start, time.time(), data, times)
+      self.condition.notify_all()
+      snapshot = self.snapshot
+    for listener in self.listeners:
+      try:
+        listener(self, snapshot, readings)
+      except Exception as details:
+        self.logger.error("scan: listener %s failed: %s", listener, details)
+    return snapshot
+
+  def _poll(self):
+    """
+    Scans the points which are due, or which a client wants at once
+    """
+    while self.run:
+      self.wanted.clear()
+      now = time.time()
+      with self.condition:
+        due = self.requested
+        self.requested = set()
+      for key in list(self.schedule.keys()):
+        if self.next_due[key] <= now:
+          due.add(key)
+      if due:
+        try:
+          self.scan(due)
+        except Exception as details:
+          self.logger.error("_poll: scan failed: %s", details)
+        for key in due:
+          self.next_due[key] = now + self.schedule[key][0]
+      self.wanted.wait(max(min(self.next_due.values()) - time.time(), 0))
@@ -0,0 +1,501 @@
+"""
+Module WBDC.WBDC2.monitor_archive keeps the analog monitor data on disk
+
+A MonitorArchive is a .npy file holding a fixed number of records, used as a
+ring buffer.  A record has the time of a monitor scan and a float32 value for
+each reading label::
+  [("time", "f8"), ("+6 V dig", "f4"), ("+6 V ana", "f4"), ...]
+A reading which was not made in a scan is NaN.  When the file is full the
+oldest records are overwritten.  The size of the file is fixed when it is
+created, so the archive never grows beyond it.
+
+The file is memory-mapped, by the hardware server which appends to it and by
+any other program which reads it.  A time range of records is found by binary
+search and returned as views of the file, without copying.  For example::
+  archive = MonitorArchive("wbdc2_monitor.npy")
+  data = archive.read(time.time()-86400)
+  plot(data["time"], data["BE plate"])
+
+Records are in time order within the two parts of the ring, the part after
+the newest record and the part up to it.  A record's time is written last, so
+a reader which sees the time sees the record complete.
+
+History Pyramid
+===============
+A MonitorHistory keeps, besides the archive of raw scans, an AggregateArchive
+for each of several intervals (10 s, 1 min, 10 min and 1 h).  An aggregate
+record has the start of its interval and the minimum, mean, maximum and number
+of the readings of each channel in it::
+  [("time", "f8"), ("min", "f4", (n,)), ("mean", "f4", (n,)),
+   ("max", "f4", (n,)), ("count", "u4", (n,))]
+with the channels in the order of the raw archive.  The aggregates of the
+current intervals are accumulated as the scans arrive and written when an
+interval is over.  A query is answered from the finest level which gives no
+more than the requested number of points, so that a month of data takes a few
+hundred hourly records rather than millions of scans.  The aggregate files are
+named after the raw archive, e.g. wbdc2_monitor.10s.npy.
+
+The memory-mapped files are written to disk by the operating system when it
+chooses; a MonitorHistory also flushes them when a scan arrives more than
+'flush_period' seconds after the last flush, so that no more than that is lost
+if the host goes down.
+"""
+import logging
+import numpy
+import numpy.lib.format
+import os.path
+import threading
+import time
+
+module_logger = logging.getLogger(__name__)
+
+def archive_dtype(channels):
+  """
+  Returns the record type of a monitor archive
+
+  @param channels : reading labels
+  @type  channels : list of str
+  """
+  return numpy.dtype([("time", "f8")] + [(str(label), "f4")
+                                          for label in channels])
+
+def aggregate_dtype(channels):
+  """
+  Returns the record type of an aggregate archive
+
+  @param channels : number of channels
+  @type  channels : int
+  """
+  return numpy.dtype([("time",  "f8"),
+                      ("min",   "f4", (channels,)),
+                      ("mean",  "f4", (channels,)),
+                      ("max",   "f4", (channels,)),
+                      ("count", "u4", (channels,))])
+
+class RingBuffer(object):
+  """
+  Memory-mapped ring buffer of time-stamped records
+
+  Public attributes::
+    filename - archive file
+    records  - memory-mapped structured array
+    capacity - number of records in the file
+    count    - number of records written
+    head     - index of the next record to be written
+    last     - time of the newest record
+  """
+  def __init__(self, filename, dtype=None, max_bytes=1 << 28):
+    """
+    Opens a ring buffer file, or creates it if 'dtype' is given
+
+    The file is opened for appending only if 'dtype' is given.
+
+    @param filename : ring buffer file
+    @type  filename : str
+
+    @param dtype : record type, which must match an existing file
+    @type  dtype : numpy.dtype
+
+    @param max_bytes : size limit of a new file
+    @type  max_bytes : int
+    """
+    self.filename = filename
+    self.logger = logging.getLogger(module_logger.name+"."+
+                                    self.__class__.__name__)
+    self.lock = threading.Lock()
+    if dtype is None:
+      self.records = numpy.load(filename, mmap_mode="r")
+    elif os.path.exists(filename):
+      self.records = numpy.load(filename, mmap_mode="r+")
+      if self.records.dtype != dtype:
+        raise ValueError("%s has records %s, not %s" %
+                         (filename, self.records.dtype, dtype))
+    else:
+      capacity = max(max_bytes // dtype.itemsize, 2)
+      self.records = numpy.lib.format.open_memmap(filename, mode="w+",
+                                                  dtype=dtype,
+                                                  shape=(capacity,))
+      self.logger.info("__init__: created %s for %d records",
+                       filename, capacity)
+    self.capacity = len(self.records)
+    self.refresh()
+
+  def __repr__(self):
+    return self.__class__.__name__+"("+repr(self.filename)+")"
+
+  def refresh(self):
+    """
+    Finds the newest record, after the file was appended to elsewhere
+    """
+    times = self.records["time"]
+    self.count = int(numpy.count_nonzero(times))
+    if self.count:
+      self.head = (int(numpy.argmax(times)) + 1) % self.capacity
+      self.last = float(times[self.head - 1])
+    else:
+      self.head = 0
+      self.last = 0.0
+
+  def _write(self, timestamp, fields):
+    """
+    Writes a record, overwriting the oldest one if the buffer is full
+
+    @param timestamp : time of the record
+    @type  timestamp : float
+
+    @param fields : values keyed by field name
+    @type  fields : dict
+    """
+    with self.lock:
+      if timestamp <= self.last:
+        self.logger.warning("_write: time %f is not after the last record %f",
+                            timestamp, self.last)
+        return
+      record = self.records[self.head]
+      record["time"] = 0.0
+      for name in list(fields.keys()):
+        record[name] = fields[name]
+      record["time"] = timestamp
+      self.last = timestamp
+      self.head = (self.head + 1) % self.capacity
+      self.count = min(self.count + 1, self.capacity)
+
+  def flush(self):
+    """
+    Writes the changed records to disk
+    """
+    with self.lock:
+      self.records.flush()
+
+  def segments(self, start=None, stop=None):
+    """
+    Returns the records in a time range as views of the file
+
+    @param start : earliest time; default: the oldest record
+    @type  start : float
+
+    @param stop : time after the latest record wanted; default: the newest
+    @type  stop : float
+
+    @return: list of up to two structured arrays, oldest first
+    """
+    if self.count < self.capacity:
+      parts = [self.records[:self.count]]
+    else:
+      parts = [self.records[self.head:], self.records[:self.head]]
+    segments = []
+    for part in parts:
+      times = part["time"]
+      first, last = 0, len(part)
+      if start != None:
+        first = int(numpy.searchsorted(times, start, side="left"))
+      if stop != None:
+        last = int(numpy.searchsorted(times, stop, side="left"))
+      if last > first:
+        segments.append(part[first:last])
+    return segments
+
+  def read(self, start=None, stop=None):
+    """
+    Returns the records in a time range
+
+    The records are a view of the file unless the range spans the end of the
+    ring, when they are copied into one array.
+
+    @return: structured array
+    """
+    segments = self.segments(start, stop)
+    if not segments:
+      return self.records[:0]
+    if len(segments) == 1:
+      return segments[0]
+    return numpy.concatenate(segments)
+
+  def size(self, start=None, stop=None):
+    """
+    Returns the number of records in a time range
+    """
+    return sum([len(segment) for segment in self.segments(start, stop)])
+
+  def close(self):
+    """
+    Writes the changed records and releases the file
+    """
+    with self.lock:
+      if self.records.flags.writeable:
+        self.records.flush()
+      del self.records
+
+class MonitorArchive(RingBuffer):
+  """
+  Memory-mapped ring buffer of monitor scans
+
+  Public attributes, besides those of a RingBuffer::
+    channels - reading labels, in record order
+  """
+  def __init__(self, filename, channels=None, max_bytes=1 << 28):
+    """
+    Opens an archive, or creates it if 'channels' is given
+
+    An archive is opened for appending only if 'channels' is given.
+
+    @param filename : archive file
+    @type  filename : str
+
+    @param channels : reading labels; these must match an existing archive
+    @type  channels : list of str
+
+    @param max_bytes : size limit of a new archive file
+    @type  max_bytes : int
+    """
+    if channels == None:
+      dtype = None
+    else:
+      dtype = archive_dtype(channels)
+    RingBuffer.__init__(self, filename, dtype, max_bytes)
+    self.channels = list(self.records.dtype.names[1:])
+
+  def append(self, timestamp, values):
+    """
+    Adds a record, overwriting the oldest one if the archive is full
+
+    @param timestamp : time of the scan
+    @type  timestamp : float
+
+    @param values : values keyed by reading label
+    @type  values : dict of float
+    """
+    self._write(timestamp, dict([(label, values.get(label, numpy.nan))
+                                 for label in self.channels]))
+
+class AggregateArchive(RingBuffer):
+  """
+  Memory-mapped ring buffer of monitor data aggregated over fixed intervals
+
+  The aggregates of the current interval are kept in memory until a scan in a
+  later interval arrives.
+
+  Public attributes, besides those of a RingBuffer::
+    interval - length of the aggregation interval in seconds
+    current  - start of the current interval, or None
+  """
+  def __init__(self, filename, interval, channels=None, max_bytes=1 << 28):
+    """
+    @param filename : archive file
+    @type  filename : str
+
+    @param interval : length of the aggregation interval in seconds
+    @type  interval : float
+
+    @param channels : number of channels; the archive is opened for appending
+                      only if this is given
+    @type  channels : int
+
+    @param max_bytes : size limit of a new archive file
+    @type  max_bytes : int
+    """
+    if channels == None:
+      dtype = None
+    else:
+      dtype = aggregate_dtype(channels)
+    RingBuffer.__init__(self, filename, dtype, max_bytes)
+    self.interval = interval
+    self.current = None
+
+  def add(self, timestamp, values):
+    """
+    Adds the values of one scan to the aggregates of its interval
+
+    @param timestamp : time of the scan
+    @type  timestamp : float
+
+    @param values : value of each channel, NaN if not read
+    @type  values : numpy array of float
+    """
+    start = (timestamp // self.interval)*self.interval
+    if start != self.current:
+      self.close_interval()
+      self.current = start
+      self.minimum = numpy.full(len(values), numpy.inf)
+      self.maximum = numpy.full(len(values), -numpy.inf)
+      self.total = numpy.zeros(len(values))
+      self.number = numpy.zeros(len(values), dtype=int)
+    valid = ~numpy.isnan(values)
+    self.minimum = numpy.fmin(self.minimum, values)
+    self.maximum = numpy.fmax(self.maximum, values)
+    self.total[valid] += values[valid]
+    self.number += valid
+
+  def aggregates(self):
+    """
+    Returns the aggregates of the current interval
+
+    @return: dict of arrays keyed by field name, or None
+    """
+    if self.current == None or not self.number.any():
+      return None
+    empty = self.number == 0
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+      mean = self.total/self.number
+    return {"min":   numpy.where(empty, numpy.nan, self.minimum),
+            "mean":  numpy.where(empty, numpy.nan, mean),
+            "max":   numpy.where(empty, numpy.nan, self.maximum),
+            "count": self.number}
+
+  def close_interval(self):
+    """
+    Writes the aggregates of the current interval
+    """
+    fields = self.aggregates()
+    if fields:
+      self._write(self.current, fields)
+    self.current = None
+
+class MonitorHistory(object):
+  """
+  Archive of raw monitor scans with aggregates at several intervals
+
+  Public attributes::
+    raw     - MonitorArchive of the scans
+    levels  - AggregateArchive instances, shortest interval first
+    flushed - time of the last flush
+  """
+  intervals = [10, 60, 600, 3600]
+  # longest time in seconds between flushes of the files while scans arrive
+  flush_period = 60
+
+  def __init__(self, filename, channels=None, max_bytes=1 << 28):
+    """
+    Opens the archives, or creates them if 'channels' is given
+
+    @param filename : raw archive file; the aggregate files are named after it
+    @type  filename : str
+
+    @param channels : reading labels; these must match existing archives
+    @type  channels : list of str
+
+    @param max_bytes : size limit of each new archive file
+    @type  max_bytes : int
+    """
+    self.logger = logging.getLogger(module_logger.name+".MonitorHistory")
+    self.lock = threading.Lock()
+    self.raw = MonitorArchive(filename, channels, max_bytes)
+    self.channels = self.raw.channels
+    self.index = dict([(label, i) for i, label in enumerate(self.channels)])
+    if channels == None:
+      number = None
+    else:
+      number = len(self.channels)
+    root, ext = os.path.splitext(filename)
+    self.levels = [AggregateArchive(root+"."+self.interval_name(interval)+ext,
+                                    interval, number, max_bytes)
+                   for interval in self.intervals]
+    self.flushed = time.time()
+
+  def __repr__(self):
+    return "MonitorHistory("+repr(self.raw.filename)+")"
+
+  @staticmethod
+  def interval_name(interval):
+    """
+    Returns a name like '10s', '1m' or '1h' for an interval
+    """
+    if interval % 3600 == 0:
+      return "%dh" % (interval // 3600)
+    if interval % 60 == 0:
+      return "%dm" % (interval // 60)
+    return "%ds" % interval
+
+  def append(self, timestamp, values):
+    """
+    Adds a scan to the raw archive and to the aggregates
+
+    The files are flushed if the last flush was more than 'flush_period'
+    seconds ago.
+
+    @param timestamp : time of the scan
+    @type  timestamp : float
+
+    @param values : values keyed by reading label
+    @type  values : dict of float
+    """
+    with self.lock:
+      self.raw.append(timestamp, values)
+      data = numpy.full(len(self.channels), numpy.nan)
+      for label in list(values.keys()):
+        if label in self.index:
+          data[self.index[label]] = values[label]
+      for level in self.levels:
+        level.add(timestamp, data)
+    if time.time() - self.flushed >= self.flush_period:
+      self.flush()
+
+  def query(self, channels, start, stop, max_points=1000):
+    """
+    Returns the history of channels from the finest level with few enough
+    points
+
+    @param channels : reading labels
+    @type  channels : list of str
+
+    @param start : earliest time
+    @type  start : float
+
+    @param stop : time after the latest one wanted
+    @type  stop : float
+
+    @param max_points : largest number of points wanted
+    @type  max_points : int
+
+    @return: dict with the 'interval' (0 for raw scans), the 'time' array and,
+             keyed by label, a dict of 'min', 'mean', 'max' and 'count'
+             arrays
+    """
+    indices = [self.index[label] for label in channels]
+    with self.lock:
+      if self.raw.size(start, stop) <= max_points:
+        records = self.raw.read(start, stop)
+        result = {"interval": 0, "time": numpy.array(records["time"])}
+        for label in channels:
+          values = numpy.array(records[label], dtype=float)
+          counts = (~numpy.isnan(values)).astype(int)
+          result[label] = {"min": values, "mean": values, "max": values,
+                           "count": counts}
+        return result
+      for level in self.levels:
+        if (stop - start)/level.interval <= max_points:
+          break
+      records = level.read(start, stop)
+      times = numpy.array(records["time"])
+      current = level.aggregates()
+      if current != None and start <= level.current < stop:
+        times = numpy.append(times, level.current)
+      result = {"interval": level.interval, "time": times}
+      for label, index in zip(channels, indices):
+        result[label] = {}
+        for field in ("min", "mean", "max", "count"):
+          column = numpy.array(records[field][:, index],
+                               dtype=records.dtype[field].base)
+          if len(times) > len(records):
+            column = numpy.append(column, current[field][index])
+          result[label][field] = column
+      return result
+
+  def flush(self):
+    """
+    Writes the changed records of all the archives to disk
+    """
+    self.flushed = time.time()
+    self.raw.flush()
+    for level in self.levels:
+      level.flush()
+
+  def close(self):
+    """
+    Writes the aggregates so far and releases the files
+    """
+    with self.lock:
+      for level in self.levels:
+        level.close_interval()
+        level.close()
+      self.raw.close()
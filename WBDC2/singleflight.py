@@ -0,0 +1,108 @@
+"""
+Module WBDC.WBDC2.singleflight shares one hardware read among concurrent callers
+
+When several clients ask the hardware server for the same thing at the same
+moment, only the first call reads the hardware.  The others wait for that read
+and get its result.  A result may also be given to calls which come within a
+short freshness window after the read finished.
+
+Results are keyed by the method and its arguments.  invalidate() forgets the
+results and the reads in progress, so that a read which follows a change of
+the hardware is never answered with what was read before the change.
+"""
+import logging
+import threading
+import time
+
+module_logger = logging.getLogger(__name__)
+
+class Flight(object):
+  """
+  A read in progress or just finished
+  """
+  def __init__(self, generation):
+    self.generation = generation
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+    self.finished = None
+
+  def run(self, function, args, kwargs):
+    """
+    Makes the read
+    """
+    try:
+      self.result = function(*args, **kwargs)
+    except Exception as details:
+      self.error = details
+    self.finished = time.time()
+    self.done.set()
+
+  def wait(self):
+    """
+    Returns the result of the read, or raises its exception
+    """
+    self.done.wait()
+    if self.error != None:
+      raise self.error
+    return self.result
+
+class SingleFlight(object):
+  """
+  Makes each distinct read once for all the callers who want it at once
+  """
+  def __init__(self, window=0.0):
+    """
+    @param window : seconds after a read finishes during which its result is
+                    given to new callers
+    @type  window : float
+    """
+    self.window = window
+    self.logger = logging.getLogger(module_logger.name+".SingleFlight")
+    self.lock = threading.Lock()
+    self.generation = 0
+    self.flights = {}
+    self.results = {}
+
+  def call(self, key, function, *args, **kwargs):
+    """
+    Returns the result of function(*args, **kwargs), sharing it with the
+    other calls with the same key
+
+    @param key : identifies the read, e.g. the method name and arguments
+    @type  key : hashable
+    """
+    with self.lock:
+      flight = self.results.get(key)
+      if flight and flight.generation == self.generation and \
+         time.time() - flight.finished <= self.window:
+        return flight.result
+      flight = self.flights.get(key)
+      if flight and flight.generation == self.generation:
+        leader = False
+      else:
+        flight = Flight(self.generation)
+        self.flights[key] = flight
+        leader = True
+    if not leader:
+      return flight.wait()
+    flight.run(function, args, kwargs)
+    with self.lock:
+      if self.flights.get(key) is flight:
+        del self.flights[key]
+      if flight.error == None and flight.generation == self.generation \
+         and self.window > 0:
+        now = time.time()
+        for old in list(self.results.keys()):
+          if now - self.results[old].finished > self.window:
+            del self.results[old]
+        self.results[key] = flight
+    return flight.wait()
+
+  def invalidate(self):
+    """
+    Forgets the results; reads already in progress are not shared any more
+    """
+    with self.lock:
+      self.generation += 1
+      self.results = {}
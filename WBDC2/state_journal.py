@@ -0,0 +1,238 @@
+"""
+Module WBDC.WBDC2.state_journal keeps the last commanded WBDC2 state on disk
+
+The latches and the attenuator TickDACs keep their settings while the receiver
+is powered, so a restarted hardware server can take the state from the journal
+instead of reading every latch group.  The journal is a JSON file like::
+  {"time": 1700000000.0,
+   "latches": {"R1P": 31, "X": 3, ...},
+   "attens": {"R1-18-E": {"dB": 5.0, "volts": 1.73}, ...}}
+
+A change is recorded in memory and the file is rewritten by a writer thread,
+after a short delay which gathers the changes made together, so that the disk
+is never written while the latch bus is held.  It is first written to a
+temporary file in the same directory which then replaces the journal, so that
+a crash leaves either the old or the new journal but never a partial one.
+
+The journal is kept in a state directory outside the installed package (see
+WBDC2hwif.state_dir).  If the directory cannot be written, that is reported
+once when the journal is opened and the journal is not used.
+"""
+import json
+import logging
+import os
+import os.path
+import tempfile
+import threading
+import time
+
+module_logger = logging.getLogger(__name__)
+
+class StateJournal(object):
+  """
+  Persistent record of latch group bytes and attenuator settings
+  """
+  def __init__(self, filename, delay=0.2):
+    """
+    The directory of the journal is created if necessary.  If it cannot be
+    written, 'usable' is False.
+
+    @param filename : path of the journal file
+    @type  filename : str
+
+    @param delay : seconds between a change and the writing of the file
+    @type  delay : float
+    """
+    self.filename = filename
+    self.delay = delay
+    self.logger = logging.getLogger(module_logger.name+".StateJournal")
+    self.lock = threading.Lock()
+    self.condition = threading.Condition(self.lock)
+    # keeps two flushes from replacing the file out of order
+    self.save_lock = threading.Lock()
+    self.state = {"time": None, "latches": {}, "attens": {}}
+    self.changed = False
+    self.save_failed = False
+    self.run = False
+    self.thread = None
+    directory = os.path.dirname(os.path.abspath(filename))
+    try:
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+      self.usable = os.access(directory, os.W_OK)
+      if not self.usable:
+        self.logger.error("__init__: %s is not writable; no state journal",
+                          directory)
+    except OSError as details:
+      self.logger.error("__init__: no state journal in %s: %s",
+                        directory, details)
+      self.usable = False
+
+  def __repr__(self):
+    return "StateJournal("+repr(self.filename)+")"
+
+  def load(self):
+    """
+    Reads the journal file
+
+    @return: True if a journal was found
+    """
+    try:
+      fd = open(self.filename)
+      state = json.load(fd)
+      fd.close()
+    except (IOError, OSError, ValueError) as details:
+      self.logger.warning("load: no usable journal %s: %s",
+                          self.filename, details)
+      return False
+    with self.lock:
+      self.state["time"] = state.get("time")
+      self.state["latches"] = state.get("latches", {})
+      self.state["attens"] = state.get("attens", {})
+    self.logger.debug("load: %s", self.state)
+    return True
+
+  def latches(self):
+    """
+    Returns the journaled latch group bytes keyed by latch group ID
+    """
+    with self.lock:
+      return dict(self.state["latches"])
+
+  def attens(self):
+    """
+    Returns the journaled attenuator settings keyed by attenuator ID
+    """
+    with self.lock:
+      return dict(self.state["attens"])
+
+  def record_latch(self, LGID, data):
+    """
+    Records the byte of a latch group
+
+    @param LGID : latch group ID, e.g. 'R1P'
+    @type  LGID : str
+
+    @param data : latch group byte
+    @type  data : int
+    """
+    with self.lock:
+      if self.state["latches"].get(LGID) == data:
+        return
+      self.state["latches"][LGID] = data
+      self._changed()
+
+  def record_atten(self, ID, dB, volts):
+    """
+    Records the setting of an attenuator
+
+    @param ID : attenuator ID, e.g. 'R1-18-E'
+    @type  ID : str
+
+    @param dB : attenuation
+    @type  dB : float
+
+    @param volts : control voltage
+    @type  volts : float
+    """
+    with self.lock:
+      setting = {"dB": dB, "volts": volts}
+      if self.state["attens"].get(ID) == setting:
+        return
+      self.state["attens"][ID] = setting
+      self._changed()
+
+  def _changed(self):
+    """
+    Tells the writer thread that the state changed; the caller holds the lock
+    """
+    self.changed = True
+    self.condition.notify()
+
+  def start(self):
+    """
+    Starts the writer thread
+    """
+    if not self.usable or (self.thread and self.thread.is_alive()):
+      return
+    self.run = True
+    self.thread = threading.Thread(target=self._writer,
+                                   name="StateJournal-writer")
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    """
+    Stops the writer thread after writing any unsaved change
+    """
+    with self.lock:
+      self.run = False
+      self.condition.notify()
+    if self.thread:
+      self.thread.join()
+    self.flush()
+
+  def flush(self):
+    """
+    Writes the journal now if it has changed
+    """
+    with self.save_lock:
+      with self.lock:
+        if not self.changed:
+          return
+        self.changed = False
+        self.state["time"] = time.time()
+        text = json.dumps(self.state, indent=1, sort_keys=True)
+      self._save(text)
+
+  def _writer(self):
+    """
+    Writes the journal a little while after it changes
+    """
+    while True:
+      with self.lock:
+        while self.run and not self.changed:
+          self.condition.wait()
+        if not self.run:
+          return
+      time.sleep(self.delay)
+      self.flush()
+
+  def _save(self, text):
+    """
+    Writes the journal atomically
+
+    @param text : JSON text of the journal
+    @type  text : str
+    """
+    if not self.usable:
+      return
+    directory = os.path.dirname(os.path.abspath(self.filename))
+    try:
+      fd, tempname = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    except (IOError, OSError) as details:
+      self._save_error(details)
+      return
+    try:
+      with os.fdopen(fd, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(tempname, self.filename)
+    except (IOError, OSError) as details:
+      self._save_error(details)
+      os.remove(tempname)
+      return
+    self.save_failed = False
+
+  def _save_error(self, details):
+    """
+    Reports a failed save, once until a save succeeds again
+    """
+    if self.save_failed:
+      self.logger.debug("_save: could not write %s: %s",
+                        self.filename, details)
+    else:
+      self.logger.error("_save: could not write %s: %s",
+                        self.filename, details)
+    self.save_failed = True
@@ -0,0 +1,255 @@
+"""
+Module WBDC.WBDC2.subscriptions pushes state changes to subscribed clients
+
+Instead of polling the hardware server, a client subscribes to one or more
+topics::
+  state   - the switch states, decoded from the latch groups
+  monitor - the analog monitor readings
+and is called back with what changed.  The server publishes the whole state of
+a topic whenever it may have changed; the SubscriptionManager compares it with
+the previous one, once for all subscribers, and sends only the differences.  An
+idle client costs nothing.
+
+A callback is any object with a method::
+  update(topic, delta, timestamp)
+where 'delta' is a dict of the items which changed, nested like the state
+itself.  An item which is no longer in the state is given as None.  For a Pyro
+client it is a proxy of a Pyro callback object.  A SocketCallback sends the
+updates as JSON lines to a socket instead, for tests and local clients.
+
+Each subscriber has its own delivery thread and queue, so a slow or dead
+client does not hold up the server or the other clients.  If a subscriber falls
+too far behind, its queue is replaced by the full state of its topics.  A
+subscriber whose callback fails several times in a row is dropped.
+"""
+import collections
+import itertools
+import json
+import logging
+import socket
+import threading
+import time
+
+module_logger = logging.getLogger(__name__)
+
+subscription_topics = ["state", "monitor"]
+
+def difference(old, new):
+  """
+  Returns the items of 'new' which are not the same in 'old'
+
+  Nested dicts are compared item by item.  The keys of 'old' which are not
+  in 'new' are given with the value None.
+
+  @return: dict
+  """
+  delta = {}
+  for key in list(old.keys()):
+    if key not in new:
+      delta[key] = None
+  for key in list(new.keys()):
+    if key not in old:
+      delta[key] = new[key]
+    elif isinstance(new[key], dict) and isinstance(old[key], dict):
+      changed = difference(old[key], new[key])
+      if changed:
+        delta[key] = changed
+    elif new[key] != old[key]:
+      delta[key] = new[key]
+  return delta
+
+class Subscriber(object):
+  """
+  A subscription with its own delivery thread
+  """
+  max_pending = 100
+  max_failures = 3
+
+  def __init__(self, manager, ID, callback, topics):
+    """
+    @param manager : manager which publishes to this subscriber
+    @type  manager : SubscriptionManager instance
+
+    @param ID : subscription number
+    @type  ID : int
+
+    @param callback : object with an update(topic, delta, timestamp) method
+    @type  callback : object
+
+    @param topics : topics subscribed to
+    @type  topics : list of str
+    """
+    self.manager = manager
+    self.ID = ID
+    self.callback = callback
+    self.topics = list(topics)
+    self.logger = logging.getLogger(module_logger.name+".Subscriber")
+    self.condition = threading.Condition()
+    self.pending = collections.deque()
+    self.failures = 0
+    self.run = True
+    self.thread = threading.Thread(target=self._deliver,
+                                   name="Subscriber-"+str(ID))
+    self.thread.daemon = True
+
+  def __repr__(self):
+    return "Subscriber(%d, %s)" % (self.ID, self.topics)
+
+  def put(self, topic, delta, timestamp):
+    """
+    Queues an update for delivery
+    """
+    with self.condition:
+      if len(self.pending) >= self.max_pending:
+        self.logger.warning("put: %s is behind; sending the full state", self)
+        self.pending.clear()
+        for name in self.topics:
+          state, when = self.manager.current(name)
+          if state:
+            self.pending.append((name, state, when))
+      else:
+        self.pending.append((topic, delta, timestamp))
+      self.condition.notify()
+
+  def stop(self):
+    """
+    Stops the delivery thread without waiting for it
+    """
+    with self.condition:
+      self.run = False
+      self.condition.notify()
+
+  def _deliver(self):
+    """
+    Sends the queued updates to the callback
+    """
+    if hasattr(self.callback, "_pyroClaimOwnership"):
+      # a Pyro proxy may only be used by one thread
+      self.callback._pyroClaimOwnership()
+    while True:
+      with self.condition:
+        while self.run and not self.pending:
+          self.condition.wait()
+        if not self.run:
+          return
+        topic, delta, timestamp = self.pending.popleft()
+      try:
+        self.callback.update(topic, delta, timestamp)
+        self.failures = 0
+      except Exception as details:
+        self.failures += 1
+        self.logger.warning("_deliver: %s failed: %s", self, details)
+        if self.failures >= self.max_failures:
+          self.logger.error("_deliver: dropping %s", self)
+          self.manager.unsubscribe(self.ID)
+          return
+
+class SubscriptionManager(object):
+  """
+  Keeps the subscriptions and sends them what changed
+  """
+  def __init__(self):
+    self.logger = logging.getLogger(module_logger.name+".SubscriptionManager")
+    self.lock = threading.Lock()
+    self.subscribers = {}
+    self.states = {}
+    self.numbers = itertools.count(1)
+
+  def subscribe(self, callback, topics=subscription_topics):
+    """
+    Adds a subscription
+
+    The subscriber is first sent the current state of each topic.
+
+    @param callback : object with an update(topic, delta, timestamp) method
+    @type  callback : object
+
+    @param topics : topics to subscribe to; default: all
+    @type  topics : list of str
+
+    @return: subscription number
+    """
+    for topic in topics:
+      if topic not in subscription_topics:
+        raise ValueError("%s is not a subscription topic" % topic)
+    with self.lock:
+      ID = next(self.numbers)
+      subscriber = Subscriber(self, ID, callback, topics)
+      self.subscribers[ID] = subscriber
+      for topic in topics:
+        if topic in self.states:
+          state, timestamp = self.states[topic]
+          subscriber.put(topic, state, timestamp)
+    subscriber.thread.start()
+    self.logger.debug("subscribe: %s", subscriber)
+    return ID
+
+  def unsubscribe(self, ID):
+    """
+    Removes a subscription
+
+    @return: True if there was one
+    """
+    with self.lock:
+      subscriber = self.subscribers.pop(ID, None)
+    if subscriber == None:
+      return False
+    subscriber.stop()
+    self.logger.debug("unsubscribe: %s", subscriber)
+    return True
+
+  def current(self, topic):
+    """
+    Returns the last published state of a topic and its time
+    """
+    return self.states.get(topic, (None, None))
+
+  def publish(self, topic, state, timestamp=None):
+    """
+    Sends the changes in the state of a topic to its subscribers
+
+    @param topic : one of 'subscription_topics'
+    @type  topic : str
+
+    @param state : the whole state of the topic
+    @type  state : dict
+
+    @param timestamp : time of the state; default: now
+    @type  timestamp : float
+
+    @return: the changes
+    """
+    if timestamp == None:
+      timestamp = time.time()
+    with self.lock:
+      old, when = self.states.get(topic, ({}, None))
+      delta = difference(old, state)
+      self.states[topic] = (state, timestamp)
+      if delta:
+        for subscriber in list(self.subscribers.values()):
+          if topic in subscriber.topics:
+            subscriber.put(topic, delta, timestamp)
+    return delta
+
+class SocketCallback(object):
+  """
+  Callback which writes the updates as JSON lines to a socket
+
+  Each line is a list [topic, delta, timestamp].
+  """
+  def __init__(self, address, family=socket.AF_INET):
+    """
+    @param address : address of a listening socket, e.g. ('localhost', 5000)
+    @type  address : tuple or str
+
+    @param family : socket address family
+    @type  family : int
+    """
+    self.socket = socket.socket(family, socket.SOCK_STREAM)
+    self.socket.connect(address)
+
+  def update(self, topic, delta, timestamp):
+    self.socket.sendall((json.dumps([topic, delta, timestamp])+"\n").encode())
+
+  def close(self):
+    self.socket.close()
@@ -0,0 +1,39 @@
+"""
+Measures the time taken to import the WBDC modules
+
+Each module is imported in a fresh Python process, several times, and the
+median is reported, e.g.::
+  python bench_import.py -n 5
+"""
+import argparse
+import subprocess
+import sys
+
+modules = ["MonitorControl.Receivers.WBDC",
+           "MonitorControl.Receivers.WBDC.latchgroup",
+           "MonitorControl.Receivers.WBDC.WBDC2",
+           "MonitorControl.Receivers.WBDC.WBDC2.WBDC2hwif"]
+
+timer = """
+import time
+start = time.time()
+import %s
+print(time.time() - start)
+"""
+
+def import_time(module):
+  """
+  Returns the time in seconds to import a module in a new process
+  """
+  output = subprocess.check_output([sys.executable, "-c", timer % module])
+  return float(output.decode().split()[-1])
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Time WBDC module imports")
+  parser.add_argument('--number', '-n', type=int, default=5,
+                      help="number of imports of each module")
+  args = parser.parse_args()
+
+  for module in modules:
+    times = sorted([import_time(module) for i in range(args.number)])
+    print("%-48s %8.1f ms" % (module, 1000*times[len(times)//2]))
@@ -41,34 +41,10 @@ from support.pyro import get_device_server
 
 from MonitorControl import ClassInstance
 from MonitorControl.Receivers.WBDC.WBDC2.WBDC2hwif import WBDC2hwif
+from MonitorControl.Receivers.WBDC.WBDC2.calibration import get_atten_IDs
 
 module_logger = logging.getLogger(__name__)
 
-def get_atten_IDs(filename):
-  """
-  Read data from a comma-separated data file
-
-  Row 1 - reference (input) power level
-  Row 2 - bias voltage
-  Row 3 - total resistance in control voltage circuit
-  Row 4 - serial number
-  Row 5 - Receiver chain
-  Row 6 - Frequency and polarization of channel
-  Rows 7+ contain the data, with control voltage in column 0.
-
-  @return:  power (dict of floats), ctlvolts (dict of floats), refpower (list of str)
-  """
-  serialnos = loadtxt(filename, delimiter=',', skiprows=3, dtype=str)[0,1:]
-  rxs =       loadtxt(filename, delimiter=',', skiprows=4, dtype=str)[0,1:]
-  headers =   loadtxt(filename, delimiter=',', skiprows=5, dtype=str)[0,1:]
-  ID = {}
-  for index in range(0, len(headers), 2):
-    chanIDa = rxs[index]+'-'+headers[index].replace(' ','-')
-    chanIDb = rxs[index]+'-'+headers[index+1].replace(' ','-')
-    ID[chanIDa] = serialnos[index]+'A'
-    ID[chanIDb] = serialnos[index]+'B'
-  return ID
-
 #---------------------------- functions for splines -----------------
 
 def sampling_points(vmin, vmax, vstep=None):
@@ -91,6 +91,41 @@ class TestWBDCServer(unittest.TestCase):
         result = client.get_IF_hybrids()
         self.assertIsNotNone(result)
 
+    def test_get_receiver_state(self):
+        client = self.__class__.client
+        result = client.get_receiver_state()
+        self.assertEqual(len(result['polarizers']), 10)
+        self.assertEqual(len(result['IF_hybrids']), 20)
+
+    def test_apply_config(self):
+        client = self.__class__.client
+        state = client.get_receiver_state()
+        result = client.apply_config({"crossover": state['crossover'],
+                                      "polarizers": state['polarizers'],
+                                      "IF_hybrids": state['IF_hybrids']})
+        self.assertEqual(result['latches'], [])
+
+    def test_execute_batch(self):
+        client = self.__class__.client
+        results = client.execute_batch([("get_crossover", [], {}),
+                                        ("no_such_method", [], {}),
+                                        ("get_polarizers", [], {})])
+        self.assertEqual(len(results), 3)
+        self.assertIsNone(results[0]['error'])
+        self.assertIsNotNone(results[1]['error'])
+        self.assertIsNone(results[2]['error'])
+
+    def test_execute_batch_refuses_other_methods(self):
+        client = self.__class__.client
+        results = client.execute_batch([("reload_calibration", [], {}),
+                                        ("_archive_scan", [None, None, {}], {}),
+                                        ("execute_batch", [[]], {}),
+                                        ("get_crossover", [], {})])
+        for result in results[:3]:
+            self.assertIsNone(result['result'])
+            self.assertIn("may not be run in a batch", result['error'])
+        self.assertIsNone(results[3]['error'])
+
 if __name__ == '__main__':
     logging.basicConfig(loglevel=logging.DEBUG)
     suite_get = unittest.TestSuite()
@@ -103,12 +138,16 @@ if __name__ == '__main__':
     suite_get.addTest(TestWBDCServer("test_get_crossover"))
     suite_get.addTest(TestWBDCServer("test_get_polarizers"))
     suite_get.addTest(TestWBDCServer("test_get_IF_hybrids"))
+    suite_get.addTest(TestWBDCServer("test_get_receiver_state"))
+    suite_get.addTest(TestWBDCServer("test_execute_batch"))
+    suite_get.addTest(TestWBDCServer("test_execute_batch_refuses_other_methods"))
 
     suite_set.addTest(TestWBDCServer("test_set_atten_volts"))
     suite_set.addTest(TestWBDCServer("test_set_atten"))
     suite_set.addTest(TestWBDCServer("test_set_crossover"))
     suite_set.addTest(TestWBDCServer("test_set_polarizers"))
     suite_set.addTest(TestWBDCServer("test_sideband_separation"))
+    suite_set.addTest(TestWBDCServer("test_apply_config"))
 
     result_get = unittest.TextTestRunner().run(suite_get)
     if result_get.wasSuccessful():
@@ -15,25 +15,90 @@ generator::
 
 """
 import argparse
+import functools
 import logging
 import sys
 import os
+import threading
+import time
 
 import Pyro5
 
 from local_dirs import log_dir
 from MonitorControl.Receivers.WBDC.WBDC2.WBDC2hwif import WBDC2hwif
+from MonitorControl.Receivers.WBDC.WBDC2.hwowner import CONTROL
+from MonitorControl.Receivers.WBDC.WBDC2.monitor import MonitorPoller
+from MonitorControl.Receivers.WBDC.WBDC2.monitor_archive import MonitorHistory
+from MonitorControl.Receivers.WBDC.WBDC2.singleflight import SingleFlight
+from MonitorControl.Receivers.WBDC.WBDC2.subscriptions import \
+                                SubscriptionManager, subscription_topics
 from supprt.pyro.pyro5_support import Pyro5Server
 
 module_logger = logging.getLogger(__name__)
 
+def on_latch_bus(method):
+    """
+    Runs a server method in the owner thread of the motherboard LabJack
+
+    The Pyro daemon serves clients in parallel; the latch bus is driven by one
+    thread, which runs control commands before monitor scans.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.wbdc.owner[1].call(CONTROL, method, self, *args, **kwargs)
+    return wrapper
+
+def coalesced(method):
+    """
+    Shares one call of a read method among the clients calling it at once
+
+    Calls with the same arguments wait for the one in progress, or take the
+    result of one which finished less than 'read_window' seconds ago.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, repr(args), repr(sorted(kwargs.items())))
+        return self.reads.call(key, method, self, *args, **kwargs)
+    return wrapper
+
+def on_tdac(method):
+    """
+    Runs a server method for attenuator 'ID' in the owner thread of its LabJack
+    """
+    @functools.wraps(method)
+    def wrapper(self, ID, *args, **kwargs):
+        owner = self.wbdc.owner[WBDC2hwif.tdac_LJ[ID[:2]]]
+        return owner.call(CONTROL, method, self, ID, *args, **kwargs)
+    return wrapper
+
 @Pyro5.api.expose
 class WBDC2hwServer(Pyro4Server):
     """
     Server for interfacing with the Wide Band Down Converter2
     """
-    def __init__(self, name, logger=None, **kwargs):
+    # the hardware getters and setters which execute_batch() may run
+    batch_methods = ["get_atten_IDs", "get_atten", "get_atten_volts",
+                     "set_atten", "set_attens", "set_atten_volts",
+                     "get_crossover", "set_crossover",
+                     "get_polarizers", "set_polarizers",
+                     "get_IF_hybrids", "sideband_separation",
+                     "get_receiver_state", "apply_config",
+                     "get_monitor_data"]
+
+    def __init__(self, name, logger=None, monitor_period=None, archive=None,
+                 read_window=0.1, **kwargs):
         """
+        @param monitor_period : seconds between scans of every monitor point;
+                                default: each point's own period
+        @type  monitor_period : float
+
+        @param archive : file to which the monitor scans are appended; the
+                         aggregates are kept in files named after it
+        @type  archive : str
+
+        @param read_window : seconds for which the result of a read is given
+                             to other clients making the same read
+        @type  read_window : float
         """
         if not logger:
             logger = logging.getLogger(module_logger.name + ".WBDC2hw_server")
@@ -41,6 +106,145 @@ class WBDC2hwServer(Pyro4Server):
         self.logger.debug("Pyro4Server superclass initialized")
         self.wbdc = WBDC2hwif(name)
         self.logger.debug("hardware interface superclass instantiated")
+        self.calibration_reload = {"status": "none"}
+        self.calibration_lock = threading.Lock()
+        self.reads = SingleFlight(read_window)
+        self.poller = MonitorPoller(self.wbdc.analog_monitor,
+                                    period=monitor_period,
+                                    owner=self.wbdc.owner[1])
+        self.archive = None
+        if archive:
+            try:
+                self.archive = MonitorHistory(archive,
+                        channels=self.wbdc.analog_monitor.conversion.labels)
+                self.poller.listeners.append(self._archive_scan)
+            except (IOError, OSError, ValueError) as details:
+                self.logger.error("monitor archive not opened: {}".format(details))
+        self.subscriptions = SubscriptionManager()
+        self._publish_state()
+        # X holds the commanded crossover, which the state is decoded from
+        for LGID in WBDC2hwif.status_groups + ['X']:
+            self.wbdc.lg[LGID].listeners.append(self._latch_changed)
+        self.poller.listeners.append(self._monitor_scanned)
+        self.poller.start()
+
+    def _publish_state(self):
+        """
+        Publishes the switch states known from the latch group shadows
+        """
+        state = self.wbdc.shadow_state()
+        if state is None:
+            return
+        state = state._asdict()
+        timestamp = state.pop("time")
+        self.subscriptions.publish("state", state, timestamp)
+
+    def _latch_changed(self, latchgroup, data):
+        """
+        Publishes the switch states when a status latch group or the
+        crossover latch group changes
+
+        Reads made before the change are not given to any more clients.
+        """
+        self.reads.invalidate()
+        self._publish_state()
+
+    def _monitor_scanned(self, poller, snapshot, readings):
+        """
+        Publishes the monitor readings after a scan
+        """
+        self.subscriptions.publish("monitor", dict(snapshot.data),
+                                   snapshot.time)
+
+    def _archive_scan(self, poller, snapshot, readings):
+        """
+        Appends a monitor scan to the archive, at the time of its last reading,
+        and adds it to the aggregates
+
+        A scan whose readings were all left out is not archived.
+        """
+        if not readings:
+            return
+        values = {label: value for label, (t, value) in readings.items()}
+        self.archive.append(max([t for t, value in readings.values()]), values)
+
+    def execute_batch(self, operations, stop_on_error=False):
+        """
+        Runs several server methods, in order, in one call
+
+        Only the methods in 'batch_methods' may be run; any other name is
+        refused as an error of that operation.  An operation which fails does
+        not stop the others unless 'stop_on_error' is True; the operations
+        after it are then skipped.
+
+        @param operations : (method name, args, kwargs) for each operation
+        @type  operations : list of lists
+
+        @param stop_on_error : skip the rest after an operation fails
+        @type  stop_on_error : bool
+
+        @return: list with a dict for each operation with the 'result', the
+                 'error' (None, or the exception as a string) and the 'time'
+                 taken in seconds
+        """
+        self.logger.debug("execute_batch: Called. {} operations".format(
+            len(operations)))
+        results = []
+        failed = False
+        for operation in operations:
+            method = operation[0]
+            args = operation[1] if len(operation) > 1 else []
+            kwargs = operation[2] if len(operation) > 2 else {}
+            if failed:
+                results.append({"result": None, "error": "skipped",
+                                "time": 0.0})
+                continue
+            start = time.time()
+            try:
+                if method not in self.batch_methods:
+                    raise AttributeError(
+                        "{} may not be run in a batch".format(method))
+                result = getattr(self, method)(*args, **kwargs)
+                error = None
+            except Exception as details:
+                self.logger.error("execute_batch: {}: {}".format(method, details))
+                result = None
+                error = "{}: {}".format(type(details).__name__, details)
+                failed = stop_on_error
+            results.append({"result": result, "error": error,
+                            "time": time.time() - start})
+        return results
+
+    def subscribe(self, callback, topics=None):
+        """
+        Registers a callback for changes in the receiver state
+
+        The callback is first sent the current state of each topic and after
+        that only what changed, as update(topic, delta, timestamp); an item
+        which is no longer in the state comes as None.
+
+        @param callback : Pyro callback object with an update() method
+        @type  callback : Pyro proxy
+
+        @param topics : 'state' for the switches, 'monitor' for the analog
+                        monitor readings; default: both
+        @type  topics : list of str
+
+        @return: subscription number, for unsubscribe()
+        """
+        self.logger.debug("subscribe: Called. topics: {}".format(topics))
+        if topics is None:
+            topics = subscription_topics
+        return self.subscriptions.subscribe(callback, topics)
+
+    def unsubscribe(self, ID):
+        """
+        Cancels a subscription
+
+        @return: True if there was such a subscription
+        """
+        self.logger.debug("unsubscribe: Called. ID: {}".format(ID))
+        return self.subscriptions.unsubscribe(ID)
 
     def set_WBDC(self, option):
         """
@@ -90,14 +294,17 @@ class WBDC2hwServer(Pyro4Server):
         self.logger.debug("get_atten_IDs: report: {}".format(report))
         return report
 
+    @on_tdac
     def set_atten_volts(self, ID, V):
         """
         Sets the designated attenuator voltage
+
+        The attenuation and the journal are updated as for set_atten().
         """
         self.logger.debug("set_atten_volts: Called. ID: {}, V: {}".format(ID, V))
         pol_id = ID[:5]
         self.logger.debug("set_atten: pol section is %s", pol_id)
-        self.wbdc.pol_sec[pol_id].atten[ID].VS.setVoltage(V)
+        self.wbdc.set_atten_volts(pol_id, ID, V)
         return True
 
     def get_atten_volts(self, ID):
@@ -116,6 +323,7 @@ class WBDC2hwServer(Pyro4Server):
         self.logger.debug("get_atten_volts: volts: {}".format(volts))
         return volts
 
+    @on_tdac
     def set_atten(self, ID, dB):
         """
         Sets pol section quad hybrid input attentuator
@@ -132,6 +340,67 @@ class WBDC2hwServer(Pyro4Server):
         self.wbdc.pol_sec[pol_id].atten[ID].set_atten(dB)
         return self.wbdc.pol_sec[pol_id].atten[ID].atten
 
+    def set_attens(self, attens):
+        """
+        Sets several attenuators at once
+
+        @param attens : attenuation in dB keyed by attenuator ID
+        @type  attens : dict of str:float
+
+        @return: dict of attenuations set (None if failed) keyed by ID
+        """
+        self.logger.debug("set_attens: Called. attens: {}".format(attens))
+        result = self.wbdc.set_attens(attens)
+        self.logger.debug("set_attens: result: {}".format(result))
+        return result
+
+    def reload_calibration(self, path=None):
+        """
+        Loads a new attenuator calibration in the background
+
+        The receiver keeps working with the old calibration until the new one
+        is ready.  Use get_calibration_status() to see the outcome.
+
+        @param path : calibration store (.npy) or splines pickle
+        @type  path : str
+
+        @return: False if a reload is already in progress
+        """
+        self.logger.debug("reload_calibration: Called. path: {}".format(path))
+        with self.calibration_lock:
+            if self.calibration_reload["status"] == "loading":
+                return False
+            self.calibration_reload = {"status": "loading", "path": path}
+        thread = threading.Thread(target=self._reload_calibration,
+                                  args=(path,), name="reload_calibration")
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _reload_calibration(self, path):
+        """
+        Reloads the calibration and records the outcome
+        """
+        try:
+            result = self.wbdc.reload_calibration(path)
+            result["status"] = "done"
+        except Exception as details:
+            self.logger.error("_reload_calibration: {}".format(details))
+            result = {"status": "failed", "error": str(details)}
+        result["path"] = path
+        with self.calibration_lock:
+            self.calibration_reload = result
+
+    def get_calibration_status(self):
+        """
+        Returns the calibration in use and the outcome of the last reload
+        """
+        self.logger.debug("get_calibration_status: Called.")
+        with self.calibration_lock:
+            status = dict(self.calibration_reload)
+        status["source"] = self.wbdc.get_calibration().source
+        return status
+
     def get_atten(self, ID):
         """
         Returns the attenuation to which the specified attenuator is set.
@@ -147,19 +416,77 @@ class WBDC2hwServer(Pyro4Server):
         self.logger.debug("get_atten: result {}".format(result))
         return result
 
-    def get_monitor_data(self):
+    @coalesced
+    def get_monitor_data(self, max_age=None, points=None):
         """
         Returns the analog voltages, currents and temperatures
+
+        The data come from the latest readings by the monitor poller.  Those
+        older than 'max_age' seconds are read again first.  Clients asking
+        for the same data at once share one result (see 'read_window').
+
+        @param max_age : largest acceptable age of the data in seconds
+        @type  max_age : float
+
+        @param points : labels of the readings wanted; default: all
+        @type  points : list of str
         """
-        self.logger.debug("get_monitor_data: Called.")
-        monitor_data = {}
-        for latchgroup in [1, 2]:
-            MD = self.wbdc.analog_monitor.get_monitor_data(latchgroup)
-            for key in MD.keys():
-                monitor_data[key] = MD[key]
+        self.logger.debug("get_monitor_data: Called. max_age: {}, points: {}".format(
+            max_age, points))
+        snapshot = self.poller.get(max_age, points=points,
+                                   timeout=self.poller.longest_period())
+        if snapshot is None:
+            self.logger.error("get_monitor_data: no monitor data")
+            return {}
+        if points is None:
+            monitor_data = dict(snapshot.data)
+        else:
+            monitor_data = {label: snapshot.data[label] for label in points
+                            if label in snapshot.data}
         self.logger.debug("get_monitor_data: monitor_data: {}".format(monitor_data))
         return monitor_data
 
+    def get_monitor_history(self, channels, start, stop, max_points=1000):
+        """
+        Returns the archived monitor data of some channels in a time range
+
+        The data come from the raw scans if there are at most 'max_points' of
+        them, or else from the aggregates over the shortest interval (10 s,
+        1 min, 10 min or 1 h) which gives no more than 'max_points' points.
+        Missing values are None.
+
+        @param channels : reading labels, as returned by get_monitor_data()
+        @type  channels : list of str
+
+        @param start : earliest time (UNIX seconds)
+        @type  start : float
+
+        @param stop : time after the latest one wanted
+        @type  stop : float
+
+        @param max_points : largest number of points wanted
+        @type  max_points : int
+
+        @return: dict with the 'interval' in seconds (0 for raw scans), the
+                 'time' list and, keyed by label, a dict of 'min', 'mean',
+                 'max' and 'count' lists
+        """
+        self.logger.debug("get_monitor_history: Called. channels: {}, {} to {}".format(
+            channels, start, stop))
+        if self.archive is None:
+            self.logger.error("get_monitor_history: no monitor archive")
+            return {}
+        history = self.archive.query(channels, start, stop, max_points)
+        result = {"interval": history["interval"],
+                  "time": history["time"].tolist()}
+        for label in channels:
+            result[label] = {}
+            for field, values in history[label].items():
+                result[label][field] = [None if value != value else value
+                                        for value in values.tolist()]
+        return result
+
+    @on_latch_bus
     def set_crossover(self, crossover):
         """
         Set or unset the crossover switch
@@ -169,15 +496,18 @@ class WBDC2hwServer(Pyro4Server):
         self.logger.debug("set_crossover: result: {}".format(result))
         return result
 
+    @coalesced
+    @on_latch_bus
     def get_crossover(self):
         """
-        Set or unset the crossover switch
+        Returns the state of the crossover switch
         """
         self.logger.debug("get_crossover: Called.")
-        state = self.wbdc.crossSwitch.get_state()
+        state = self.wbdc.snapshot().crossover
         self.logger.debug("get_crossover: state: {}".format(state))
         return state
 
+    @on_latch_bus
     def set_polarizers(self, state):
         """
         Set all polarizers to the specified state
@@ -185,12 +515,12 @@ class WBDC2hwServer(Pyro4Server):
         True for E/H to L/R conversion.  Flase for bypass.
         """
         self.logger.debug("set_polarizers: Called. state: {}".format(state))
-        states = {}
-        for ps in self.wbdc.pol_sec.keys():
-            states[ps] = self.wbdc.pol_sec[ps].set_state(state)
+        states = self.wbdc.set_pol_sec_states(state)
         self.logger.debug("set_polarizers: states: {}".format(states))
         return states
 
+    @coalesced
+    @on_latch_bus
     def get_polarizers(self):
         """
         Set all polarizers to the specified state
@@ -198,12 +528,11 @@ class WBDC2hwServer(Pyro4Server):
         True for E/H to L/R conversion.  Flase for bypass.
         """
         self.logger.debug("get_polarizers: Called.")
-        states = {}
-        for ps in self.wbdc.pol_sec.keys():
-            states[ps] = self.wbdc.pol_sec[ps].get_state()
+        states = self.wbdc.snapshot().polarizers
         self.logger.debug("get_polarizers: states: {}".format(states))
         return states
 
+    @on_latch_bus
     def sideband_separation(self, state):
         """
         Convert I/Q to LSB/USB
@@ -216,12 +545,12 @@ class WBDC2hwServer(Pyro4Server):
         True means that the sidebands are separated.
         """
         self.logger.debug("sideband_separation: Called. state: {}".format(state))
-        states = {}
-        for dc in self.wbdc.DC.keys():
-            states[dc] = self.wbdc.DC[dc].set_state(1 - int(state))
+        states = self.wbdc.set_DC_states(1 - int(state))
         self.logger.debug("sideband_separation: states: {}".format(states))
         return states
 
+    @coalesced
+    @on_latch_bus
     def get_IF_hybrids(self):
         """
         Returns the state of the IQ-to-LU hybrids.
@@ -229,12 +558,40 @@ class WBDC2hwServer(Pyro4Server):
         True means that the hybrid is bypassed, False that it is engaged.
         """
         self.logger.debug("get_IF_hybrids: Called.")
-        states = {}
-        for dc in self.wbdc.DC.keys():
-            states[dc] = self.wbdc.DC[dc].get_state()
+        states = self.wbdc.snapshot().IF_hybrids
         self.logger.debug("get_IF_hybrids: states: {}".format(states))
         return states
 
+    @coalesced
+    @on_latch_bus
+    def get_receiver_state(self):
+        """
+        Returns the states of all the switches from one pass over the latches
+
+        The result has keys 'time', 'crossover', 'polarizers', 'IF_hybrids',
+        'PLL' and 'latches'.
+        """
+        self.logger.debug("get_receiver_state: Called.")
+        state = dict(self.wbdc.snapshot()._asdict())
+        self.logger.debug("get_receiver_state: state: {}".format(state))
+        return state
+
+    @on_latch_bus
+    def apply_config(self, config):
+        """
+        Puts the receiver in the specified state with the fewest hardware writes
+
+        @param config : dict with optional keys 'crossover', 'polarizers',
+                        'IF_hybrids' and 'attens'; see ReceiverConfig
+        @type  config : dict
+
+        @return: dict with what changed and the time taken in seconds
+        """
+        self.logger.debug("apply_config: Called. config: {}".format(config))
+        changed = self.wbdc.apply(config)
+        self.logger.debug("apply_config: changed: {}".format(changed))
+        return changed
+
 def simple_parse_args():
     """
     """
@@ -342,13 +699,13 @@ if __name__ == "__main__":
     logger = logging.getLogger(name)
     logger.setLevel(loglevel)
 
-    m = WBDC2hwServer(name, logfile=logfile, logger=logger)
+    m = WBDC2hwServer(name, logfile=logfile, logger=logger,
+                      archive=os.path.join(log_dir, "wbdc2_monitor.npy"))
     m.launch_server(remote_server_name=parsed.remote_server_name,
                     local=parsed.local,
                     ns_host=parsed.ns_host,
                     ns_port=parsed.ns_port,
                     objectId=equipment["Antenna"].name,
                     objectPort=50003, 
-                    ns=False, 
-                    threaded=False, 
-                    local=True)
+                    ns=False,
+                    threaded=True)
@@ -25,6 +25,7 @@ import numpy
 from local_dirs import log_dir
 from MonitorControl import MCserver
 from MonitorControl.Receivers.WBDC.WBDC2.WBDC2hwif import WBDC2hwif
+from MonitorControl.Receivers.WBDC.WBDC2.monitor import MonitorPoller
 from support.logs import set_module_loggers
 from support.logs import init_logging, get_loglevel, set_loglevel
 from support.pyro import launch_server
@@ -35,14 +36,19 @@ module_logger = logging.getLogger(__name__)
 class WBDC2hw_server(MCserver, WBDC2hwif):
   """
   """
-  def __init__(self, name):
+  def __init__(self, name, monitor_period=None):
     """
+    @param monitor_period : seconds between scans of every monitor point;
+                            default: each point's own period
+    @type  monitor_period : float
     """
     self.logger = logging.getLogger(module_logger.name+".WBDC2hw_server")
     super(WBDC2hw_server,self).__init__()
     self.logger.debug(" superclass initialized")
     WBDC2hwif.__init__(self, name)
     self.logger.debug(" hardware interface instantiated")
+    self.poller = MonitorPoller(self.analog_monitor, period=monitor_period)
+    self.poller.start()
     self.run = True
 
   def set_WBDC(self,option):
@@ -140,16 +146,26 @@ class WBDC2hw_server(MCserver, WBDC2hwif):
     self.logger.debug("set_atten: pol section is %s", pol_id)
     return self.pol_sec[pol_id].atten[ID].get_atten()
   
-  def get_monitor_data(self):
+  def get_monitor_data(self, max_age=None, points=None):
     """
     Returns the analog voltages, currents and temperatures
+
+    The data come from the latest readings by the monitor poller.  Those older
+    than 'max_age' seconds are read again first.  'points' are the labels of
+    the readings wanted; default: all.
     """
-    monitor_data = {}
-    for latchgroup in [1,2]:
-      MD = self.analog_monitor.get_monitor_data(latchgroup)
-      for key in MD.keys():
-        monitor_data[key] = MD[key]
-    return monitor_data
+    snapshot = self.poller.get(max_age, points=points,
+                               timeout=self.poller.longest_period())
+    if snapshot == None:
+      self.logger.error("get_monitor_data: no monitor data")
+      return {}
+    if points == None:
+      return dict(snapshot.data)
+    data = {}
+    for label in points:
+      if label in snapshot.data:
+        data[label] = snapshot.data[label]
+    return data
   
   def set_crossover(self, crossover):
     """
@@ -159,9 +175,9 @@ class WBDC2hw_server(MCserver, WBDC2hwif):
   
   def get_crossover(self):
     """
-    Set or unset the crossover switch
+    Returns the state of the crossover switch
     """
-    return self.crossSwitch.get_state()
+    return self.snapshot().crossover
 
   def set_polarizers(self, state):
     """
@@ -169,10 +185,7 @@ class WBDC2hw_server(MCserver, WBDC2hwif):
     
     True for E/H to L/R conversion.  Flase for bypass.
     """
-    states = {}
-    for ps in self.pol_sec.keys():
-      states[ps] = self.pol_sec[ps].set_state(state)
-    return states
+    return self.set_pol_sec_states(state)
 
   def get_polarizers(self):
     """
@@ -180,10 +193,7 @@ class WBDC2hw_server(MCserver, WBDC2hwif):
     
     True for E/H to L/R conversion.  Flase for bypass.
     """
-    states = {}
-    for ps in self.pol_sec.keys():
-      states[ps] = self.pol_sec[ps].get_state()
-    return states
+    return self.snapshot().polarizers
 
   def sideband_separation(self, state):
     """
@@ -196,10 +206,7 @@ class WBDC2hw_server(MCserver, WBDC2hwif):
     To make this function more intuitive, the logic is inverted here, that is,
     True means that the sidebands are separated.
     """
-    states = {}
-    for dc in self.DC.keys():
-      states[dc] = self.DC[dc].set_state(1-int(state))
-    return states
+    return self.set_DC_states(1-int(state))
     
   def get_IF_hybrids(self):
     """
@@ -207,10 +214,7 @@ class WBDC2hw_server(MCserver, WBDC2hwif):
     
     True means that the hybrid is bypassed, False that it is engaged.
     """
-    states = {}
-    for dc in self.DC.keys():
-      states[dc] = self.DC[dc].get_state()
-    return states
+    return self.snapshot().IF_hybrids
           
 if __name__ == "__main__":
   #logpath = "/usr/local/logs/"
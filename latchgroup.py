@@ -80,11 +80,10 @@ receiver.
 """
 import u3
 import logging
-import time
+import threading
 
 import Math
 from Math.Bin import getbit
-from support import python_version
 from MonitorControl import ObservatoryError
 
 module_logger = logging.getLogger(__name__)
@@ -98,6 +97,236 @@ WBDCsignal = {
   'A4': 12, 'A5': 13, 'A6':   14, 'A7':    15,
   'SCK':16, 'SDI':17, 'NLOAD':18, 'CS-BUS':19}
 
+# A U3 Feedback packet may not exceed 64 bytes in either direction.  After the
+# command header (7 bytes) and the response header (9 bytes) this leaves room
+# for these many bytes of commands and of responses.  See u3.U3.getFeedback().
+MAX_FEEDBACK_CMD_BYTES = 57
+MAX_FEEDBACK_RESP_BYTES = 55
+
+def split_feedback(commands, tail=[]):
+  """
+  Splits a list of feedback commands into packets the U3 will accept
+
+  The commands are kept in order.  A new packet is started only when the next
+  command would make the command or the response part too long.
+
+  @param commands : feedback commands
+  @type  commands : list of u3.FeedbackCommand instances
+
+  @param tail : commands which end every packet, e.g. a port read to verify
+                the latch address
+  @type  tail : list of u3.FeedbackCommand instances
+
+  @return: list of lists of u3.FeedbackCommand instances
+  """
+  max_cmd_bytes = MAX_FEEDBACK_CMD_BYTES - \
+                  sum([len(command.cmdBytes) for command in tail])
+  max_resp_bytes = MAX_FEEDBACK_RESP_BYTES - \
+                   sum([command.readLen for command in tail])
+  packets = []
+  packet = []
+  cmd_bytes = 0
+  resp_bytes = 0
+  for command in commands:
+    if packet and (
+            cmd_bytes + len(command.cmdBytes) > max_cmd_bytes or
+            resp_bytes + command.readLen > max_resp_bytes):
+      packets.append(packet + tail)
+      packet = []
+      cmd_bytes = 0
+      resp_bytes = 0
+    packet.append(command)
+    cmd_bytes += len(command.cmdBytes)
+    resp_bytes += command.readLen
+  if packet:
+    packets.append(packet + tail)
+  return packets
+
+def pack_feedback(groups, tail=[]):
+  """
+  Splits groups of feedback commands into packets, keeping each group whole
+
+  Whole groups are packed into as few packets as they fit.  A group which
+  does not fit in a packet by itself is split with split_feedback(), and only
+  then does a packet end inside a group.
+
+  @param groups : groups of feedback commands, in order
+  @type  groups : list of lists of u3.FeedbackCommand instances
+
+  @param tail : commands which end every packet
+  @type  tail : list of u3.FeedbackCommand instances
+
+  @return: list of lists of u3.FeedbackCommand instances
+  """
+  packets = []
+  packet = []
+  for group in groups:
+    if len(split_feedback(packet + group, tail)) == 1:
+      packet = packet + group
+      continue
+    if packet:
+      packets.append(packet + tail)
+    pieces = split_feedback(group, tail)
+    packets += pieces[:-1]
+    packet = pieces[-1][:len(pieces[-1])-len(tail)]
+  if packet:
+    packets.append(packet + tail)
+  return packets
+
+
+# U3C time units of the WaitShort and WaitLong feedback commands
+WAIT_SHORT_UNIT = 128e-6
+WAIT_LONG_UNIT = 16384e-6
+
+def wait_commands(seconds):
+  """
+  Feedback commands which make the LabJack wait at least the given time
+
+  WaitLong is used for whole multiples of its unit and WaitShort for the
+  remainder, which is rounded up.
+
+  @param seconds : time to wait
+  @type  seconds : float
+
+  @return: list of u3.WaitLong and u3.WaitShort instances
+  """
+  commands = []
+  if seconds <= 0:
+    return commands
+  long_units = int(seconds/WAIT_LONG_UNIT)
+  while long_units > 0:
+    commands.append(u3.WaitLong(min(long_units, 255)))
+    long_units -= 255
+  remainder = seconds - int(seconds/WAIT_LONG_UNIT)*WAIT_LONG_UNIT
+  short_units = int(-(-remainder//WAIT_SHORT_UNIT))
+  if short_units > 0:
+    commands.append(u3.WaitShort(min(short_units, 255)))
+  return commands
+
+
+class LatchTiming(object):
+  """
+  Settling times for the motherboard serial signals
+
+  After a signal is changed, the LabJack itself waits for the settling time
+  of that signal before it executes the next command of the same feedback
+  packet.  The host does not sleep.  NLOAD must be held low for at least
+  10 ms; the other signals need no more than the time it takes the U3 to
+  execute the next command.
+
+  A signal in 'edges' settles only after it is set to the state given there.
+  NLOAD loads the latch when it goes low, so there is no wait when it goes
+  back high.
+
+  The times are in seconds and keyed by the names used in WBDCsignal::
+    In [1]: slow = LatchTiming(SCK=0.001, SDI=0.001)
+  """
+  defaults = {"SCK": 0, "SDI": 0, "NLOAD": 0.010, "CS-BUS": 0}
+  edges = {"NLOAD": 0}
+
+  def __init__(self, **settle):
+    """
+    @param settle : settling times which differ from the defaults
+    @type  settle : dict of str:float
+    """
+    self.settle = dict(LatchTiming.defaults)
+    for signal in settle:
+      if signal not in WBDCsignal:
+        raise ObservatoryError(signal, "is not a WBDC signal")
+      self.settle[signal] = settle[signal]
+
+  def __repr__(self):
+    return "LatchTiming(%s)" % self.settle
+
+  def wait(self, *signals):
+    """
+    Wait commands for the longest settling time of the given signals
+    """
+    return wait_commands(max([self.settle.get(signal, 0)
+                              for signal in signals] + [0]))
+
+  def wait_after(self, states):
+    """
+    Wait commands for the longest settling time of signals being set
+
+    @param states : new states keyed by signal name
+    @type  states : dict of str:int
+    """
+    return self.wait(*[signal for signal in states
+                       if bool(states[signal]) ==
+                          bool(LatchTiming.edges.get(signal, states[signal]))])
+
+default_timing = LatchTiming()
+
+
+class LatchBus(object):
+  """
+  Owner of the latch bus of a LabJack
+
+  All the latch groups on a motherboard share the address lines EIO0-EIO7 of
+  one LabJack.  The bus sends their feedback commands and remembers which
+  address was selected last, so that the bit-banged transport need not spend a
+  USB transaction selecting an address which is already on the lines.  (A
+  batched command list selects the address in the same packet as the rest of
+  the operation, so there is nothing to save there.)  The address becomes
+  unknown if a transaction fails.
+
+  A latch operation may take more than one transaction, so latch groups hold
+  the bus lock for the whole operation.
+  """
+  def __init__(self, labjack):
+    """
+    @param labjack : LabJack controlling the latches
+    @type  labjack : u3.U3 class instance
+    """
+    self.LJ = labjack
+    self.address = None
+    self.lock = threading.RLock()
+    self.logger = logging.getLogger(module_logger.name+".LatchBus")
+
+  def feedback(self, commands):
+    """
+    Sends feedback commands in as few USB transactions as possible
+
+    @param commands : feedback commands
+    @type  commands : list of u3.FeedbackCommand instances
+
+    @return: list of command results, in the order of the commands
+    """
+    results = []
+    for packet in split_feedback(commands):
+      try:
+        packet_results = self.LJ.getFeedback(packet)
+      except Exception:
+        self.address = None
+        raise
+      for command, result in zip(packet, packet_results):
+        if isinstance(command, u3.PortStateRead):
+          self.address = result['EIO']
+        elif isinstance(command, u3.PortStateWrite) and \
+             command.cmdBytes[2] == 0xff:
+          # cmdBytes are the command code, the FIO, EIO and CIO write masks
+          # and the FIO, EIO and CIO states
+          self.address = command.cmdBytes[5]
+      results += packet_results
+    return results
+
+  def selected(self, address):
+    """
+    True if the latch address is known to be on the address lines
+    """
+    return self.address == address
+
+buses = {}
+
+def latch_bus(labjack):
+  """
+  Returns the LatchBus of a LabJack, creating it when first needed
+  """
+  if labjack not in buses:
+    buses[labjack] = LatchBus(labjack)
+  return buses[labjack]
+
 
 class LatchGroup():
   """
@@ -114,10 +343,33 @@ class LatchGroup():
 
     The latch groups are controlled by LabJack1.
   """
-  def __init__(self, parent=None, labjack=None, DM=1, LG=None):
+  readback_policies = ["always", "never", "on demand"]
+
+  def __init__(self, parent=None, labjack=None, DM=1, LG=None, batched=True,
+               timing=None, readback="always", select=True):
     """
     Creates a LatchGroup instance
 
+    If 'batched' is True, a latch write or read is sent to the LabJack as one
+    list of feedback commands instead of one USB transaction per signal change.
+    The signals are given time to settle by waits executed in the LabJack, as
+    specified by a LatchTiming instance.
+
+    The group keeps a shadow copy of the byte last written to it so that bits
+    can be changed without reading the latch first (see update()).  The
+    'readback' policy says when the latch is read back to verify it::
+      "always"    - after every update; the default
+      N (int)     - after every N-th write
+      "on demand" - only when verify() or get() is called
+      "never"     - not even by get(), which returns the shadow byte
+    Whatever the policy, a read which does not give the byte last written is
+    reported before the byte read replaces the shadow.
+
+    Functions in 'listeners' are called as listener(latchgroup, byte) when the
+    shadow byte changes, whether it was written or read.  Functions in
+    'write_listeners' are called the same way after a byte is written.  Both
+    are called while the latch bus is held and must not wait for anything.
+
     @param parent : device to which the LatchGroup instance belongs
     @type  parent : Device subclass instance
 
@@ -129,6 +381,19 @@ class LatchGroup():
 
     @param LG : latch group number
     @type  LG : int
+
+    @param batched : send each latch operation as a single command list
+    @type  batched : bool
+
+    @param timing : signal settling times; default: module default_timing
+    @type  timing : LatchTiming instance
+
+    @param readback : when to verify written data
+    @type  readback : str or int
+
+    @param select : put the latch address on the bus now; this costs a USB
+                    transaction and is not needed when nothing is read yet
+    @type  select : bool
     """
     self.logger = logging.getLogger(parent.logger.name+".LatchGroup")
     if parent == None and labjack == None:
@@ -145,7 +410,24 @@ class LatchGroup():
     else:
       self.address = self.getLatchAddr(parent, DM=DM, LG=LG)
     self.name = str(self.address)
-    self.setLatchAddr()
+    self.bus = latch_bus(self.LJ)
+    self.batched = batched
+    if timing:
+      self.timing = timing
+    else:
+      self.timing = default_timing
+    if readback not in LatchGroup.readback_policies and \
+       not (type(readback) == int and readback > 0):
+      raise ObservatoryError(str(readback), "is not a readback policy")
+    self.readback = readback
+    self.shadow = None
+    self.commanded = None
+    self.verified = None
+    self.writes_since_verify = 0
+    self.listeners = []
+    self.write_listeners = []
+    if select:
+      self.setLatchAddr()
 
   def __str__(self):
     return self.base()+' "'+self.name+'"'
@@ -209,7 +491,7 @@ class LatchGroup():
     select a latch by address
 
     The latch address is set on EIO0-EIO7, also known as A0-A7 and channels
-    8-15.
+    8-15.  Nothing is sent if the address is already selected.
 
     @return: boolean
     """
@@ -217,12 +499,14 @@ class LatchGroup():
       address = self.address | 4
     else:
       address = self.address
+    if self.bus.selected(address):
+      return True
     states = [0, address, 0]
     mask = [0, 0xff, 0] # EIO port
     self.logger.debug("  setLatchAddr: writing %s with mask bits %s to select latch %s",
                       states, mask, address)
     try:
-      self.LJ.getFeedback(u3.PortStateWrite(State = states, WriteMask = mask))
+      self.feedback([u3.PortStateWrite(State = states, WriteMask = mask)])
       return True
     except u3.LabJackException as details:
       self.logger.error("  setLatchAddr: LabJack could not set latch %d\n%s",
@@ -240,14 +524,58 @@ class LatchGroup():
     CS-BUS is the global enable. The normal state is high. Set to this to low
     when programming latches or reading data. Then set high when done.
 
+    The byte read is kept as the verified state of the latch group and
+    replaces the shadow byte.  If it is not the byte last written, that is
+    logged as an error.
+
     @return: byte
     """
     self.logger.debug("  read: Reading latch %d", self.address)
+    with self.bus.lock:
+      data = self._read()
+    if data != None and data >= 0:
+      if self.commanded != None and data != self.commanded:
+        self.logger.error("read: latch %d has %s; %s was written",
+                          self.address, Math.decimal_to_binary(data,8),
+                          Math.decimal_to_binary(self.commanded,8))
+      self.verified = data
+      self._set_shadow(data)
+    return data
+
+  def _set_shadow(self, data):
+    """
+    Replaces the shadow byte and tells the listeners if it changed
+    """
+    if data == self.shadow:
+      return
+    self.shadow = data
+    self._notify(self.listeners, data)
+
+  def _notify(self, listeners, data):
+    """
+    Calls listeners with a byte, logging any which fail
+    """
+    for listener in listeners:
+      try:
+        listener(self, data)
+      except Exception as details:
+        self.logger.error("_notify: listener %s failed: %s",
+                          listener, details)
+
+  def _read(self):
+    """
+    Reads the latch with the transport of this class
+    """
+    if self.batched:
+      return self._read_batched()
     # Select the latch to be read
     if self.setLatchAddr(read=True):
-      port_states = self.LJ.getFeedback(u3.PortStateRead())
+      # The latch address is checked with the port states returned when the
+      # signals are initialized
+      port_states = self.set_signals(
+                                 {"SCK":1, "SDI":1,"NLOAD":1, "CS-BUS":1})
       self.logger.debug("  read: port states to check latch address: %s", port_states)
-      latchAddr = port_states[0]['EIO']
+      latchAddr = port_states['EIO']
       #self.logger.debug("  read: LatchGroup address is %d",latchAddr)
       if latchAddr != self.address and latchAddr != (self.address | 4):
         self.logger.debug("  read: Requested latch %d but got %d",
@@ -255,8 +583,6 @@ class LatchGroup():
         return None
       else:
         #self.logger.debug("  read: latch address set to %d", self.address)
-        portStates = self.set_signals(
-                                 {"SCK":1, "SDI":1,"NLOAD":1, "CS-BUS":1})
         # Store the information to be read from this address
         self.set_signals({"NLOAD":0})
         self.set_signals({"NLOAD":1})
@@ -266,8 +592,8 @@ class LatchGroup():
         # Process from MS to LS bit
         for bit in range(7,-1,-1):
           try:
-            state = self.LJ.getFeedback(
-                            u3.BitStateRead(IONumber = WBDCsignal["SDO"]))[0]
+            state = self.feedback(
+                            [u3.BitStateRead(IONumber = WBDCsignal["SDO"])])[0]
             #self.logger.debug("  read: bit %d state is %d for MBDATA = %d",
             #                  bit, state, MBDATA)
           except Exception as details:
@@ -285,14 +611,83 @@ class LatchGroup():
       self.logger.error("  read: Setting latch address failed")
       return -1
 
+  def update(self, bits):
+    """
+    Changes bits of the latch group without reading it first
+
+    The new byte is computed from the shadow byte.  The latch is read only
+    if nothing is known about it yet, or afterwards if the readback policy
+    calls for verification.
+
+    @param bits : new bit states keyed by bit number
+    @type  bits : dict of int:bool
+
+    @return: byte as written (or as read back), or None on failure
+    """
+    with self.bus.lock:
+      return self._update(bits)
+
+  def _update(self, bits):
+    """
+    Changes bits of the latch group while holding the bus lock
+    """
+    if self.shadow == None:
+      data = self.read()
+      if data == None or data < 0:
+        self.logger.error("update: could not get state of latch %d",
+                          self.address)
+        return None
+    data = self.shadow
+    for bit in bits:
+      if bits[bit]:
+        data = Math.Bin.setbit(data, bit)
+      else:
+        data = Math.Bin.clrbit(data, bit)
+    self.logger.debug("update: latch %d from %s to %s", self.address,
+                      Math.decimal_to_binary(self.shadow,8),
+                      Math.decimal_to_binary(data,8))
+    if not self.write(data):
+      return None
+    if self.readback == "always" or \
+       (type(self.readback) == int and
+        self.writes_since_verify >= self.readback):
+      return self.verify()
+    return data
+
+  def verify(self):
+    """
+    Reads the latch back and checks it against the byte last written
+
+    A mismatch is logged by read().
+
+    @return: byte read, or None
+    """
+    data = self.read()
+    self.writes_since_verify = 0
+    if data == None or data < 0:
+      self.logger.error("verify: could not read latch %d", self.address)
+      return None
+    return data
+
+  def get(self):
+    """
+    Returns the state of the latch group
+
+    The latch is read unless the readback policy is "never" and the state is
+    already known.
+    """
+    if self.readback == "never" and self.shadow != None:
+      return self.shadow
+    return self.read()
+
   def send_bit(self, bit, value):
     """
     """
     self.logger.debug("send_bit: Setting EIO bit %d to %d", bit, value)
     try:
-      error = self.LJ.getFeedback(
-                                 u3.BitStateWrite(IONumber = WBDCsignal["SDI"],
-                                                  State = value))
+      error = self.feedback(
+                                 [u3.BitStateWrite(IONumber = WBDCsignal["SDI"],
+                                                   State = value)])
       # toggle SCK
       self.set_signals({"SCK":0})
       self.set_signals({"SCK":1})
@@ -319,11 +714,27 @@ class LatchGroup():
     @type LATCHDATA : int
     @param LATCHDATA : byte to be sent to latch
 
+    A successful write becomes the shadow byte of the latch group.
+
     @return: bool
     """
     self.logger.debug("write: Writing %s to %s",
                       Math.decimal_to_binary(LATCHDATA,8), self)
-    #
+    with self.bus.lock:
+      status = self._write(LATCHDATA)
+    if status:
+      self.commanded = LATCHDATA
+      self._set_shadow(LATCHDATA)
+      self._notify(self.write_listeners, LATCHDATA)
+      self.writes_since_verify += 1
+    return status
+
+  def _write(self, LATCHDATA):
+    """
+    Writes the latch with the transport of this class
+    """
+    if self.batched:
+      return self._write_batched(LATCHDATA)
     if self.setLatchAddr() == False:
       self.logger.error("write: Failed to set latch address")
       return False
@@ -344,6 +755,155 @@ class LatchGroup():
     self.set_signals({"CS-BUS":1})
     return True
 
+  def _write_batched(self, LATCHDATA):
+    """
+    Writes serial data to the latch with one list of feedback commands
+
+    The address selection, the serial shift sequence and a final port read for
+    verification are sent together.  The list is split only where the U3
+    packet size requires it, so this takes one or two USB transactions.
+
+    @type LATCHDATA : int
+    @param LATCHDATA : byte to be sent to latch
+
+    @return: bool
+    """
+    try:
+      results = self.feedback(self._write_commands(LATCHDATA))
+    except u3.LabJackException as details:
+      self.logger.error("write: LabJack could not write latch %d\n%s",
+                        self.address, str(details))
+      return False
+    latchAddr = results[-1]['EIO']
+    if latchAddr != self.address:
+      self.logger.error("write: Requested latch %d but got %d",
+                        self.address, latchAddr)
+      return False
+    return True
+
+  def _write_commands(self, LATCHDATA, verify=True):
+    """
+    Feedback commands which shift a byte into the latch, MSB first
+
+    The address and the serial signals are set with one port write, with SDI
+    already holding the MSB and CS-BUS already low.  The U3 writes EIO before
+    CIO, so the address is on the lines when CS-BUS drops.  SDI is then
+    written only when the next bit differs from the previous one.
+
+    @param verify : end with a port read which returns the latch address
+    @type  verify : bool
+    """
+    SDI = getbit(LATCHDATA, 7)
+    commands = self._select_commands(self.address, SDI=SDI, CS=0)
+    commands += self.timing.wait_after({"CS-BUS": 0})
+    for bit in range(7,-1,-1):
+      bitvalue = getbit(LATCHDATA, bit)
+      if bitvalue != SDI:
+        commands += self._signal_commands("SDI", bitvalue)
+        SDI = bitvalue
+      commands += self._signal_commands("SCK", 0)
+      commands += self._signal_commands("SCK", 1)
+    commands += self._signal_commands("CS-BUS", 1)
+    if verify:
+      commands.append(u3.PortStateRead())
+    return commands
+
+  def _read_batched(self):
+    """
+    Reads the latch with one list of feedback commands
+
+    The list selects the read address, strobes NLOAD, enables CS-BUS and
+    then interleaves the SDO reads with the SCK toggles.  SDO is sampled with
+    PortStateRead rather than BitStateRead because the shorter command lets
+    the whole sequence fit in one packet, and because each port read also
+    returns EIO, confirming the latch address.
+
+    @return: byte or None
+    """
+    try:
+      results = self.feedback(self._read_commands())
+    except u3.LabJackException as details:
+      self.logger.error("  read: LabJack could not read latch %d\n%s",
+                        self.address, str(details))
+      return None
+    port_states = [result for result in results if isinstance(result, dict)]
+    MBDATA = 0
+    for bit in range(7,-1,-1):
+      states = port_states[7-bit]
+      if states['EIO'] != (self.address | 4):
+        self.logger.debug("  read: Requested latch %d but got %d",
+                          self.address, states['EIO'])
+        return None
+      if getbit(states['FIO'], WBDCsignal["SDO"]):
+        MBDATA = Math.Bin.setbit(MBDATA, bit)
+    return MBDATA
+
+  def _read_commands(self):
+    """
+    Feedback commands which load the latch and shift it out, MSB first
+    """
+    commands = self._select_commands(self.address | 4)
+    # Store the information to be read from this address
+    commands += self._signal_commands("NLOAD", 0)
+    commands += self._signal_commands("NLOAD", 1)
+    # Enable serial data transfer
+    commands += self._signal_commands("CS-BUS", 0)
+    for bit in range(7,-1,-1):
+      commands.append(u3.PortStateRead())
+      if bit > 0:
+        commands += self._signal_commands("SCK", 0)
+        commands += self._signal_commands("SCK", 1)
+    commands += self._signal_commands("CS-BUS", 1)
+    return commands
+
+  def _signal_commands(self, signal, state):
+    """
+    Feedback commands which set a signal and let it settle
+    """
+    return [u3.BitStateWrite(WBDCsignal[signal], state)] + \
+           self.timing.wait_after({signal: state})
+
+  def _select_commands(self, address, SDI=1, CS=1):
+    """
+    Feedback command which selects a latch and idles the serial signals
+
+    A single PortStateWrite puts the address on EIO0-EIO7 and sets SCK and
+    NLOAD high on CIO0-CIO3, with CS-BUS high unless a write is to start with
+    it low.  The address is always written; leaving it
+    out when it is already selected would save a few bytes of a packet which
+    is sent anyway.
+
+    @param address : latch address
+    @type  address : int
+
+    @param SDI : initial state of the serial data line
+    @type  SDI : int
+
+    @param CS : initial state of CS-BUS; 0 starts a serial transfer
+    @type  CS : int
+    """
+    initial = {"SCK": 1, "SDI": SDI, "NLOAD": 1, "CS-BUS": CS}
+    CIOmask = 0
+    CIOstate = 0
+    for signal in ["SCK", "SDI", "NLOAD", "CS-BUS"]:
+      CIObit = WBDCsignal[signal] - 16
+      CIOmask |= 1 << CIObit
+      if initial[signal]:
+        CIOstate |= 1 << CIObit
+    return [u3.PortStateWrite(State = [0, address, CIOstate],
+                              WriteMask = [0, 0xff, CIOmask])]
+
+  def feedback(self, commands):
+    """
+    Sends feedback commands in as few USB transactions as possible
+
+    @param commands : feedback commands
+    @type  commands : list of u3.FeedbackCommand instances
+
+    @return: list of command results, in the order of the commands
+    """
+    return self.bus.feedback(commands)
+
   def set_signals(self, signal_dict):
     """
     Sets signals for programming and reading data.
@@ -359,8 +919,9 @@ class LatchGroup():
     In [3]: set_signals(lj[1],{})
     Out[3]: [{'CIO': 15, 'EIO': 86, 'FIO': 240}]
 
-    To give the signals time to settle, a 10 ms wait is included.  Until
-    Python 2.6, time.sleep() must be used.
+    To give the signals time to settle, the LabJack waits for the longest
+    settling time of the signals being set (see LatchTiming) before the
+    ports are read.
 
     @type signal_dict : dictionary
     @param signal_dict : signal names and states
@@ -370,13 +931,100 @@ class LatchGroup():
     commands = []
     for signal,state in list(signal_dict.items()):
       commands.append(u3.BitStateWrite(WBDCsignal[signal], state))
+    commands += self.timing.wait_after(signal_dict)
     commands.append(u3.PortStateRead())
     #self.logger.debug("  set_signals: sending %s", commands)
     try:
-      result = self.LJ.getFeedback(commands)
+      result = self.feedback(commands)
       #self.logger.debug("  set_signals: command feedback: %s", result)
-      #if float(python_version()[:3]) < 2.6:
-      time.sleep(0.01)
     except Exception as details:
       self.logger.error("  set_signals: LJ commands failed:\n%s", details)
     return result[-1]
+
+
+class SPILatchGroup(LatchGroup):
+  """
+  Latch group whose data are clocked by the U3 SPI engine
+
+  The motherboard latches are a plain serial shift register, so the U3 SPI
+  function (hardware version 1.21 or later) can shift a whole byte out on SDI
+  and in from SDO in one USB transaction, using CS-BUS as the automatic chip
+  select and SCK as the clock.  The latch must still be selected, and for
+  reading loaded with NLOAD, with feedback commands, so an operation takes
+  two USB transactions.
+
+  The clock idles high.  The shift register takes SDI on the rising edge of
+  SCK, so writes use SPI mode D, which changes SDI on the falling edge.  The
+  register also presents its next bit on the rising edge, so reads use mode
+  C, which samples SDO on the falling edge.
+
+  If an SPI transfer fails, the bit-banged LatchGroup method is used.
+  """
+  SPIpins = {"CSPinNum":   WBDCsignal["CS-BUS"],
+             "CLKPinNum":  WBDCsignal["SCK"],
+             "MISOPinNum": WBDCsignal["SDO"],
+             "MOSIPinNum": WBDCsignal["SDI"]}
+
+  def _write(self, LATCHDATA):
+    """
+    Writes a byte to the latch with the SPI engine
+
+    @type LATCHDATA : int
+    @param LATCHDATA : byte to be sent to latch
+
+    @return: bool
+    """
+    try:
+      results = self.feedback(self._select_commands(self.address) +
+                              [u3.PortStateRead()])
+      latchAddr = results[-1]['EIO']
+      if latchAddr != self.address:
+        self.logger.error("write: Requested latch %d but got %d",
+                          self.address, latchAddr)
+        return False
+      self._spi(LATCHDATA, 'D')
+      return True
+    except u3.LabJackException as details:
+      self.logger.warning("write: SPI write to latch %d failed; bit-banging\n%s",
+                          self.address, str(details))
+      return LatchGroup._write(self, LATCHDATA)
+
+  def _read(self):
+    """
+    Reads the latch with the SPI engine
+
+    @return: byte or None
+    """
+    commands = self._select_commands(self.address | 4)
+    # Store the information to be read from this address
+    commands += self._signal_commands("NLOAD", 0)
+    commands += self._signal_commands("NLOAD", 1)
+    commands.append(u3.PortStateRead())
+    try:
+      results = self.feedback(commands)
+      latchAddr = results[-1]['EIO']
+      if latchAddr != (self.address | 4):
+        self.logger.debug("  read: Requested latch %d but got %d",
+                          self.address, latchAddr)
+        return None
+      return self._spi(0, 'C')
+    except u3.LabJackException as details:
+      self.logger.warning("  read: SPI read of latch %d failed; bit-banging\n%s",
+                          self.address, str(details))
+      return LatchGroup._read(self)
+
+  def _spi(self, byte, mode):
+    """
+    Clocks one byte out and one byte in
+
+    @param byte : byte to be sent
+    @type  byte : int
+
+    @param mode : SPI mode
+    @type  mode : str
+
+    @return: byte received
+    """
+    response = self.LJ.spi([byte], AutoCS=True, DisableDirConfig=True,
+                           SPIMode=mode, **SPILatchGroup.SPIpins)
+    return response['SPIBytes'][0]
@@ -0,0 +1,148 @@
+"""
+Simulated WBDC motherboard behind a U3, for tests without hardware
+
+FakeLabJack executes the feedback commands which the latch groups send, as
+far as the motherboard serial interface needs::
+  BitStateWrite, BitStateRead, PortStateWrite, PortStateRead - the I/O lines
+  WaitShort, WaitLong                                        - added up
+  AIN                                                        - a fixed value
+The serial signals drive a shift register.  While CS-BUS is low, each rising
+edge of SCK shifts SDI in at the LSB end; SDO (FIO7) is its MSB.  Raising CS-BUS
+with a write address on EIO copies the register to that latch, and NLOAD going
+low with a read address loads the register from the latch.
+
+The packet size limits of a real U3 are enforced, so a test fails if a
+command list would be refused by the hardware.
+"""
+import logging
+
+from MonitorControl.Receivers.WBDC.latchgroup import WBDCsignal, \
+                  MAX_FEEDBACK_CMD_BYTES, MAX_FEEDBACK_RESP_BYTES, \
+                  WAIT_SHORT_UNIT, WAIT_LONG_UNIT
+
+ports = ('FIO', 'EIO', 'CIO')
+
+class FakeLabJack(object):
+  """
+  U3 with a simulated latch bus
+
+  Public attributes::
+    latch        - bytes of the latches keyed by write address
+    packets      - command lists sent, one per USB transaction
+    waited       - total time in seconds of the wait commands executed
+  """
+  def __init__(self):
+    self.FIO = 0
+    self.EIO = 0
+    self.CIO = 0x0f
+    self.register = 0
+    self.latch = {}
+    self.packets = []
+    self.waited = 0.0
+    self.localID = 1
+
+  def bit(self, IO):
+    """
+    Returns the state of a digital I/O line
+    """
+    port, bit = divmod(IO, 8)
+    return (getattr(self, ports[port]) >> bit) & 1
+
+  def _signals(self):
+    return dict([(name, self.bit(WBDCsignal[name]))
+                 for name in ("SCK", "SDI", "NLOAD", "CS-BUS")])
+
+  def _clock(self, before):
+    """
+    Acts on the edges of the serial signals
+    """
+    after = self._signals()
+    address = self.EIO
+    if not after["CS-BUS"] and after["SCK"] and not before["SCK"]:
+      self.register = ((self.register << 1) | after["SDI"]) & 0xff
+    if not after["NLOAD"] and before["NLOAD"] and address & 4:
+      self.register = self.latch.get(address & ~4, 0)
+    if after["CS-BUS"] and not before["CS-BUS"] and not address & 4:
+      self.latch[address] = self.register
+    # SDO is the MSB of the shift register
+    self.FIO = (self.FIO & 0x7f) | ((self.register >> 7) << 7)
+
+  def _write_bit(self, IO, state):
+    before = self._signals()
+    port, bit = divmod(IO, 8)
+    value = getattr(self, ports[port])
+    if state:
+      value |= 1 << bit
+    else:
+      value &= ~(1 << bit)
+    setattr(self, ports[port], value)
+    self._clock(before)
+
+  def getFeedback(self, *commands):
+    """
+    Executes a list of feedback commands as one transaction
+    """
+    if len(commands) == 1 and type(commands[0]) == list:
+      commands = commands[0]
+    commands = list(commands)
+    cmd_bytes = sum([len(command.cmdBytes) for command in commands])
+    resp_bytes = sum([command.readLen for command in commands])
+    if cmd_bytes > MAX_FEEDBACK_CMD_BYTES or resp_bytes > MAX_FEEDBACK_RESP_BYTES:
+      raise ValueError("packet of %d command and %d response bytes" %
+                       (cmd_bytes, resp_bytes))
+    self.packets.append(commands)
+    results = []
+    for command in commands:
+      code = command.cmdBytes[0]
+      if code == 11:   # BitStateWrite
+        self._write_bit(command.cmdBytes[1] & 0x7f, command.cmdBytes[1] >> 7)
+        results.append(None)
+      elif code == 10: # BitStateRead
+        results.append(self.bit(command.cmdBytes[1]))
+      elif code == 27: # PortStateWrite
+        before = self._signals()
+        for i, port in enumerate(ports):
+          mask = command.cmdBytes[1+i]
+          setattr(self, port, (getattr(self, port) & ~mask) |
+                              (command.cmdBytes[4+i] & mask))
+        self._clock(before)
+        results.append(None)
+      elif code == 26: # PortStateRead
+        results.append({'FIO': self.FIO, 'EIO': self.EIO, 'CIO': self.CIO})
+      elif code == 5:  # WaitShort
+        self.waited += command.cmdBytes[1]*WAIT_SHORT_UNIT
+        results.append(None)
+      elif code == 6:  # WaitLong
+        self.waited += command.cmdBytes[1]*WAIT_LONG_UNIT
+        results.append(None)
+      elif code == 1:  # AIN
+        results.append(self.AIN_value(command.cmdBytes[1] & 31))
+      else:
+        raise ValueError("feedback command %s is not simulated" % command)
+    return results
+
+  def AIN_value(self, channel):
+    """
+    Binary reading of an analog input: the channel and the monitor latch
+    which selects its multiplexer
+    """
+    return 1000*(channel + 1) + self.latch.get(channel//2, 0)
+
+  def binaryToCalibratedAnalogVoltage(self, bits, isLowVoltage=True,
+                                      isSingleEnded=True,
+                                      isSpecialSetting=False,
+                                      channelNumber=0):
+    return bits/1000.
+
+  def configIO(self, **kwargs):
+    return kwargs
+
+class FakeParent(object):
+  """
+  Minimal owner of latch groups
+  """
+  latchBaseAddr = 8
+
+  def __init__(self, labjack):
+    self.logger = logging.getLogger("FakeParent")
+    self.LJ = {1: labjack}
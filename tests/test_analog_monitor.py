@@ -0,0 +1,139 @@
+import logging
+import unittest
+
+import u3
+
+from MonitorControl.Receivers.WBDC.latchgroup import LatchGroup, \
+                  MAX_FEEDBACK_CMD_BYTES, MAX_FEEDBACK_RESP_BYTES
+from MonitorControl.Receivers.WBDC.WBDC2.hwowner import HardwareOwner
+from MonitorControl.Receivers.WBDC.WBDC2.WBDC2hwif import WBDC2hwif
+from MonitorControl.Receivers.WBDC.tests.fake_labjack import FakeLabJack, \
+                                                           FakeParent
+
+class BadAddressLabJack(FakeLabJack):
+  """
+  Returns a wrong latch address in the port reads of some transactions
+  """
+  def __init__(self, bad_packets):
+    FakeLabJack.__init__(self)
+    self.bad_packets = bad_packets
+
+  def getFeedback(self, *commands):
+    results = FakeLabJack.getFeedback(self, *commands)
+    if len(self.packets) - 1 in self.bad_packets:
+      results = [dict(result, EIO=0xff) if isinstance(result, dict)
+                 else result for result in results]
+    return results
+
+class CountingOwner(HardwareOwner):
+  """
+  Records the number of packets sent before each preempt() call
+  """
+  def __init__(self, labjack):
+    HardwareOwner.__init__(self, "test")
+    self.labjack = labjack
+    self.preempted = []
+
+  def preempt(self):
+    self.preempted.append(len(self.labjack.packets))
+    HardwareOwner.preempt(self)
+
+class MonitorParent(FakeParent):
+  """
+  Owner of the analog monitor latch groups
+  """
+  def __init__(self, labjack):
+    FakeParent.__init__(self, labjack)
+    self.lg = {'A1': LatchGroup(parent=self, labjack=labjack, DM=0, LG=1),
+               'A2': LatchGroup(parent=self, labjack=labjack, DM=0, LG=2)}
+    self.owner = {1: CountingOwner(labjack)}
+
+class TestAnalogMonitor(unittest.TestCase):
+
+  def monitor(self, labjack):
+    self.LJ = labjack
+    self.parent = MonitorParent(labjack)
+    monitor = WBDC2hwif.AnalogMonitor(self.parent, WBDC2hwif.mon_points)
+    del labjack.packets[:]
+    return monitor
+
+  def expected(self, monitor, latchgroup, point, dataset):
+    """
+    Volts which FakeLabJack returns for a reading
+    """
+    address = monitor.mon_points[latchgroup][point][0]
+    return (1000*((latchgroup-1)*2 + dataset + 1) + address)/1000.
+
+  def test_plan_packets(self):
+    monitor = self.monitor(FakeLabJack())
+    for latchgroup, count in [(1, 24), (2, 4)]:
+      plan = monitor.acquisition_plan(monitor.all_points(latchgroup))
+      self.assertEqual(len(plan), count)
+      for commands, readings, address, interruptible in plan:
+        self.assertLessEqual(sum([len(command.cmdBytes)
+                                  for command in commands]),
+                             MAX_FEEDBACK_CMD_BYTES)
+        self.assertLessEqual(sum([command.readLen for command in commands]),
+                             MAX_FEEDBACK_RESP_BYTES)
+        # one address check per packet, at the end
+        self.assertEqual([isinstance(command, u3.PortStateRead)
+                          for command in commands].count(True), 1)
+        self.assertIsInstance(commands[-1], u3.PortStateRead)
+        self.assertEqual(address,
+                         self.parent.lg['A'+str(latchgroup)].address)
+      self.assertTrue(plan[-1][3])
+    self.assertIs(monitor.acquisition_plan(monitor.all_points(2)), plan)
+
+  def test_scan(self):
+    monitor = self.monitor(FakeLabJack())
+    data = monitor.scan(monitor.all_points(2))
+    self.assertEqual(len(self.LJ.packets), 4)
+    for point in [1, 2, 3]:
+      for dataset in [0, 1]:
+        label = monitor.mon_points[2][point][dataset+1].strip()
+        self.assertAlmostEqual(data[label][1],
+                               self.expected(monitor, 2, point, dataset))
+    self.assertEqual(self.parent.lg['A2'].shadow, monitor.mon_points[2][4][0])
+
+  def test_preempted_between_points(self):
+    monitor = self.monitor(FakeLabJack())
+    plan = monitor.acquisition_plan(monitor.all_points(1))
+    monitor.scan(monitor.all_points(1))
+    # only after the packets which end with a whole point
+    self.assertEqual(self.parent.owner[1].preempted,
+                     [i + 1 for i, packet in enumerate(plan) if packet[3]])
+    self.assertLess(len(self.parent.owner[1].preempted), len(plan))
+
+  def test_bad_address_drops_readings(self):
+    monitor = self.monitor(BadAddressLabJack([1]))
+    data = monitor.scan(monitor.all_points(2))
+    # the second packet reads point 2
+    self.assertNotIn("R2 E-plane", data)
+    self.assertNotIn("R2 RF plate", data)
+    for label in ["R1 E-plane", "R1 RF plate", "R1 H-plane", "BE plate",
+                  "R2 H-plane"]:
+      self.assertIn(label, data)
+    self.assertEqual(self.parent.lg['A2'].shadow, None)
+
+  def test_bad_address_in_split_point(self):
+    monitor = self.monitor(FakeLabJack())
+    points = monitor.all_points(1)
+    plan = monitor.acquisition_plan(points)
+    split = [i for i, packet in enumerate(plan) if not packet[3]][0]
+    # the point is written in one packet and read in both; a label read at
+    # other points too would come from them
+    labels = [reading[0] for commands, readings, address, interruptible in plan
+                         for reading in readings]
+    dropped = [reading[0] for reading in plan[split][1] + plan[split+1][1]
+               if labels.count(reading[0]) == 1]
+    self.assertTrue(dropped)
+    monitor = self.monitor(BadAddressLabJack([split]))
+    data = monitor.scan(points)
+    for label in dropped:
+      self.assertNotIn(label, data)
+    self.assertIn("-16 V R2 BE", data)
+    self.assertEqual(self.parent.lg['A1'].shadow, None)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()
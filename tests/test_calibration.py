@@ -0,0 +1,189 @@
+import logging
+import os
+import os.path
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy
+from scipy.interpolate import interp1d
+
+from MonitorControl.Receivers.WBDC.WBDC2.calibration import LookupTable, \
+                  compile_splines, max_curvature, store_records, \
+                  add_generation, CalibrationStore, load_calibration
+
+def make_splines(channels=("R1-18-E", "R1-18-H"), knots=25):
+  """
+  Returns a synthetic calibration in the layout of a splines pickle
+  """
+  att_spline, V_sample_range, ctlV_spline, att_sample_range = {}, {}, {}, {}
+  for i, channel in enumerate(channels):
+    volts = numpy.linspace(-10, 0.5, knots)
+    gain = -(17.5 + i)*(1 - 1/(1 + numpy.exp(-(volts + 5 + i))))
+    att_spline[channel] = interp1d(volts, gain, kind='cubic')
+    ctlV_spline[channel] = interp1d(gain, volts, kind='cubic')
+    V_sample_range[channel] = (-10, 0.5, 0.1)
+    att_sample_range[channel] = (gain.min(), gain.max(), 0.1)
+  return (att_spline, V_sample_range), (ctlV_spline, att_sample_range)
+
+class TestLookupTable(unittest.TestCase):
+
+  def setUp(self):
+    self.splines = make_splines()
+    (self.att_spline, self.V_range), (self.ctlV_spline, self.gain_range) = \
+                                                                  self.splines
+
+  def check_table(self, table, functions, ranges):
+    for i, name in enumerate(table.names):
+      low, high = min(ranges[name][:2]), max(ranges[name][:2])
+      x = numpy.linspace(low, high, 20001)
+      error = numpy.abs(table.lookup(name, x) - functions[name](x)).max()
+      self.assertLessEqual(error, table.max_error[i])
+      # the bound is the h**2/8 max|f''| interpolation error plus rounding
+      h = (high - low)/(table.size - 1)
+      rounding = numpy.abs(table.values[i]).max()*numpy.finfo(numpy.float32).eps
+      self.assertAlmostEqual(table.max_error[i],
+                             h**2/8*max_curvature(functions[name]) + rounding)
+
+  def test_gain_table_within_bound(self):
+    table = LookupTable(self.att_spline, self.V_range, 0.01)
+    self.assertLessEqual(table.max_error.max(), 0.01)
+    self.check_table(table, self.att_spline, self.V_range)
+
+  def test_ctlV_table_within_bound(self):
+    table = LookupTable(self.ctlV_spline, self.gain_range, 0.001)
+    self.assertLessEqual(table.max_error.max(), 0.001)
+    self.check_table(table, self.ctlV_spline, self.gain_range)
+
+  def test_lookup_one_value(self):
+    table = LookupTable(self.att_spline, self.V_range, 0.01)
+    for name in table.names:
+      for x in [-10, -7.3, -0.01, 0.5]:
+        self.assertIsInstance(table.lookup(name, x), float)
+        self.assertAlmostEqual(table.lookup(name, x),
+                               float(self.att_spline[name](x)), delta=0.01)
+
+  def test_edges(self):
+    table = LookupTable(self.att_spline, self.V_range, 0.01)
+    for i, name in enumerate(table.names):
+      for x in [table.start[i], table.stop[i]]:
+        # the end points are table entries
+        self.assertAlmostEqual(table.lookup(name, x),
+                               float(self.att_spline[name](x)), places=5)
+      self.assertRaises(ValueError, table.lookup, name, table.start[i] - 1e-6)
+      self.assertRaises(ValueError, table.lookup, name, table.stop[i] + 1e-6)
+
+  def test_lookup_many(self):
+    table = LookupTable(self.ctlV_spline, self.gain_range, 0.001)
+    names = table.names*3
+    x = [self.gain_range[name][0] + (j + 1)*0.7 for j, name in enumerate(names)]
+    expected = [float(self.ctlV_spline[name](value))
+                for name, value in zip(names, x)]
+    values = table.lookup_many(names, x)
+    self.assertTrue(numpy.allclose(values, expected, atol=0.001))
+    indices = [table.index[name] for name in names]
+    self.assertTrue(numpy.array_equal(table.lookup_many(indices, x), values))
+    self.assertRaises(ValueError, table.lookup_many, names[:1], [1.0])
+
+  def test_max_size(self):
+    with self.assertLogs(level=logging.WARNING):
+      table = LookupTable(self.att_spline, self.V_range, 1e-9, max_size=64)
+    self.assertEqual(table.size, 64)
+    self.assertGreater(table.max_error.max(), 1e-9)
+    self.check_table(table, self.att_spline, self.V_range)
+
+  def test_compile_splines(self):
+    gain_table, ctlV_table = compile_splines(self.splines)
+    self.assertEqual(gain_table.names, sorted(self.att_spline.keys()))
+    self.assertLessEqual(gain_table.max_error.max(), 0.01)
+    self.assertLessEqual(ctlV_table.max_error.max(), 0.001)
+
+class TestCalibrationStore(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, "calibration.npy")
+    self.lab = make_splines()
+    self.field = make_splines(channels=("R1-18-E",), knots=31)
+    self.serials = {"R1-18-E": "6A", "R1-18-H": "6B"}
+    self.assertEqual(add_generation(self.filename,
+                       store_records(self.lab, serials=self.serials,
+                                     version="lab", date="2013-08-01")), 0)
+    self.assertEqual(add_generation(self.filename,
+                       store_records(self.field, serials={"R1-18-E": "7A"},
+                                     version="field", date="2014-02-01")), 1)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_generations(self):
+    store = CalibrationStore(self.filename)
+    self.assertIsInstance(store.records, numpy.memmap)
+    self.assertEqual(store.generations(), [0, 1])
+
+  def test_select(self):
+    store = CalibrationStore(self.filename)
+    latest = store.select()
+    self.assertEqual(sorted(latest.keys()), ["R1-18-E", "R1-18-H"])
+    self.assertEqual(latest["R1-18-E"]["generation"], 1)
+    self.assertEqual(str(latest["R1-18-E"]["version"]), "field")
+    # a channel missing from the latest generation comes from an earlier one
+    self.assertEqual(latest["R1-18-H"]["generation"], 0)
+    first = store.select(0)
+    self.assertEqual(first["R1-18-E"]["generation"], 0)
+    self.assertEqual(str(first["R1-18-E"]["date"]), "2013-08-01")
+
+  def test_serials(self):
+    store = CalibrationStore(self.filename)
+    self.assertEqual(store.serials(), {"R1-18-E": "7A", "R1-18-H": "6B"})
+    self.assertEqual(store.serials(0), self.serials)
+
+  def test_calibration(self):
+    calibration = CalibrationStore(self.filename).calibration()
+    self.assertEqual(calibration.source, [self.filename])
+    for splines, channel in [(self.field, "R1-18-E"), (self.lab, "R1-18-H")]:
+      gain_table, ctlV_table = compile_splines(splines)
+      for stored, compiled in [(calibration.gain_table, gain_table),
+                               (calibration.ctlV_table, ctlV_table)]:
+        i = compiled.index[channel]
+        x = numpy.linspace(compiled.start[i], compiled.stop[i], 1001)
+        self.assertTrue(numpy.array_equal(stored.lookup(channel, x),
+                                          compiled.lookup(channel, x)))
+        self.assertEqual(stored.max_error[stored.index[channel]],
+                         compiled.max_error[i])
+      gain = splines[1][1][channel]
+      self.assertEqual(calibration.gain_range(channel), (gain[0], gain[1]))
+      self.assertAlmostEqual(calibration.ctlV_function(channel)(gain[0]),
+                             float(splines[1][0][channel](gain[0])), places=3)
+
+  def test_splines(self):
+    (att_spline, V_range), (ctlV_spline, gain_range) = \
+                                     CalibrationStore(self.filename).splines()
+    for splines, channel in [(self.field, "R1-18-E"), (self.lab, "R1-18-H")]:
+      source = splines[0][0][channel]
+      self.assertTrue(numpy.array_equal(att_spline[channel].x, source.x))
+      self.assertTrue(numpy.array_equal(att_spline[channel].y, source.y))
+      self.assertEqual(V_range[channel], splines[0][1][channel])
+      self.assertEqual(gain_range[channel], splines[1][1][channel])
+
+  def test_load_calibration(self):
+    calibration = load_calibration(self.filename)
+    self.assertEqual(calibration.source, [self.filename])
+    self.assertEqual(calibration.ctlV_table.names, ["R1-18-E", "R1-18-H"])
+
+  def test_load_calibration_without_store(self):
+    pickle_file = os.path.join(self.directory, "splines.pkl")
+    with open(pickle_file, "wb") as f:
+      pickle.dump(self.lab, f)
+    missing = os.path.join(self.directory, "missing.npy")
+    calibration = load_calibration(missing, [pickle_file])
+    self.assertEqual(calibration.source, [pickle_file])
+    gain_table, ctlV_table = compile_splines(self.lab)
+    self.assertTrue(numpy.array_equal(calibration.ctlV_table.values,
+                                      ctlV_table.values))
+    self.assertRaises(IOError, load_calibration, missing, [missing])
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()
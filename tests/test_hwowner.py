@@ -0,0 +1,134 @@
+import logging
+import threading
+import unittest
+
+from MonitorControl.Receivers.WBDC.WBDC2.hwowner import HardwareOwner, \
+                                                        CONTROL, MONITOR
+
+class FakeJob(object):
+  """
+  Operation which records when it ran, and in which thread
+  """
+  def __init__(self, log, name):
+    self.log = log
+    self.name = name
+    self.thread = None
+    self.__name__ = name
+
+  def __call__(self, result=None):
+    self.thread = threading.current_thread()
+    self.log.append(self.name)
+    return result
+
+class TestHardwareOwner(unittest.TestCase):
+
+  def setUp(self):
+    self.owner = HardwareOwner("test-LJ1")
+    self.log = []
+
+  def tearDown(self):
+    self.owner.stop()
+
+  def blocked(self):
+    """
+    Starts the owner with an operation which runs until the returned event
+    is set
+    """
+    running = threading.Event()
+    release = threading.Event()
+    def gate():
+      running.set()
+      release.wait(5)
+      self.log.append("gate")
+    self.owner.start()
+    job = self.owner.submit(MONITOR, gate)
+    self.assertTrue(running.wait(5))
+    return job, release
+
+  def test_runs_inline_without_thread(self):
+    job = FakeJob(self.log, "control")
+    self.assertEqual(self.owner.call(CONTROL, job, 3), 3)
+    self.assertIs(job.thread, threading.current_thread())
+
+  def test_runs_in_owner_thread(self):
+    self.owner.start()
+    job = FakeJob(self.log, "control")
+    self.assertEqual(self.owner.call(CONTROL, job, 3), 3)
+    self.assertIs(job.thread, self.owner.thread)
+
+  def test_control_before_monitor(self):
+    gate, release = self.blocked()
+    jobs = [self.owner.submit(priority, FakeJob(self.log, name))
+            for priority, name in [(MONITOR, "monitor 1"),
+                                   (CONTROL, "control 1"),
+                                   (MONITOR, "monitor 2"),
+                                   (CONTROL, "control 2")]]
+    release.set()
+    for job in [gate] + jobs:
+      job.wait(5)
+    self.assertEqual(self.log, ["gate", "control 1", "control 2",
+                                "monitor 1", "monitor 2"])
+
+  def test_call_from_owner_thread_runs_inline(self):
+    self.owner.start()
+    inner = FakeJob(self.log, "inner")
+    def outer():
+      self.log.append("outer start")
+      # queuing this would deadlock, since the owner is busy with outer()
+      self.owner.call(CONTROL, inner)
+      self.log.append("outer end")
+    self.owner.call(MONITOR, outer)
+    self.assertEqual(self.log, ["outer start", "inner", "outer end"])
+    self.assertIs(inner.thread, self.owner.thread)
+
+  def test_preemption_between_scan_points(self):
+    started = threading.Event()
+    queued = threading.Event()
+    def scan():
+      for point in range(3):
+        self.log.append("point %d" % point)
+        if point == 0:
+          started.set()
+          queued.wait(5)
+        # no point is half done here
+        self.owner.preempt()
+    self.owner.start()
+    job = self.owner.submit(MONITOR, scan)
+    self.assertTrue(started.wait(5))
+    monitor = self.owner.submit(MONITOR, FakeJob(self.log, "monitor"))
+    control = self.owner.submit(CONTROL, FakeJob(self.log, "control"))
+    queued.set()
+    for waiting in [job, monitor, control]:
+      waiting.wait(5)
+    # a waiting scan does not interrupt the running one
+    self.assertEqual(self.log, ["point 0", "control", "point 1", "point 2",
+                                "monitor"])
+
+  def test_preempt_outside_owner_does_nothing(self):
+    gate, release = self.blocked()
+    control = self.owner.submit(CONTROL, FakeJob(self.log, "control"))
+    self.owner.preempt()
+    self.assertEqual(self.log, [])
+    release.set()
+    control.wait(5)
+    self.assertEqual(self.log, ["gate", "control"])
+
+  def test_exception_reaches_caller(self):
+    self.owner.start()
+    def fail():
+      raise ValueError("no LabJack")
+    self.assertRaises(ValueError, self.owner.call, CONTROL, fail)
+    # the owner goes on
+    self.assertEqual(self.owner.call(CONTROL, FakeJob(self.log, "next"), 1), 1)
+
+  def test_stop_runs_submitted_operations(self):
+    gate, release = self.blocked()
+    job = self.owner.submit(MONITOR, FakeJob(self.log, "monitor"))
+    release.set()
+    self.owner.stop()
+    self.assertTrue(job.done.is_set())
+    self.assertEqual(self.log, ["gate", "monitor"])
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()
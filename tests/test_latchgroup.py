@@ -0,0 +1,174 @@
+import logging
+import unittest
+
+import u3
+
+from MonitorControl.Receivers.WBDC.latchgroup import LatchGroup, \
+                  split_feedback, pack_feedback, wait_commands, \
+                  MAX_FEEDBACK_CMD_BYTES, MAX_FEEDBACK_RESP_BYTES, \
+                  WAIT_SHORT_UNIT, WAIT_LONG_UNIT
+from MonitorControl.Receivers.WBDC.tests.fake_labjack import FakeLabJack, \
+                                                           FakeParent
+
+def packet_bytes(packet):
+  return (sum([len(command.cmdBytes) for command in packet]),
+          sum([command.readLen for command in packet]))
+
+class TestSplitFeedback(unittest.TestCase):
+
+  def test_command_bytes(self):
+    commands = [u3.BitStateWrite(16, i % 2) for i in range(100)]
+    packets = split_feedback(commands)
+    self.assertEqual(sum(packets, []), commands)
+    for packet in packets:
+      self.assertLessEqual(packet_bytes(packet)[0], MAX_FEEDBACK_CMD_BYTES)
+    # 2 bytes per command
+    self.assertEqual(len(packets), 4)
+
+  def test_response_bytes(self):
+    commands = [u3.PortStateRead() for i in range(40)]
+    packets = split_feedback(commands)
+    self.assertEqual(sum(packets, []), commands)
+    for packet in packets:
+      self.assertLessEqual(packet_bytes(packet)[1], MAX_FEEDBACK_RESP_BYTES)
+    # 3 response bytes per command
+    self.assertEqual([len(packet) for packet in packets], [18, 18, 4])
+
+  def test_empty(self):
+    self.assertEqual(split_feedback([]), [])
+
+  def test_pack_keeps_groups_whole(self):
+    groups = [[u3.BitStateWrite(16, 0)]*10 for i in range(5)]
+    packets = pack_feedback(groups)
+    # two groups of 20 bytes fit in a packet, three do not
+    self.assertEqual([len(packet) for packet in packets], [20, 20, 10])
+
+  def test_pack_splits_long_group(self):
+    groups = [[u3.BitStateWrite(16, 0)]*5, [u3.BitStateWrite(16, 0)]*40]
+    packets = pack_feedback(groups)
+    self.assertEqual(sum(packets, []), sum(groups, []))
+    self.assertEqual(len(packets[0]), 5)
+    for packet in packets:
+      self.assertLessEqual(packet_bytes(packet)[0], MAX_FEEDBACK_CMD_BYTES)
+
+class TestWaitCommands(unittest.TestCase):
+
+  def waited(self, commands):
+    total = 0.0
+    for command in commands:
+      if isinstance(command, u3.WaitLong):
+        self.assertEqual(command.cmdBytes[0], 6)
+        total += command.cmdBytes[1]*WAIT_LONG_UNIT
+      else:
+        self.assertIsInstance(command, u3.WaitShort)
+        self.assertEqual(command.cmdBytes[0], 5)
+        total += command.cmdBytes[1]*WAIT_SHORT_UNIT
+    return total
+
+  def test_no_wait(self):
+    self.assertEqual(wait_commands(0), [])
+    self.assertEqual(wait_commands(-1), [])
+
+  def test_short(self):
+    commands = wait_commands(0.010)
+    self.assertEqual(len(commands), 1)
+    # 0.010 s is 78.1 units, rounded up
+    self.assertEqual(commands[0].cmdBytes, [5, 79])
+
+  def test_long_and_short(self):
+    commands = wait_commands(0.050)
+    self.assertEqual([command.cmdBytes for command in commands],
+                     [[6, 3], [5, 7]])
+    self.assertGreaterEqual(self.waited(commands), 0.050)
+    self.assertLess(self.waited(commands), 0.050 + WAIT_SHORT_UNIT)
+
+  def test_whole_long_units(self):
+    commands = wait_commands(2*WAIT_LONG_UNIT)
+    self.assertEqual([command.cmdBytes for command in commands], [[6, 2]])
+
+  def test_more_than_255_units(self):
+    seconds = 300*WAIT_LONG_UNIT + 0.001
+    commands = wait_commands(seconds)
+    self.assertEqual([command.cmdBytes[1] for command in commands
+                      if isinstance(command, u3.WaitLong)], [255, 45])
+    self.assertGreaterEqual(self.waited(commands), seconds)
+
+class TestLatchGroup(unittest.TestCase):
+
+  def setUp(self):
+    self.LJ = FakeLabJack()
+    self.parent = FakeParent(self.LJ)
+
+  def latch_group(self, **kwargs):
+    return LatchGroup(parent=self.parent, labjack=self.LJ, LG=2, **kwargs)
+
+  def test_write_commands_shift_msb_first(self):
+    LG = self.latch_group()
+    for data in [0x55, 0xAA, 0x00, 0xFF, 0x81]:
+      self.LJ.getFeedback(LG._write_commands(data)[:-1])
+      self.assertEqual(self.LJ.latch[LG.address], data)
+
+  def test_sdi_written_only_when_it_changes(self):
+    LG = self.latch_group()
+    SDI = u3.BitStateWrite(17, 0).cmdBytes[1] & 0x7f
+    def SDI_writes(data):
+      return len([command for command in LG._write_commands(data)
+                  if isinstance(command, u3.BitStateWrite) and
+                     command.cmdBytes[1] & 0x7f == SDI])
+    self.assertEqual(SDI_writes(0xFF), 0)
+    self.assertEqual(SDI_writes(0xF0), 1)
+    self.assertEqual(SDI_writes(0x55), 7)
+
+  def test_round_trip_batched(self):
+    LG = self.latch_group()
+    for data in [0x55, 0xAA]:
+      self.assertTrue(LG.write(data))
+      self.assertEqual(self.LJ.latch[LG.address], data)
+      self.assertEqual(LG.read(), data)
+      self.assertEqual(LG.shadow, data)
+
+  def test_round_trip_bitbang(self):
+    LG = self.latch_group(batched=False)
+    for data in [0x55, 0xAA]:
+      self.assertTrue(LG.write(data))
+      self.assertEqual(self.LJ.latch[LG.address], data)
+      self.assertEqual(LG.read(), data)
+
+  def test_batched_operations_fit_in_packets(self):
+    LG = self.latch_group()
+    del self.LJ.packets[:]
+    LG.write(0x55)
+    self.assertLessEqual(len(self.LJ.packets), 2)
+    del self.LJ.packets[:]
+    LG.read()
+    self.assertEqual(len(self.LJ.packets), 1)
+
+  def test_read_decodes_port_states(self):
+    LG = self.latch_group()
+    self.LJ.latch[LG.address] = 0xAA
+    results = self.LJ.getFeedback(LG._read_commands())
+    port_states = [result for result in results if isinstance(result, dict)]
+    self.assertEqual(len(port_states), 8)
+    bits = [(states['FIO'] >> 7) & 1 for states in port_states]
+    self.assertEqual(bits, [1, 0, 1, 0, 1, 0, 1, 0])
+    self.assertEqual(LG.read(), 0xAA)
+
+  def test_read_waits_once_for_nload(self):
+    LG = self.latch_group()
+    self.LJ.waited = 0.0
+    LG.read()
+    self.assertGreaterEqual(self.LJ.waited, 0.010)
+    self.assertLess(self.LJ.waited, 0.011)
+
+  def test_update_from_shadow(self):
+    LG = self.latch_group(readback="on demand")
+    LG.write(0x55)
+    del self.LJ.packets[:]
+    self.assertEqual(LG.update({0: 0, 1: 1}), 0x56)
+    self.assertEqual(self.LJ.latch[LG.address], 0x56)
+    # no read for an update of a known byte
+    self.assertEqual(len(self.LJ.packets), 1)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()
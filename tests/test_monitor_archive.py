@@ -0,0 +1,273 @@
+import logging
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from MonitorControl.Receivers.WBDC.WBDC2.monitor_archive import \
+                  MonitorArchive, AggregateArchive, MonitorHistory, \
+                  archive_dtype
+
+channels = ["+16 V", "BE plate"]
+# five records of 16 bytes
+small = 5*archive_dtype(channels).itemsize
+
+class TestMonitorArchive(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, "monitor.npy")
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def fill(self, archive, times):
+    for t in times:
+      archive.append(t, {"+16 V": 16 + t/100., "BE plate": 30 + t})
+
+  def test_create(self):
+    archive = MonitorArchive(self.filename, channels, max_bytes=small)
+    self.assertEqual(archive.capacity, 5)
+    self.assertEqual(archive.channels, channels)
+    self.assertEqual(archive.count, 0)
+    self.assertEqual(len(archive.read()), 0)
+    self.assertEqual(archive.size(), 0)
+
+  def test_append(self):
+    archive = MonitorArchive(self.filename, channels, max_bytes=small)
+    self.fill(archive, [1, 2])
+    archive.append(3, {"+16 V": 16.5})
+    data = archive.read()
+    self.assertEqual(data["time"].tolist(), [1, 2, 3])
+    self.assertEqual(data["BE plate"][:2].tolist(), [31, 32])
+    # a reading which was not made is NaN
+    self.assertTrue(numpy.isnan(data["BE plate"][2]))
+    self.assertAlmostEqual(data["+16 V"][2], 16.5, places=5)
+    # a single part of the ring is a view of the file
+    self.assertTrue(numpy.shares_memory(data, archive.records))
+
+  def test_time_must_increase(self):
+    archive = MonitorArchive(self.filename, channels, max_bytes=small)
+    self.fill(archive, [1, 2])
+    with self.assertLogs(level=logging.WARNING):
+      archive.append(2, {"+16 V": 0})
+    self.assertEqual(archive.read()["time"].tolist(), [1, 2])
+
+  def test_wrap_around(self):
+    archive = MonitorArchive(self.filename, channels, max_bytes=small)
+    self.fill(archive, range(1, 9))
+    self.assertEqual(archive.count, 5)
+    self.assertEqual(archive.head, 3)
+    self.assertEqual(archive.last, 8)
+    data = archive.read()
+    self.assertEqual(data["time"].tolist(), [4, 5, 6, 7, 8])
+    self.assertEqual(data["BE plate"].tolist(), [34, 35, 36, 37, 38])
+    self.assertEqual(len(archive.segments()), 2)
+
+  def test_time_range_across_wrap(self):
+    archive = MonitorArchive(self.filename, channels, max_bytes=small)
+    self.fill(archive, range(1, 9))
+    self.assertEqual(archive.read(5.5, 7.5)["time"].tolist(), [6, 7])
+    self.assertEqual(archive.size(5.5, 7.5), 2)
+    # the stop time is not included
+    self.assertEqual(archive.read(5, 8)["time"].tolist(), [5, 6, 7])
+    # each part of the ring
+    self.assertEqual(archive.read(4, 6)["time"].tolist(), [4, 5])
+    self.assertEqual(archive.read(6.5)["time"].tolist(), [7, 8])
+    self.assertEqual(len(archive.segments(4, 6)), 1)
+    self.assertEqual(archive.size(0, 4), 0)
+    self.assertEqual(archive.size(9), 0)
+
+  def test_reopen(self):
+    archive = MonitorArchive(self.filename, channels, max_bytes=small)
+    self.fill(archive, range(1, 8))
+    archive.close()
+    reader = MonitorArchive(self.filename)
+    self.assertEqual(reader.channels, channels)
+    self.assertEqual((reader.capacity, reader.count, reader.head, reader.last),
+                     (5, 5, 2, 7))
+    self.assertEqual(reader.read()["time"].tolist(), [3, 4, 5, 6, 7])
+    self.assertFalse(reader.records.flags.writeable)
+    # appending continues where the writer stopped
+    writer = MonitorArchive(self.filename, channels)
+    self.fill(writer, [8])
+    self.assertEqual(writer.read()["time"].tolist(), [4, 5, 6, 7, 8])
+    writer.close()
+
+  def test_reopen_other_channels(self):
+    MonitorArchive(self.filename, channels, max_bytes=small).close()
+    self.assertRaises(ValueError, MonitorArchive, self.filename, ["+16 V"])
+
+  def test_refresh(self):
+    writer = MonitorArchive(self.filename, channels, max_bytes=small)
+    self.fill(writer, [1, 2])
+    reader = MonitorArchive(self.filename)
+    self.fill(writer, range(3, 8))
+    self.assertEqual(reader.count, 2)
+    reader.refresh()
+    self.assertEqual(reader.read()["time"].tolist(), [3, 4, 5, 6, 7])
+    writer.close()
+
+class TestMonitorHistoryFlush(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.history = MonitorHistory(os.path.join(self.directory, "monitor.npy"),
+                                  channels, max_bytes=1 << 12)
+
+  def tearDown(self):
+    self.history.close()
+    shutil.rmtree(self.directory)
+
+  def test_no_flush_within_period(self):
+    flushed = self.history.flushed
+    self.history.append(1.7e9, {"+16 V": 16.0})
+    self.assertEqual(self.history.flushed, flushed)
+
+  def test_flush_after_period(self):
+    self.history.flush_period = 0
+    flushed = self.history.flushed
+    self.history.append(1.7e9, {"+16 V": 16.0})
+    self.assertGreater(self.history.flushed, flushed)
+
+class TestAggregateArchive(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.archive = AggregateArchive(os.path.join(self.directory, "agg.npy"),
+                                    10, 2, max_bytes=1 << 12)
+
+  def tearDown(self):
+    self.archive.close()
+    shutil.rmtree(self.directory)
+
+  def test_current_interval(self):
+    self.assertEqual(self.archive.aggregates(), None)
+    for t, values in [(100, [1, numpy.nan]), (103, [3, numpy.nan]),
+                      (109.5, [2, numpy.nan])]:
+      self.archive.add(t, numpy.array(values, dtype=float))
+    self.assertEqual(self.archive.current, 100)
+    fields = self.archive.aggregates()
+    self.assertEqual(fields["min"][0], 1)
+    self.assertEqual(fields["mean"][0], 2)
+    self.assertEqual(fields["max"][0], 3)
+    self.assertEqual(fields["count"].tolist(), [3, 0])
+    # a channel with no readings has no aggregates
+    for field in ("min", "mean", "max"):
+      self.assertTrue(numpy.isnan(fields[field][1]))
+    self.assertEqual(self.archive.count, 0)
+
+  def test_rollover(self):
+    self.archive.add(100, numpy.array([1.0, 5.0]))
+    self.archive.add(105, numpy.array([numpy.nan, 7.0]))
+    self.archive.add(110, numpy.array([4.0, 6.0]))
+    self.assertEqual(self.archive.current, 110)
+    records = self.archive.read()
+    self.assertEqual(records["time"].tolist(), [100])
+    self.assertEqual(records["min"][0].tolist(), [1, 5])
+    self.assertEqual(records["mean"][0].tolist(), [1, 6])
+    self.assertEqual(records["max"][0].tolist(), [1, 7])
+    self.assertEqual(records["count"][0].tolist(), [1, 2])
+    # an interval without scans has no record
+    self.archive.add(135, numpy.array([2.0, 2.0]))
+    self.assertEqual(self.archive.read()["time"].tolist(), [100, 110])
+    self.archive.close_interval()
+    self.assertEqual(self.archive.read()["time"].tolist(), [100, 110, 130])
+
+class TestMonitorHistoryQuery(unittest.TestCase):
+  """
+  A scan a second for 2.5 hours, from the start of an hour
+
+  Reading "+16 V" of scan i is i; "BE plate" is missing for the first ten.
+  """
+  start = 472222*3600.
+  scans = 9000
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, "monitor.npy")
+    self.history = MonitorHistory(self.filename, channels, max_bytes=1 << 20)
+    for i in range(self.scans):
+      values = {"+16 V": float(i)}
+      if i >= 10:
+        values["BE plate"] = 30.0
+      self.history.append(self.start + i, values)
+
+  def tearDown(self):
+    self.history.close()
+    shutil.rmtree(self.directory)
+
+  def check_level(self, result, interval, first, count):
+    """
+    Checks the aggregates of "+16 V" in 'count' intervals from scan 'first'
+    """
+    self.assertEqual(result["interval"], interval)
+    offsets = first + interval*numpy.arange(count)
+    self.assertEqual((result["time"] - self.start).tolist(), offsets.tolist())
+    values = result["+16 V"]
+    lengths = numpy.minimum(interval, self.scans - offsets)
+    self.assertEqual(values["min"].tolist(), offsets.tolist())
+    self.assertEqual(values["max"].tolist(), (offsets + lengths - 1).tolist())
+    self.assertEqual(values["mean"].tolist(),
+                     (offsets + (lengths - 1)/2.).tolist())
+    self.assertEqual(values["count"].tolist(), lengths.tolist())
+
+  def test_raw(self):
+    result = self.history.query(["+16 V", "BE plate"], self.start,
+                                self.start + 500)
+    self.assertEqual(result["interval"], 0)
+    self.assertEqual(len(result["time"]), 500)
+    for field in ("min", "mean", "max"):
+      self.assertEqual(result["+16 V"][field].tolist(), list(range(500)))
+    self.assertEqual(result["BE plate"]["count"].tolist(),
+                     [0]*10 + [1]*490)
+    self.assertTrue(numpy.isnan(result["BE plate"]["mean"][:10]).all())
+
+  def test_10s_level(self):
+    result = self.history.query(["+16 V", "BE plate"], self.start,
+                                self.start + self.scans)
+    # 900 intervals, the last of them still being accumulated
+    self.check_level(result, 10, 0, 900)
+    self.assertEqual(self.history.levels[0].count, 899)
+    plate = result["BE plate"]
+    self.assertEqual(plate["count"][:2].tolist(), [0, 10])
+    for field in ("min", "mean", "max"):
+      self.assertTrue(numpy.isnan(plate[field][0]))
+      self.assertEqual(plate[field][1], 30.0)
+
+  def test_level_for_span(self):
+    # 600 s in no more than 10 points
+    result = self.history.query(["+16 V"], self.start + 600,
+                                self.start + 1200, max_points=10)
+    self.check_level(result, 60, 600, 10)
+    result = self.history.query(["+16 V"], self.start, self.start + self.scans,
+                                max_points=100)
+    self.check_level(result, 600, 0, 15)
+
+  def test_partial_current_interval(self):
+    # the coarsest level is used when no level has few enough points
+    result = self.history.query(["+16 V"], self.start, self.start + self.scans,
+                                max_points=2)
+    self.check_level(result, 3600, 0, 3)
+    self.assertEqual(result["+16 V"]["count"].tolist(), [3600, 3600, 1800])
+    self.assertEqual(self.history.levels[3].count, 2)
+    # a range which ends before the current interval leaves it out
+    result = self.history.query(["+16 V"], self.start, self.start + 7200,
+                                max_points=2)
+    self.check_level(result, 3600, 0, 2)
+
+  def test_reopen(self):
+    self.history.close()
+    self.history = MonitorHistory(self.filename)
+    self.assertEqual(self.history.channels, channels)
+    # the current intervals were written when the history was closed
+    result = self.history.query(["+16 V"], self.start, self.start + self.scans,
+                                max_points=2)
+    self.check_level(result, 3600, 0, 3)
+    self.assertEqual(self.history.levels[3].count, 3)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+import unittest
+from unittest import mock
+
+from MonitorControl.Receivers.WBDC.WBDC2 import singleflight
+from MonitorControl.Receivers.WBDC.WBDC2.singleflight import SingleFlight, \
+                                                             Flight
+
+class CountingFlight(Flight):
+  """
+  Flight which counts the callers waiting for another caller's read
+  """
+  waiting = 0
+  lock = threading.Lock()
+
+  def wait(self):
+    # the caller which made the read gets its result when it is done
+    if not self.done.is_set():
+      with CountingFlight.lock:
+        CountingFlight.waiting += 1
+    return Flight.wait(self)
+
+class Read(object):
+  """
+  Hardware read which counts its calls and can be held up
+  """
+  def __init__(self, error=None):
+    self.calls = 0
+    self.error = error
+    self.started = threading.Event()
+    self.release = threading.Event()
+    self.release.set()
+
+  def __call__(self):
+    self.calls += 1
+    number = self.calls
+    self.started.set()
+    if number == 1:
+      self.release.wait(5)
+    if self.error:
+      raise self.error
+    return number
+
+def wait_until(condition, timeout=5):
+  deadline = time.time() + timeout
+  while not condition() and time.time() < deadline:
+    time.sleep(0.001)
+  return condition()
+
+class TestSingleFlight(unittest.TestCase):
+
+  def setUp(self):
+    CountingFlight.waiting = 0
+    patcher = mock.patch.object(singleflight, "Flight", CountingFlight)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def concurrent(self, flight, read, callers):
+    """
+    Makes a read with several callers at once; the first one is held up
+    until all the others wait for it
+
+    @return: list of results or exceptions, in the order of the callers
+    """
+    read.release.clear()
+    results = [None]*callers
+    def caller(i):
+      try:
+        results[i] = flight.call("get_crossover", read)
+      except Exception as details:
+        results[i] = details
+    threads = [threading.Thread(target=caller, args=(i,))
+               for i in range(callers)]
+    threads[0].start()
+    self.assertTrue(read.started.wait(5))
+    for thread in threads[1:]:
+      thread.start()
+    self.assertTrue(wait_until(lambda: CountingFlight.waiting == callers - 1))
+    read.release.set()
+    for thread in threads:
+      thread.join(5)
+    return results
+
+  def test_concurrent_callers_share_one_read(self):
+    flight = SingleFlight()
+    read = Read()
+    self.assertEqual(self.concurrent(flight, read, 10), [1]*10)
+    self.assertEqual(read.calls, 1)
+    # without a window the next call reads again
+    self.assertEqual(flight.call("get_crossover", read), 2)
+
+  def test_different_keys_are_not_shared(self):
+    flight = SingleFlight(window=10)
+    read = Read()
+    self.assertEqual(flight.call("get_crossover", read), 1)
+    self.assertEqual(flight.call(("get_atten", "R1-18-E"), read), 2)
+
+  def test_window_expires(self):
+    flight = SingleFlight(window=0.05)
+    read = Read()
+    self.assertEqual(flight.call("get_crossover", read), 1)
+    self.assertEqual(flight.call("get_crossover", read), 1)
+    time.sleep(0.1)
+    self.assertEqual(flight.call("get_crossover", read), 2)
+    self.assertEqual(read.calls, 2)
+
+  def test_invalidate_forgets_result(self):
+    flight = SingleFlight(window=10)
+    read = Read()
+    self.assertEqual(flight.call("get_crossover", read), 1)
+    flight.invalidate()
+    self.assertEqual(flight.call("get_crossover", read), 2)
+
+  def test_invalidate_stops_sharing_read_in_progress(self):
+    flight = SingleFlight(window=10)
+    read = Read()
+    read.release.clear()
+    first = []
+    thread = threading.Thread(
+                    target=lambda: first.append(flight.call("get_crossover",
+                                                            read)))
+    thread.start()
+    self.assertTrue(read.started.wait(5))
+    # e.g. a latch was written while the read was being made
+    flight.invalidate()
+    self.assertEqual(flight.call("get_crossover", read), 2)
+    self.assertEqual(CountingFlight.waiting, 0)
+    read.release.set()
+    thread.join(5)
+    self.assertEqual(first, [1])
+    # the read from before the change is not kept
+    self.assertEqual(flight.call("get_crossover", read), 2)
+    self.assertEqual(read.calls, 2)
+
+  def test_exception_reaches_every_waiter(self):
+    flight = SingleFlight(window=10)
+    read = Read(error=IOError("LabJack not responding"))
+    results = self.concurrent(flight, read, 5)
+    for result in results:
+      self.assertIsInstance(result, IOError)
+    self.assertEqual(read.calls, 1)
+    # a failed read is not kept
+    self.assertRaises(IOError, flight.call, "get_crossover", read)
+    self.assertEqual(read.calls, 2)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()
@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import os.path
+import shutil
+import tempfile
+import time
+import unittest
+
+from MonitorControl.Receivers.WBDC.WBDC2.state_journal import StateJournal
+
+class TestStateJournal(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, "state", "state.json")
+
+  def tearDown(self):
+    os.chmod(self.directory, 0o700)
+    shutil.rmtree(self.directory)
+
+  def test_creates_directory(self):
+    journal = StateJournal(self.filename)
+    self.assertTrue(journal.usable)
+    self.assertTrue(os.path.isdir(os.path.dirname(self.filename)))
+    self.assertFalse(journal.load())
+
+  def test_flush_and_load(self):
+    journal = StateJournal(self.filename)
+    journal.record_latch("R1P", 31)
+    journal.record_latch("X", 3)
+    journal.record_atten("R1-18-E", 5.0, 1.73)
+    journal.flush()
+    with open(self.filename) as f:
+      self.assertEqual(json.load(f)["latches"], {"R1P": 31, "X": 3})
+    restored = StateJournal(self.filename)
+    self.assertTrue(restored.load())
+    self.assertEqual(restored.latches(), {"R1P": 31, "X": 3})
+    self.assertEqual(restored.attens(),
+                     {"R1-18-E": {"dB": 5.0, "volts": 1.73}})
+
+  def test_atomic_replace(self):
+    journal = StateJournal(self.filename)
+    journal.record_latch("R1P", 1)
+    journal.flush()
+    journal.record_latch("R1P", 2)
+    journal.flush()
+    # no temporary file is left behind
+    self.assertEqual(os.listdir(os.path.dirname(self.filename)),
+                     ["state.json"])
+    restored = StateJournal(self.filename)
+    restored.load()
+    self.assertEqual(restored.latches(), {"R1P": 2})
+
+  def test_unchanged_record_does_not_rewrite(self):
+    journal = StateJournal(self.filename)
+    journal.record_latch("R1P", 31)
+    journal.record_atten("R1-18-E", 5.0, 1.73)
+    journal.flush()
+    inode = os.stat(self.filename).st_ino
+    journal.record_latch("R1P", 31)
+    journal.record_atten("R1-18-E", 5.0, 1.73)
+    self.assertFalse(journal.changed)
+    journal.flush()
+    # a rewrite would replace the file with a new one
+    self.assertEqual(os.stat(self.filename).st_ino, inode)
+
+  def test_delayed_writer(self):
+    journal = StateJournal(self.filename, delay=0.05)
+    journal.start()
+    try:
+      journal.record_latch("R2P", 7)
+      journal.record_latch("R2I1", 8)
+      self.assertFalse(os.path.exists(self.filename))
+      deadline = time.time() + 5
+      while not os.path.exists(self.filename) and time.time() < deadline:
+        time.sleep(0.01)
+      with open(self.filename) as f:
+        self.assertEqual(json.load(f)["latches"], {"R2P": 7, "R2I1": 8})
+    finally:
+      journal.stop()
+
+  def test_stop_writes_unsaved_change(self):
+    journal = StateJournal(self.filename, delay=10)
+    journal.start()
+    journal.record_latch("R1P", 5)
+    journal.stop()
+    restored = StateJournal(self.filename)
+    restored.load()
+    self.assertEqual(restored.latches(), {"R1P": 5})
+
+  def test_directory_cannot_be_made(self):
+    blocker = os.path.join(self.directory, "file")
+    open(blocker, "w").close()
+    journal = StateJournal(os.path.join(blocker, "state.json"))
+    self.assertFalse(journal.usable)
+    journal.record_latch("R1P", 5)
+    journal.flush()
+    journal.start()
+    self.assertEqual(journal.thread, None)
+
+  @unittest.skipIf(hasattr(os, "geteuid") and os.geteuid() == 0,
+                   "root can write a read-only directory")
+  def test_read_only_directory(self):
+    os.chmod(self.directory, 0o500)
+    journal = StateJournal(os.path.join(self.directory, "state.json"))
+    self.assertFalse(journal.usable)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+import unittest
+
+from MonitorControl.Receivers.WBDC.WBDC2.subscriptions import difference, \
+                  SubscriptionManager
+
+class Recorder(object):
+  """
+  Callback which keeps the updates it is sent
+  """
+  def __init__(self):
+    self.updates = []
+    self.condition = threading.Condition()
+
+  def update(self, topic, delta, timestamp):
+    with self.condition:
+      self.updates.append((topic, delta, timestamp))
+      self.condition.notify_all()
+
+  def wait_for(self, number, timeout=5):
+    """
+    Waits until 'number' updates have come
+    """
+    deadline = time.time() + timeout
+    with self.condition:
+      while len(self.updates) < number and time.time() < deadline:
+        self.condition.wait(deadline - time.time())
+    return self.updates
+
+class BlockingRecorder(Recorder):
+  """
+  Callback which holds up its first update until released
+  """
+  def __init__(self):
+    Recorder.__init__(self)
+    self.blocked = threading.Event()
+    self.release = threading.Event()
+
+  def update(self, topic, delta, timestamp):
+    if not self.blocked.is_set():
+      self.blocked.set()
+      self.release.wait(5)
+    Recorder.update(self, topic, delta, timestamp)
+
+class FailingCallback(object):
+  """
+  Callback which always fails
+  """
+  def __init__(self):
+    self.calls = 0
+
+  def update(self, topic, delta, timestamp):
+    self.calls += 1
+    raise IOError("client is gone")
+
+def wait_until(condition, timeout=5):
+  deadline = time.time() + timeout
+  while not condition() and time.time() < deadline:
+    time.sleep(0.01)
+  return condition()
+
+class TestDifference(unittest.TestCase):
+
+  def test_flat(self):
+    old = {"crossover": False, "PLL": 1}
+    self.assertEqual(difference(old, dict(old)), {})
+    self.assertEqual(difference(old, {"crossover": True, "PLL": 1}),
+                     {"crossover": True})
+    self.assertEqual(difference({}, old), old)
+
+  def test_added_and_removed(self):
+    self.assertEqual(difference({"a": 1}, {"a": 1, "b": 2}), {"b": 2})
+    self.assertEqual(difference({"a": 1, "b": 2}, {"a": 1}), {"b": None})
+
+  def test_nested(self):
+    old = {"polarizers": {"R1-18": 0, "R1-20": 1},
+           "IF_hybrids": {"R1-18P1": 0}}
+    new = {"polarizers": {"R1-18": 1, "R1-20": 1},
+           "IF_hybrids": {"R1-18P1": 0}}
+    self.assertEqual(difference(old, new), {"polarizers": {"R1-18": 1}})
+    new = {"polarizers": {"R1-18": 0}, "IF_hybrids": {"R1-18P1": 0}}
+    self.assertEqual(difference(old, new), {"polarizers": {"R1-20": None}})
+    # a dict replaced by a value is sent whole
+    self.assertEqual(difference(old, {"polarizers": 0, "IF_hybrids": {}}),
+                     {"polarizers": 0, "IF_hybrids": {"R1-18P1": None}})
+
+class TestSubscriptionManager(unittest.TestCase):
+
+  def setUp(self):
+    self.manager = SubscriptionManager()
+
+  def tearDown(self):
+    for ID in list(self.manager.subscribers.keys()):
+      self.manager.unsubscribe(ID)
+
+  def test_initial_state_then_deltas(self):
+    self.manager.publish("state", {"crossover": False, "PLL": 1}, 1.0)
+    recorder = Recorder()
+    ID = self.manager.subscribe(recorder, ["state"])
+    self.manager.publish("state", {"crossover": True, "PLL": 1}, 2.0)
+    # no update when nothing changed
+    self.assertEqual(self.manager.publish("state",
+                                          {"crossover": True, "PLL": 1}, 3.0),
+                     {})
+    self.manager.publish("state", {"crossover": True}, 4.0)
+    self.assertEqual(recorder.wait_for(3),
+                     [("state", {"crossover": False, "PLL": 1}, 1.0),
+                      ("state", {"crossover": True}, 2.0),
+                      ("state", {"PLL": None}, 4.0)])
+    self.assertTrue(self.manager.unsubscribe(ID))
+    self.assertFalse(self.manager.unsubscribe(ID))
+
+  def test_topics(self):
+    recorder = Recorder()
+    self.manager.subscribe(recorder, ["monitor"])
+    self.manager.publish("state", {"crossover": True}, 1.0)
+    self.manager.publish("monitor", {"+16 V": 16.1}, 2.0)
+    self.assertEqual(recorder.wait_for(1),
+                     [("monitor", {"+16 V": 16.1}, 2.0)])
+    self.assertRaises(ValueError, self.manager.subscribe, recorder, ["other"])
+
+  def test_overflow_sends_full_state(self):
+    recorder = BlockingRecorder()
+    ID = self.manager.subscribe(recorder, ["monitor"])
+    self.manager.subscribers[ID].max_pending = 3
+    self.manager.publish("monitor", {"+16 V": 16.0, "BE plate": 30.0}, 1.0)
+    self.assertTrue(recorder.blocked.wait(5))
+    for t in range(2, 6):
+      self.manager.publish("monitor", {"+16 V": 16.0 + t, "BE plate": 30.0},
+                           float(t))
+    # the fourth delta did not fit, so the queue holds just the full state
+    self.assertEqual(len(self.manager.subscribers[ID].pending), 1)
+    recorder.release.set()
+    self.assertEqual(recorder.wait_for(2),
+                     [("monitor", {"+16 V": 16.0, "BE plate": 30.0}, 1.0),
+                      ("monitor", {"+16 V": 21.0, "BE plate": 30.0}, 5.0)])
+
+  def test_failing_subscriber_is_dropped(self):
+    callback = FailingCallback()
+    recorder = Recorder()
+    ID = self.manager.subscribe(callback, ["state"])
+    self.manager.subscribe(recorder, ["state"])
+    for t in range(5):
+      self.manager.publish("state", {"PLL": t}, float(t))
+    self.assertTrue(wait_until(lambda: ID not in self.manager.subscribers))
+    self.assertEqual(callback.calls, 3)
+    # the other subscriber is not held up
+    self.assertEqual(len(recorder.wait_for(5)), 5)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  unittest.main()